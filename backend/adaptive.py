@@ -0,0 +1,93 @@
+"""
+Adaptive search radius for nearby place searches
+
+A fixed radius is wrong almost everywhere: in a sparse area it returns too
+few places, in a dense one the results spread needlessly far. An adaptive
+search asks for a target number of places instead. It searches one radius
+first and stops there if that already found enough; otherwise it searches a
+few wider rings at once and merges the results by place_id.
+
+When the target was reached, what was found teaches a radius hint: the
+radius that would have just covered the target number of places, with some
+margin. Hints are cached per grid cell, query, type and target, so the next
+search for as many places in the same area starts at a radius that is usually
+right the first time.
+"""
+
+import math
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from corridor import MAX_RADIUS_M, RADIUS_STEP_M, snap_to_grid
+from ranking import haversine_m
+
+MIN_RADIUS_M = 250
+# A nearby search returns at most 20 places; more can never be reached reliably
+MAX_TARGET_RESULTS = 20
+# Each ring searched after the first is this many times wider than the last
+EXPANSION_FACTOR = 2.0
+# Hints cover the distance of the target-th place times this margin
+HINT_MARGIN = 1.25
+
+
+def _round_radius(radius: float) -> int:
+    radius = math.ceil(radius / RADIUS_STEP_M) * RADIUS_STEP_M
+    return int(min(MAX_RADIUS_M, max(MIN_RADIUS_M, radius)))
+
+
+def search_rings(start: float, rings: int) -> List[int]:
+    """Radii to search: ``start`` and up to ``rings`` wider ones, capped at MAX_RADIUS_M"""
+    radii = [_round_radius(start)]
+    for _ in range(max(0, rings)):
+        if radii[-1] >= MAX_RADIUS_M:
+            break
+        radii.append(_round_radius(radii[-1] * EXPANSION_FACTOR))
+    return radii
+
+
+def hint_cell(center: Dict[str, float], cell_m: float) -> Tuple[float, float]:
+    """Grid cell of a search center; searches in the same cell share a radius hint"""
+    lat, lng = snap_to_grid(np.array([[center['lat'], center['lng']]]), cell_m)[0].tolist()
+    return lat, lng
+
+
+def merge_results(responses: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Places of several nearby search responses, first occurrence of each place_id kept"""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for response in responses:
+        for place in response.get('results', []):
+            place_id = place.get('place_id')
+            if place_id and place_id not in merged and place.get('geometry', {}).get('location'):
+                merged[place_id] = place
+    return list(merged.values())
+
+
+def radius_hint(places: List[Dict[str, Any]], center: Dict[str, float],
+                target: int) -> Optional[int]:
+    """
+    Radius to start the next search in this area at
+
+    The distance of the ``target``-th nearest place plus HINT_MARGIN, or None
+    when fewer places were found: a search that missed its target says
+    nothing about the radius that would reach it.
+    """
+    if len(places) < target:
+        return None
+    distances = np.sort(haversine_m(
+        np.array([p['geometry']['location']['lat'] for p in places]),
+        np.array([p['geometry']['location']['lng'] for p in places]),
+        center['lat'], center['lng']
+    ))
+    return _round_radius(distances[target - 1] * HINT_MARGIN)
+
+
+def hint_params(cell: Tuple[float, float], query: Optional[str],
+                place_type: Optional[str], target: int) -> Dict[str, Any]:
+    """Cache parameters of the radius hint for a cell, query, type and target"""
+    return {
+        'cell': list(cell),
+        'query': ' '.join((query or '').lower().split()),
+        'type': place_type,
+        'target': target
+    }
@@ -0,0 +1,185 @@
+"""
+Adaptive admission control and load shedding
+
+When Google gets slow, requests pile up behind the gunicorn workers until they
+hit the worker timeout, and every client waits the full timeout for a failure.
+AdmissionController runs before the route handlers and turns excess requests
+away early with ``503`` and a ``Retry-After`` hint instead.
+
+Two signals are used:
+
+* Queueing delay, taken from the ``X-Request-Start`` header. A proxy in front
+  of gunicorn may set it; otherwise the gunicorn worker (gthread_worker.py)
+  stamps it when a request starts waiting for a thread. Like CoDel, the
+  controller only starts shedding once the delay has stayed above the target
+  for a whole interval, so short bursts are absorbed.
+* The work already in flight in this worker, multiplied by the recent
+  (exponentially weighted) service time. This predicts how long a new request
+  would wait for one of ``worker_concurrency`` threads. It is off unless that
+  is set (gunicorn.conf.py sets it to the thread count), since a wrong count
+  sheds requests that would not have waited at all.
+
+A shed request can still be answered by a registered fallback (e.g. a stale
+cached response) rather than a bare 503. ``/api/health`` is never shed, and
+long-lived job progress streams are neither shed nor counted as in-flight work.
+"""
+
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from flask import Flask, g, jsonify, request
+
+# Weight of the newest sample in the moving averages
+EWMA_ALPHA = 0.2
+
+
+def parse_request_start(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Return seconds since the proxy received the request, from X-Request-Start
+
+    Accepts ``t=<timestamp>`` or a bare timestamp in seconds, milliseconds or
+    microseconds since the epoch, as written by nginx, HAProxy and Heroku.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.startswith('t='):
+        value = value[2:]
+    try:
+        stamp = float(value)
+    except ValueError:
+        return None
+    if stamp > 1e14:
+        stamp /= 1e6
+    elif stamp > 1e11:
+        stamp /= 1e3
+    delay = (now if now is not None else time.time()) - stamp
+    return max(0.0, delay)
+
+
+class AdmissionController:
+    """Decide per request whether to serve it now or shed it
+
+    Args:
+        target_delay: Queueing delay (seconds) the controller tries to stay under
+        interval: How long the delay must exceed the target before shedding
+        worker_concurrency: Requests this worker serves at once (gunicorn
+            threads); 0 to not predict waits from in-flight work
+        max_inflight: Hard cap on requests in flight in this worker, 0 for none
+        exempt_endpoints: Endpoints that are always admitted and not tracked
+        clock: Monotonic clock, replaceable in tests
+    """
+
+    def __init__(self, target_delay: float = 0.5, interval: float = 1.0,
+                 worker_concurrency: int = 0, max_inflight: int = 0,
+                 exempt_endpoints=('api.health_check', 'api.stream_job'),
+                 clock: Callable[[], float] = time.monotonic):
+        self.target_delay = target_delay
+        self.interval = interval
+        self.worker_concurrency = max(0, worker_concurrency)
+        self.max_inflight = max_inflight
+        self.exempt_endpoints = frozenset(exempt_endpoints)
+        self.clock = clock
+        self.fallbacks: List[Callable[[], Any]] = []
+
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.service_time: Optional[float] = None
+        self.upstream_latency: Optional[float] = None
+        self._above_target_since: Optional[float] = None
+        self.admitted = 0
+        self.shed = 0
+        self.served_stale = 0
+
+    def init_app(self, app: Flask) -> None:
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+    def add_fallback(self, fallback: Callable[[], Any]) -> None:
+        """Register a callable returning a response for shed requests, or None"""
+        self.fallbacks.append(fallback)
+
+    # Signals
+
+    def on_upstream_call(self, method: str, params: Dict[str, Any], response: Any,
+                         error: Optional[BaseException], elapsed: float) -> None:
+        with self._lock:
+            self.upstream_latency = self._ewma(self.upstream_latency, elapsed)
+
+    def expected_wait(self) -> float:
+        """Predicted time a new request waits for a free thread in this worker"""
+        queued = self.in_flight - self.worker_concurrency + 1
+        if not self.worker_concurrency or queued <= 0 or self.service_time is None:
+            return 0.0
+        return queued * self.service_time / self.worker_concurrency
+
+    def should_shed(self, queue_delay: Optional[float]) -> bool:
+        now = self.clock()
+        with self._lock:
+            if self.max_inflight and self.in_flight >= self.max_inflight:
+                return True
+            if queue_delay is not None:
+                if queue_delay < self.target_delay:
+                    self._above_target_since = None
+                elif self._above_target_since is None:
+                    self._above_target_since = now
+                if (self._above_target_since is not None
+                        and now - self._above_target_since >= self.interval):
+                    return True
+            return self.expected_wait() > self.target_delay
+
+    def retry_after(self) -> int:
+        """Seconds a shed client should wait before retrying"""
+        drain = max(self.expected_wait(), self.service_time or 0.0, self.target_delay)
+        return max(1, math.ceil(drain))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'in_flight': self.in_flight,
+            'service_time_ms': round(self.service_time * 1000, 1) if self.service_time else None,
+            'upstream_latency_ms': round(self.upstream_latency * 1000, 1) if self.upstream_latency else None,
+            'admitted': self.admitted,
+            'shed': self.shed,
+            'served_stale': self.served_stale
+        }
+
+    @staticmethod
+    def _ewma(current: Optional[float], sample: float) -> float:
+        return sample if current is None else current + EWMA_ALPHA * (sample - current)
+
+    # Flask hooks
+
+    def _before_request(self):
+        if request.endpoint in self.exempt_endpoints or not request.path.startswith('/api/'):
+            return None
+        queue_delay = parse_request_start(request.headers.get('X-Request-Start'))
+        if self.should_shed(queue_delay):
+            return self._reject()
+        with self._lock:
+            self.in_flight += 1
+            self.admitted += 1
+        g._admission_start = time.perf_counter()
+        return None
+
+    def _teardown_request(self, exc=None) -> None:
+        start = g.pop('_admission_start', None)
+        if start is None:
+            return
+        with self._lock:
+            self.in_flight -= 1
+            self.service_time = self._ewma(self.service_time, time.perf_counter() - start)
+
+    def _reject(self):
+        for fallback in self.fallbacks:
+            response = fallback()
+            if response is not None:
+                with self._lock:
+                    self.served_stale += 1
+                return response
+        with self._lock:
+            self.shed += 1
+        response = jsonify({'error': 'Server is busy. Please retry shortly.'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(self.retry_after())
+        return response
@@ -3,78 +3,141 @@ Flask Backend API for LLM with Google Maps Integration
 """
 
 import os
+import contextvars
+import math
 import logging
-from flask import Flask, request, jsonify
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Blueprint, Response, current_app, g, request, jsonify, stream_with_context, url_for
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-import googlemaps
 from dotenv import load_dotenv
-import redis
-from typing import Dict, List, Optional, Any
+from redis import RedisError
+from typing import Dict, List, Optional, Tuple, Any
 import json
+import time
 from datetime import datetime, timedelta, timezone
+import numpy as np
+from cache import MISSING, MemoryCache, TieredCache, cache_key, ttls_from_env
+from clients import ServiceClients
+from conversation import (ConversationStore, follow_up_query, new_session_id, refinement_options,
+                          valid_session_id)
+from capture import TrafficCapture
+from admission import AdmissionController
+from adaptive import MAX_TARGET_RESULTS, hint_cell, hint_params, merge_results, radius_hint, search_rings
+from corridor import (MAX_RADIUS_M, RADIUS_STEP_M, distance_to_route, route_offsets, sample_plan,
+                      sample_route, snap_to_grid)
+from geometry import decode_polyline, route_geometry, simplify
+from isochrone import (grid_points, horizon_radius, polygon_area_km2, reach_distances, reach_polygon,
+                       travel_times)
+from ranking import rank_places, weights_from_env
+from response_cache import ResponseCache
+from shm_cache import SharedMemoryCache
+from structured_logging import RequestLogging, configure_logging, stage
+from validation import (ValidationError, validate_along_route, validate_chat, validate_directions,
+                        validate_reachable, validate_search)
+from warming import CacheWarmer, QueryHistory, current_run
+from jobs import (InMemoryJobStore, JobError, JobQueueUnavailable, JobWorker,
+                  RedisJobStore, validate_job)
 
-# Load environment variables
-load_dotenv()
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging (queue-based JSON pipeline, see structured_logging.py)
+configure_logging()
 logger = logging.getLogger(__name__)
 
-# Initialize Flask app
-app = Flask(__name__)
-app.secret_key = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key-change-me')
-
-# Enable CORS
-CORS(app, origins=["*"])  # In production, specify allowed origins
-
-# Initialize Redis for rate limiting (fallback to memory if Redis unavailable)
-try:
-    redis_client = redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
-    redis_client.ping()  # Test connection
-except:
-    redis_client = None
-    logger.warning("Redis not available, using in-memory rate limiting")
-
-# Initialize rate limiter
+# Rate limiter, bound to the app in create_app()
 limiter = Limiter(
     key_func=get_remote_address,
-    default_limits=["200 per day", "50 per hour"],
-    storage_uri=os.getenv('REDIS_URL', 'memory://') if redis_client else 'memory://'
+    default_limits=["200 per day", "50 per hour"]
 )
-limiter.init_app(app)
-
-# Initialize Google Maps client
-GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY')
-if not GOOGLE_MAPS_API_KEY or GOOGLE_MAPS_API_KEY == 'your_google_maps_api_key_here':
-    logger.warning("GOOGLE_MAPS_API_KEY not found or using placeholder value. Maps functionality will be limited.")
-    gmaps = None
-else:
-    try:
-        gmaps = googlemaps.Client(key=GOOGLE_MAPS_API_KEY)
-    except Exception as e:
-        logger.error(f"Failed to initialize Google Maps client: {e}")
-        gmaps = None
+
+api = Blueprint('api', __name__)
+
+def _empty_result(value: Any) -> bool:
+    """Whether an upstream response found nothing (no geocode, places or route)"""
+    if isinstance(value, dict) and 'results' in value:
+        return not value['results']
+    return value is None or value == []
 
 class LocationService:
     """Service for handling location-based queries and Google Maps integration"""
     
-    def __init__(self, gmaps_client):
+    def __init__(self, gmaps_client, cache: Optional[TieredCache] = None):
         self.gmaps = gmaps_client
+        self.cache = cache
+        self.cache_ttls = ttls_from_env()
         self.region = os.getenv('MAPS_REGION', 'US')
         self.language = os.getenv('MAPS_LANGUAGE', 'en')
+        self.ranking_weights = weights_from_env()
+        self.route_max_samples = int(os.getenv('ALONG_ROUTE_MAX_SAMPLES', '12'))
+        self.route_concurrency = int(os.getenv('ALONG_ROUTE_CONCURRENCY', '4'))
+        self.reachable_max_minutes = float(os.getenv('REACHABLE_MAX_MINUTES', '60'))
+        self.reachable_rings = int(os.getenv('REACHABLE_RINGS', '8'))
+        self.reachable_bearings = int(os.getenv('REACHABLE_BEARINGS', '16'))
+        self.reachable_cell_m = float(os.getenv('REACHABLE_CELL_M', '500'))
+        self.adaptive_rings = int(os.getenv('ADAPTIVE_RINGS', '3'))
+        self.adaptive_cell_m = float(os.getenv('ADAPTIVE_HINT_CELL_M', '1000'))
+        # Radius hints are also kept here for their full TTL, since the
+        # shared cache keeps entries in process memory only briefly
+        self.radius_hints = MemoryCache(max_entries=4096)
+    
+    def _cached(self, name: str, params: Dict[str, Any], loader) -> Any:
+        """
+        Return ``loader()``, cached under ``name`` and ``params`` when there is a cache
+        
+        Empty results are kept for at most the 'negative' TTL.
+        """
+        ttl = self.cache_ttls.get(name, 0)
+        if self.cache is None or ttl <= 0:
+            return loader()
+        negative_ttl = min(ttl, self.cache_ttls.get('negative', ttl))
+        
+        def entry_ttl(value):
+            return negative_ttl if _empty_result(value) else ttl
+        
+        # A cache warming pass reloads entries that are about to expire
+        run = current_run.get()
+        if run is not None:
+            return run.load(self.cache, cache_key(name, params), entry_ttl, loader)
+        return self.cache.get_or_load(cache_key(name, params), entry_ttl, loader)
+    
+    def _upstream(self, method: str, **params) -> Any:
+        """Call a Google Maps method, going through the response cache when there is one"""
+        call = getattr(self.gmaps, method)
+        return self._cached(method, params, lambda: call(**params))
     
     def search_places(self, query: str, location: Optional[str] = None, 
-                     radius: int = 5000, place_type: Optional[str] = None) -> Dict[str, Any]:
+                     radius: int = 5000, place_type: Optional[str] = None,
+                     min_rating: Optional[float] = None, open_now: Optional[bool] = None,
+                     max_distance: Optional[float] = None,
+                     weights: Optional[Dict[str, float]] = None,
+                     limit: int = 10, center: Optional[Dict[str, float]] = None,
+                     target_results: Optional[int] = None) -> Dict[str, Any]:
         """
         Search for places using Google Maps Places API
         
+        All candidates returned upstream are filtered and ranked by distance
+        from the search center, rating, price level and open-now before the
+        result is cut to ``limit``.
+        
+        With ``target_results`` and a location, the radius adapts to the area
+        (see adaptive.py): ``radius`` is only where the search starts when no
+        hint for the area is cached yet.
+        
         Args:
             query: Search query (e.g., "restaurants near me")
             location: Location string or coordinates
             radius: Search radius in meters
             place_type: Type of place (restaurant, gas_station, etc.)
+            min_rating: Only return places rated at least this
+            open_now: Only return places that are open now
+            max_distance: Only return places within this many meters of the center
+            weights: Ranking weights overriding the defaults (see ranking.py)
+            limit: Maximum number of places returned
+            center: Already resolved coordinates of ``location`` ({'lat', 'lng'});
+                skips geocoding
+            target_results: Number of places to aim for with an adaptive
+                radius; also raises ``limit`` to at least this
         
         Returns:
             Dict containing search results and map data
@@ -83,56 +146,132 @@ class LocationService:
             raise Exception("Google Maps API not configured")
         
         try:
-            # If location is provided, geocode it first
-            if location:
-                geocode_result = self.gmaps.geocode(location)
+            # If location is provided and not resolved yet, geocode it first;
+            # without a center this is a general search
+            if location and not center:
+                geocode_result = self._upstream('geocode', address=location)
                 if geocode_result:
                     center = geocode_result[0]['geometry']['location']
                 else:
                     raise Exception(f"Could not find location: {location}")
-            else:
-                # Default to a general search
-                center = None
             
             # Perform places search
-            if center:
-                places_result = self.gmaps.places_nearby(
+            adaptive = None
+            if center and target_results:
+                results, radius, adaptive = self._adaptive_nearby(center, query, place_type,
+                                                                  radius, target_results)
+                places_result = {'results': results}
+                limit = max(limit, target_results)
+            elif center:
+                places_result = self._upstream(
+                    'places_nearby',
                     location=center,
                     radius=radius,
                     keyword=query,
                     type=place_type
                 )
             else:
-                places_result = self.gmaps.places(
+                places_result = self._upstream(
+                    'places',
                     query=query,
                     region=self.region,
                     language=self.language
                 )
             
-            # Process results
-            processed_results = []
-            for place in places_result.get('results', [])[:10]:  # Limit to top 10
-                place_details = self._process_place_details(place)
-                processed_results.append(place_details)
+            # Process and rank the full candidate set, then keep the top results
+            candidates = [self._process_place_details(place)
+                          for place in places_result.get('results', [])]
+            processed_results = rank_places(
+                candidates,
+                center=center,
+                weights={**self.ranking_weights, **(weights or {})},
+                min_rating=min_rating,
+                open_now=open_now,
+                max_distance=max_distance,
+                distance_scale=radius if center else None,
+                limit=limit
+            )
             
             return {
                 'success': True,
                 'query': query,
                 'location': location,
                 'results_count': len(processed_results),
+                'candidates_count': len(candidates),
                 'places': processed_results,
                 'map_center': center,
-                'search_radius': radius
+                'search_radius': radius,
+                'adaptive': adaptive
             }
             
         except Exception as e:
-            logger.error(f"Error searching places: {str(e)}")
+            logger.error("Error searching places: %s", e, extra={'error_class': type(e).__name__})
             return {
                 'success': False,
                 'error': str(e),
                 'query': query
             }
     
+    def _adaptive_nearby(self, center: Dict[str, float], query: str, place_type: Optional[str],
+                         radius: float, target: int):
+        """
+        Nearby search aiming for ``target`` places
+        
+        Starts at the cached radius hint for the area (else ``radius``); when
+        that finds fewer than ``target`` places, ADAPTIVE_RINGS wider rings are
+        searched concurrently and merged. When the target was reached, the
+        hint is then updated from what was found.
+        
+        Returns:
+            Tuple of (merged upstream results, widest radius searched, dict
+            describing the search)
+        """
+        params = hint_params(hint_cell(center, self.adaptive_cell_m), query, place_type, target)
+        key = cache_key('radius_hint', params)
+        hint = self.radius_hints.get(key)
+        if hint is MISSING and self.cache is not None:
+            hint = self.cache.get(key)
+        radii = search_rings(hint if hint is not MISSING else radius, self.adaptive_rings)
+        
+        def search(ring_radius):
+            return self._upstream(
+                'places_nearby',
+                location=center,
+                radius=ring_radius,
+                keyword=query,
+                type=place_type
+            )
+        
+        responses = [search(radii[0])]
+        searched = radii[:1]
+        if len(merge_results(responses)) < target and len(radii) > 1:
+            # Too sparse: search the wider rings at once, in copies of the
+            # request context so upstream calls are logged for this request
+            with ThreadPoolExecutor(max_workers=len(radii) - 1) as pool:
+                futures = [pool.submit(contextvars.copy_context().run, search, r) for r in radii[1:]]
+            for ring_radius, future in zip(radii[1:], futures):
+                try:
+                    responses.append(future.result())
+                    searched.append(ring_radius)
+                except Exception as e:
+                    logger.warning("Adaptive search ring of %dm failed: %s", ring_radius, e,
+                                   extra={'error_class': type(e).__name__})
+        results = merge_results(responses)
+        
+        learned = radius_hint(results, center, target)
+        ttl = self.cache_ttls.get('radius_hint', 0)
+        if ttl > 0 and learned is not None and learned != hint:
+            self.radius_hints.set(key, learned, ttl)
+            if self.cache is not None:
+                self.cache.set(key, learned, ttl)
+        
+        return results, searched[-1], {
+            'target_results': target,
+            'radii': searched,
+            'hint_used': hint is not MISSING,
+            'next_radius': learned
+        }
+    
     def _process_place_details(self, place: Dict) -> Dict[str, Any]:
         """Process and clean place details from Google Maps API"""
         return {
@@ -149,7 +288,7 @@ class LocationService:
         }
     
     def get_directions(self, origin: str, destination: str, 
-                      mode: str = 'driving') -> Dict[str, Any]:
+                      mode: str = 'driving', zoom: Optional[float] = None) -> Dict[str, Any]:
         """
         Get directions between two locations
         
@@ -157,15 +296,18 @@ class LocationService:
             origin: Starting location
             destination: Destination location  
             mode: Transportation mode (driving, walking, transit, bicycling)
+            zoom: Map zoom level the route geometry will be drawn at; the
+                geometry is simplified to match it (fitted to the route if None)
         
         Returns:
-            Dict containing directions data
+            Dict containing directions data and simplified route geometry
         """
         if not self.gmaps:
             raise Exception("Google Maps API not configured")
         
         try:
-            directions_result = self.gmaps.directions(
+            directions_result = self._upstream(
+                'directions',
                 origin=origin,
                 destination=destination,
                 mode=mode,
@@ -181,6 +323,13 @@ class LocationService:
             route = directions_result[0]
             leg = route['legs'][0]
             
+            try:
+                geometry = route_geometry(route, zoom=zoom)
+            except (KeyError, ValueError) as e:
+                logger.warning("Could not decode route geometry: %s", e,
+                               extra={'error_class': type(e).__name__})
+                geometry = None
+            
             return {
                 'success': True,
                 'origin': origin,
@@ -191,18 +340,370 @@ class LocationService:
                 'start_address': leg['start_address'],
                 'end_address': leg['end_address'],
                 'steps': [step['html_instructions'] for step in leg['steps']],
+                'geometry': geometry,
                 'google_maps_url': f"https://www.google.com/maps/dir/{origin}/{destination}"
             }
             
         except Exception as e:
-            logger.error(f"Error getting directions: {str(e)}")
+            logger.error("Error getting directions: %s", e, extra={'error_class': type(e).__name__})
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def search_along_route(self, origin: str, destination: str, query: str,
+                           mode: str = 'driving', place_type: Optional[str] = None,
+                           max_detour: Optional[float] = None,
+                           min_rating: Optional[float] = None, open_now: Optional[bool] = None,
+                           weights: Optional[Dict[str, float]] = None,
+                           limit: int = 10, zoom: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Search for places along the route between two locations
+        
+        The route is covered by overlapping nearby searches at evenly spaced
+        points (see corridor.py), which run concurrently and go through the
+        response cache. Results are merged by place_id and ranked with the
+        detour from the route (there and back) in place of the distance.
+        
+        Args:
+            origin: Starting location
+            destination: Destination location
+            query: Search query (e.g., "coffee")
+            mode: Transportation mode (driving, walking, transit, bicycling)
+            place_type: Type of place (restaurant, gas_station, etc.)
+            max_detour: Only return places at most this many meters of detour
+                away; defaults to twice the search radius
+            min_rating: Only return places rated at least this
+            open_now: Only return places that are open now
+            weights: Ranking weights overriding the defaults (see ranking.py)
+            limit: Maximum number of places returned
+            zoom: Map zoom level the route geometry will be drawn at
+        
+        Returns:
+            Dict containing the route, the sampled search points and places
+        """
+        if not self.gmaps:
+            raise Exception("Google Maps API not configured")
+        
+        try:
+            directions_result = self._upstream(
+                'directions',
+                origin=origin,
+                destination=destination,
+                mode=mode,
+                language=self.language
+            )
+            if not directions_result:
+                return {
+                    'success': False,
+                    'error': 'No directions found',
+                    'query': query
+                }
+        
+            route = directions_result[0]
+            leg = route['legs'][0]
+            path = decode_polyline(route.get('overview_polyline', {}).get('points', ''))
+            if not len(path):
+                raise ValueError("Route has no geometry")
+        
+            count, radius = sample_plan(float(route_offsets(path)[-1]), mode, self.route_max_samples)
+            # Snapping merges samples that are close together and lets nearby
+            # routes reuse the same cached searches
+            samples = snap_to_grid(sample_route(path, count), radius / 4).tolist()
+        
+            def search(point):
+                return self._upstream(
+                    'places_nearby',
+                    location={'lat': point[0], 'lng': point[1]},
+                    radius=int(radius),
+                    keyword=query,
+                    type=place_type
+                )
+        
+            # Each task runs in a copy of the request context so upstream
+            # calls are still logged and captured for this request
+            with ThreadPoolExecutor(max_workers=max(1, min(self.route_concurrency, len(samples)))) as pool:
+                futures = [pool.submit(contextvars.copy_context().run, search, point) for point in samples]
+            responses, errors = [], []
+            for future in futures:
+                try:
+                    responses.append(future.result())
+                except Exception as e:
+                    errors.append(e)
+            if errors:
+                logger.warning("%d of %d route searches failed: %s", len(errors), len(samples), errors[0],
+                               extra={'error_class': type(errors[0]).__name__})
+                if not responses:
+                    raise errors[0]
+        
+            candidates: Dict[str, Dict[str, Any]] = {}
+            for response in responses:
+                for place in response.get('results', []):
+                    place_id = place.get('place_id')
+                    if place_id and place_id not in candidates and place.get('geometry', {}).get('location'):
+                        candidates[place_id] = self._process_place_details(place)
+            places = list(candidates.values())
+        
+            max_detour = max_detour if max_detour is not None else 2 * radius
+            if places:
+                off_route, along = distance_to_route(
+                    np.array([p['location']['lat'] for p in places]),
+                    np.array([p['location']['lng'] for p in places]),
+                    simplify(path, 10.0)
+                )
+                for place, offset in zip(places, along):
+                    place['route_offset_m'] = int(round(offset))
+                ranked = rank_places(
+                    places,
+                    weights={**self.ranking_weights, **(weights or {})},
+                    min_rating=min_rating,
+                    open_now=open_now,
+                    max_distance=max_detour,
+                    distance_scale=max_detour,
+                    limit=limit,
+                    distances=2 * off_route
+                )
+            else:
+                ranked = []
+            for place in ranked:
+                place['detour_m'] = place['distance_m']
+                place['distance_m'] = int(round(place['detour_m'] / 2))
+        
+            try:
+                geometry = route_geometry(route, zoom=zoom)
+            except (KeyError, ValueError) as e:
+                logger.warning("Could not decode route geometry: %s", e,
+                               extra={'error_class': type(e).__name__})
+                geometry = None
+        
+            return {
+                'success': True,
+                'query': query,
+                'origin': origin,
+                'destination': destination,
+                'mode': mode,
+                'distance': leg['distance']['text'],
+                'duration': leg['duration']['text'],
+                'geometry': geometry,
+                'samples': [{'lat': lat, 'lng': lng} for lat, lng in samples],
+                'failed_samples': len(errors),
+                'search_radius': int(radius),
+                'max_detour': max_detour,
+                'results_count': len(ranked),
+                'candidates_count': len(places),
+                'places': ranked
+            }
+        
+        except Exception as e:
+            logger.error("Error searching along route: %s", e, extra={'error_class': type(e).__name__})
+            return {
+                'success': False,
+                'error': str(e),
+                'query': query
+            }
+    
+    def travel_time_grid(self, center: Dict[str, float], mode: str = 'driving') -> Dict[str, Any]:
+        """
+        Travel times from ``center`` to a polar grid of points around it
+        
+        The center is snapped to a REACHABLE_CELL_M grid cell and the grid is
+        cached per cell and mode, covering REACHABLE_MAX_MINUTES.
+        
+        Returns:
+            Dict with the snapped ``center``, ``mode``, ``radius_m`` and
+            ``durations`` in seconds (one row per ring, one value per
+            bearing, None where unreachable)
+        """
+        lat, lng = snap_to_grid(np.array([[center['lat'], center['lng']]]), self.reachable_cell_m)[0].tolist()
+        params = {
+            'center': {'lat': lat, 'lng': lng},
+            'mode': mode,
+            'radius_m': round(horizon_radius(mode, self.reachable_max_minutes)),
+            'rings': self.reachable_rings,
+            'bearings': self.reachable_bearings
+        }
+        
+        def build():
+            points = grid_points(params['center'], params['radius_m'], params['rings'], params['bearings'])
+            matrix = self.get_distance_matrix(
+                [params['center']],
+                [{'lat': p_lat, 'lng': p_lng} for p_lat, p_lng in points.tolist()],
+                mode=mode
+            )
+            if not matrix['success']:
+                raise Exception(matrix['error'])
+            durations = [element['duration_s'] if element and element['status'] == 'OK' else None
+                         for element in matrix['rows'][0]]
+            step = params['bearings']
+            return {
+                'center': params['center'],
+                'mode': mode,
+                'radius_m': params['radius_m'],
+                'durations': [durations[i:i + step] for i in range(0, len(durations), step)]
+            }
+        
+        return self._cached('travel_time_grid', params, build)
+        
+    def get_reachable(self, origin: str, minutes: float, mode: str = 'driving',
+                      query: Optional[str] = None, place_type: Optional[str] = None,
+                      min_rating: Optional[float] = None, open_now: Optional[bool] = None,
+                      weights: Optional[Dict[str, float]] = None,
+                      limit: int = 10) -> Dict[str, Any]:
+        """
+        What can be reached from a location within a travel time
+        
+        Args:
+            origin: Starting location
+            minutes: Travel time limit, at most REACHABLE_MAX_MINUTES
+            mode: Transportation mode (driving, walking, transit, bicycling)
+            query: Optional place search; only places reachable in time are kept
+            place_type: Type of place (restaurant, gas_station, etc.)
+            min_rating: Only return places rated at least this
+            open_now: Only return places that are open now
+            weights: Ranking weights overriding the defaults (see ranking.py)
+            limit: Maximum number of places returned
+        
+        Returns:
+            Dict with the reachability polygon and, for a query, the places
+            within it with their estimated travel time
+        """
+        if not self.gmaps:
+            raise Exception("Google Maps API not configured")
+        
+        try:
+            geocode_result = self._upstream('geocode', address=origin)
+            if not geocode_result:
+                raise Exception(f"Could not find location: {origin}")
+            center = geocode_result[0]['geometry']['location']
+        
+            grid = self.travel_time_grid(center, mode)
+            limit_s = minutes * 60
+            polygon, truncated = reach_polygon(grid, limit_s)
+            result = {
+                'success': True,
+                'origin': origin,
+                'map_center': center,
+                'mode': mode,
+                'minutes': minutes,
+                'polygon': polygon,
+                'area_km2': polygon_area_km2(polygon),
+                # The limit reaches the edge of the grid; the polygon is cut there
+                'truncated': truncated
+            }
+            if not query:
+                return result
+        
+            reach, _ = reach_distances(grid, limit_s)
+            radius = int(min(MAX_RADIUS_M, max(RADIUS_STEP_M, math.ceil(reach.max() / RADIUS_STEP_M) * RADIUS_STEP_M)))
+            places_result = self._upstream(
+                'places_nearby',
+                location=center,
+                radius=radius,
+                keyword=query,
+                type=place_type
+            )
+            candidates = [self._process_place_details(place)
+                          for place in places_result.get('results', [])
+                          if place.get('geometry', {}).get('location')]
+            if candidates:
+                estimates = travel_times(
+                    grid,
+                    np.array([p['location']['lat'] for p in candidates]),
+                    np.array([p['location']['lng'] for p in candidates])
+                )
+                reachable = []
+                for place, seconds in zip(candidates, estimates):
+                    if seconds <= limit_s:
+                        place['travel_time_s'] = int(round(seconds))
+                        reachable.append(place)
+            else:
+                reachable = []
+            places = rank_places(
+                reachable,
+                center=center,
+                weights={**self.ranking_weights, **(weights or {})},
+                min_rating=min_rating,
+                open_now=open_now,
+                distance_scale=radius,
+                limit=limit
+            )
+            result.update({
+                'query': query,
+                'search_radius': radius,
+                'results_count': len(places),
+                'candidates_count': len(candidates),
+                'places': places
+            })
+            return result
+        
+        except Exception as e:
+            logger.error("Error computing reachability: %s", e, extra={'error_class': type(e).__name__})
+            return {
+                'success': False,
+                'error': str(e),
+                'origin': origin
+            }
+    
+    def get_distance_matrix(self, origins: List[str], destinations: List[str],
+                            mode: str = 'driving', progress=None) -> Dict[str, Any]:
+        """
+        Get travel times and distances between every origin and destination
+        
+        Large matrices are split into blocks that respect the Distance Matrix
+        API limits (25 origins, 25 destinations, 100 elements per request).
+        
+        Args:
+            origins: Starting locations
+            destinations: Destination locations
+            mode: Transportation mode (driving, walking, transit, bicycling)
+            progress: Optional callback called with (done, total) elements
+        
+        Returns:
+            Dict with one row per origin, each holding one element per destination
+        """
+        if not self.gmaps:
+            raise Exception("Google Maps API not configured")
+        
+        dest_block = min(25, len(destinations))
+        origin_block = max(1, min(25, 100 // dest_block))
+        total = len(origins) * len(destinations)
+        rows: List[List[Dict[str, Any]]] = [[None] * len(destinations) for _ in origins]
+        done = 0
+        
+        try:
+            for oi in range(0, len(origins), origin_block):
+                for di in range(0, len(destinations), dest_block):
+                    block = self.gmaps.distance_matrix(
+                        origins=origins[oi:oi + origin_block],
+                        destinations=destinations[di:di + dest_block],
+                        mode=mode,
+                        language=self.language
+                    )
+                    for r, row in enumerate(block.get('rows', [])):
+                        for c, element in enumerate(row.get('elements', [])):
+                            rows[oi + r][di + c] = {
+                                'status': element.get('status'),
+                                'distance_m': element.get('distance', {}).get('value'),
+                                'duration_s': element.get('duration', {}).get('value')
+                            }
+                    done += len(origins[oi:oi + origin_block]) * len(destinations[di:di + dest_block])
+                    if progress:
+                        progress(done, total)
+            
+            return {
+                'success': True,
+                'origins': origins,
+                'destinations': destinations,
+                'mode': mode,
+                'rows': rows
+            }
+        
+        except Exception as e:
+            logger.error("Error getting distance matrix: %s", e, extra={'error_class': type(e).__name__})
             return {
                 'success': False,
                 'error': str(e)
             }
-
-# Initialize location service
-location_service = LocationService(gmaps) if gmaps else None
 
 class LLMResponseGenerator:
     """Generate LLM-style responses for location queries"""
@@ -227,6 +728,10 @@ class LLMResponseGenerator:
             if rating:
                 response += f"   ⭐ Rating: {rating}/5\n"
             response += f"   📍 {address}\n"
+            distance = place.get('distance_m')
+            if distance is not None:
+                away = f"{distance / 1000:.1f} km" if distance >= 1000 else f"{distance} m"
+                response += f"   📏 {away} away\n"
             response += f"   🔗 [View on Google Maps]({place.get('google_maps_url', '#')})\n\n"
         
         response += "You can click on any of the Google Maps links above to get directions and more details!"
@@ -234,19 +739,200 @@ class LLMResponseGenerator:
 
 llm_generator = LLMResponseGenerator()
 
+def get_clients() -> ServiceClients:
+    """Return the lazily connected clients of the current app"""
+    return current_app.extensions['location_assistant']['clients']
+
+def get_location_service() -> Optional[LocationService]:
+    """Return the LocationService for this worker, or None if Maps is unavailable"""
+    state = current_app.extensions['location_assistant']
+    gmaps = state['clients'].maps
+    if gmaps is None:
+        return None
+    service = state['location_service']
+    # The Maps client is rebuilt after fork; keep the service in step with it
+    if service is None or service.gmaps is not gmaps:
+        service = state['location_service'] = LocationService(gmaps, cache=state['cache'])
+    return service
+
+def get_job_store():
+    """
+    Return the job store to use for the current request
+    
+    JOBS_BACKEND=redis always uses Redis, shared with the worker pool in
+    worker.py; requests fail with JobQueueUnavailable while it is down.
+    JOBS_BACKEND=auto decides on every call: Redis while it is reachable, else
+    an in-memory store whose jobs run on background threads of this process.
+    That fallback is only suitable for local single-process runs, which is why
+    the Docker image sets JOBS_BACKEND=redis for gunicorn.
+    """
+    state = current_app.extensions['location_assistant']
+    clients = state['clients']
+    backend = current_app.config['JOBS_BACKEND']
+    if backend == 'redis' or (backend == 'auto' and clients.redis is not None):
+        if state['job_store'] is None:
+            with state['lock']:
+                if state['job_store'] is None:
+                    state['job_store'] = RedisJobStore(
+                        lambda: clients.redis, result_ttl=current_app.config['JOBS_RESULT_TTL']
+                    )
+        return state['job_store']
+    return _local_job_store()
+
+def _local_job_store() -> InMemoryJobStore:
+    """Return this process's in-memory job store, starting its workers on first use"""
+    state = current_app.extensions['location_assistant']
+    if state['local_job_store'] is not None:
+        return state['local_job_store']
+    
+    with state['lock']:
+        if state['local_job_store'] is None:
+            store = InMemoryJobStore(result_ttl=current_app.config['JOBS_RESULT_TTL'])
+            worker = JobWorker(
+                store,
+                get_location_service,
+                concurrency=current_app.config['JOBS_LOCAL_WORKERS'],
+                context_factory=current_app._get_current_object().app_context
+            )
+            worker.start()
+            state['job_worker'] = worker
+            state['local_job_store'] = store
+    return state['local_job_store']
+
+def find_job(job_id: str):
+    """
+    Return ``(store, job)`` for a job, or ``(store, None)`` if it is unknown
+    
+    Jobs created in memory while Redis was down stay in this process after it
+    comes back, so they are looked up there too.
+    """
+    store = get_job_store()
+    job = store.get(job_id)
+    local = current_app.extensions['location_assistant']['local_job_store']
+    if job is None and local is not None and local is not store:
+        return local, local.get(job_id)
+    return store, job
+
+def _job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Public representation of a job"""
+    return {
+        'job_id': job['id'],
+        'type': job['type'],
+        'status': job['status'],
+        'progress': job['progress'],
+        'result': job['result'],
+        'error': job['error'],
+        'created_at': datetime.fromtimestamp(job['created_at'], timezone.utc).isoformat(),
+        'updated_at': datetime.fromtimestamp(job['updated_at'], timezone.utc).isoformat(),
+        'status_url': url_for('api.get_job', job_id=job['id']),
+        'stream_url': url_for('api.stream_job', job_id=job['id'])
+    }
+
+def get_conversation_store() -> ConversationStore:
+    """Return the chat conversation context store of the current app"""
+    return current_app.extensions['location_assistant']['conversations']
+
+def _apply_chat_context(context: Dict[str, Any], explicit: Any) -> None:
+    """Merge the ``context`` of a chat payload into the stored session context"""
+    if not isinstance(explicit, dict):
+        return
+    location = explicit.get('location')
+    if location and location != context.get('location'):
+        context['location'] = str(location)
+        context['center'] = None
+    if explicit.get('radius') is not None:
+        context['radius'] = int(explicit['radius'])
+    if explicit.get('type') is not None:
+        context['type'] = str(explicit['type'])
+
+def _warm_query() -> Optional[Tuple[str, Dict[str, Any]]]:
+    """``(kind, params)`` the cache warmer would replay for this request, or None"""
+    if request.endpoint not in ('api.search_places', 'api.get_directions'):
+        return None
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return None
+    if request.endpoint == 'api.get_directions':
+        return 'directions', {'origin': data.get('origin'), 'destination': data.get('destination'),
+                              'mode': data.get('mode', 'driving')}
+    # Adaptive searches vary their radius, so only fixed-radius ones are replayed
+    if data.get('target_results'):
+        return None
+    return 'search', {'query': data.get('query'), 'location': data.get('location'),
+                      'radius': data.get('radius', 5000), 'type': data.get('type')}
+
+def _query_succeeded() -> None:
+    """Mark the current search or directions request as worth keeping warm"""
+    g._query_succeeded = True
+
+def _record_query(response: Response) -> Response:
+    """
+    Count successful requests towards the popular queries kept warm (see warming.py)
+    
+    Runs after every request, response cache hits included: those never reach
+    the view, but are how popular queries are mostly answered. Only
+    successful responses are cached, so a hit counts like a view that marked
+    its request with _query_succeeded.
+    """
+    succeeded = g.pop('_query_succeeded', False) or response.headers.get('X-Cache') in ('HIT', 'STALE')
+    history = current_app.extensions['location_assistant']['query_history']
+    if succeeded and history is not None:
+        query = _warm_query()
+        if query is not None:
+            history.record(*query)
+    return response
+
+def start_warming(flask_app: Flask) -> None:
+    """
+    Start the cache warmer of ``flask_app`` in this process, if warming is on
+    
+    Call it in each worker once it is up (after the fork when preloading);
+    gunicorn.conf.py does so in ``post_worker_init``. The snapshot loads in
+    the background.
+    """
+    warmer = flask_app.extensions['location_assistant']['warmer']
+    if warmer is not None and not warmer.started:
+        warmer.start()
+
+def _start_warming():
+    """Start the cache warmer on the first request, for servers that did not start it"""
+    start_warming(current_app._get_current_object())
+
+def _ranking_options(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Ranking filters and weights from a search payload; raises ValueError if malformed"""
+    min_rating = data.get('min_rating')
+    max_distance = data.get('max_distance')
+    weights = data.get('rank_weights')
+    if weights is not None:
+        if not isinstance(weights, dict):
+            raise ValueError('rank_weights must be an object')
+        weights = {str(k): float(v) for k, v in weights.items()}
+    return {
+        'min_rating': float(min_rating) if min_rating is not None else None,
+        'open_now': bool(data.get('open_now')) or None,
+        'max_distance': float(max_distance) if max_distance is not None else None,
+        'weights': weights
+    }
+
 # API Routes
 
-@app.route('/api/health')
+@api.route('/api/health')
 def health_check():
     """Health check endpoint"""
+    state = current_app.extensions['location_assistant']
+    clients = state['clients']
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.now(timezone.utc).isoformat(),
-        'google_maps_configured': gmaps is not None,
-        'redis_connected': redis_client is not None
+        'google_maps_configured': clients.maps_configured,
+        'redis_connected': clients.redis is not None,
+        'admission': state['admission'].stats(),
+        'cache': state['cache'].stats() if state['cache'] else None,
+        'response_cache': state['response_cache'].stats() if state['response_cache'] else None,
+        'warming': state['warmer'].stats() if state['warmer'] else None
     })
 
-@app.route('/api/search', methods=['POST'])
+@api.route('/api/search', methods=['POST'])
 @limiter.limit("30 per minute")
 def search_places():
     """
@@ -257,19 +943,38 @@ def search_places():
         "query": "restaurants near me",
         "location": "New York, NY" (optional),
         "radius": 5000 (optional),
-        "type": "restaurant" (optional)
+        "type": "restaurant" (optional),
+        "min_rating": 4.0 (optional),
+        "open_now": true (optional),
+        "max_distance": 2000 (optional, meters),
+        "rank_weights": {"distance": 0.5, "rating": 0.5} (optional),
+        "target_results": 15 (optional, adapt the radius to find this many)
     }
     """
     try:
         data = request.get_json()
         if not data or 'query' not in data:
             return jsonify({'error': 'Missing query parameter'}), 400
+        try:
+            validate_search(data)
+        except ValidationError as e:
+            return jsonify({'error': str(e)}), 400
         
         query = data['query']
         location = data.get('location')
         radius = data.get('radius', 5000)
         place_type = data.get('type')
+        try:
+            ranking = _ranking_options(data)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid ranking parameters'}), 400
+        target_results = data.get('target_results')
+        if target_results is not None and (
+                not isinstance(target_results, int) or isinstance(target_results, bool)
+                or not 1 <= target_results <= MAX_TARGET_RESULTS):
+            return jsonify({'error': f"target_results must be an integer from 1 to {MAX_TARGET_RESULTS}"}), 400
         
+        location_service = get_location_service()
         if not location_service:
             return jsonify({'error': 'Google Maps service not available'}), 503
         
@@ -278,11 +983,17 @@ def search_places():
             query=query,
             location=location,
             radius=radius,
-            place_type=place_type
+            place_type=place_type,
+            target_results=target_results,
+            **ranking
         )
         
+        if results.get('success'):
+            _query_succeeded()
+        
         # Generate LLM-style response
-        llm_response = llm_generator.generate_response(query, results)
+        with stage('llm_response'):
+            llm_response = llm_generator.generate_response(query, results)
         
         return jsonify({
             'llm_response': llm_response,
@@ -291,15 +1002,21 @@ def search_places():
                 'original_query': query,
                 'location': location,
                 'radius': radius,
-                'type': place_type
+                'type': place_type,
+                'target_results': target_results,
+                'filters': {
+                    'min_rating': ranking['min_rating'],
+                    'open_now': ranking['open_now'],
+                    'max_distance': ranking['max_distance']
+                }
             }
         })
         
     except Exception as e:
-        logger.error(f"Error in search endpoint: {str(e)}")
+        logger.error("Error in search endpoint: %s", e, extra={'error_class': type(e).__name__})
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/api/directions', methods=['POST'])
+@api.route('/api/directions', methods=['POST'])
 @limiter.limit("20 per minute")
 def get_directions():
     """
@@ -309,105 +1026,604 @@ def get_directions():
     {
         "origin": "New York, NY",
         "destination": "Boston, MA",
-        "mode": "driving" (optional)
+        "mode": "driving" (optional),
+        "zoom": 12 (optional, map zoom the route geometry is simplified for)
     }
     """
     try:
         data = request.get_json()
         if not data or 'origin' not in data or 'destination' not in data:
             return jsonify({'error': 'Missing origin or destination'}), 400
+        try:
+            validate_directions(data)
+        except ValidationError as e:
+            return jsonify({'error': str(e)}), 400
         
         origin = data['origin']
         destination = data['destination']
         mode = data.get('mode', 'driving')
+        zoom = data.get('zoom')
+        if zoom is not None:
+            try:
+                zoom = float(zoom)
+            except (TypeError, ValueError):
+                return jsonify({'error': 'Invalid zoom'}), 400
         
+        location_service = get_location_service()
         if not location_service:
             return jsonify({'error': 'Google Maps service not available'}), 503
         
-        directions = location_service.get_directions(origin, destination, mode)
+        directions = location_service.get_directions(origin, destination, mode, zoom=zoom)
+        if directions.get('success'):
+            _query_succeeded()
         
         return jsonify(directions)
         
     except Exception as e:
-        logger.error(f"Error in directions endpoint: {str(e)}")
+        logger.error("Error in directions endpoint: %s", e, extra={'error_class': type(e).__name__})
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/api/llm-chat', methods=['POST'])
+@api.route('/api/search/along-route', methods=['POST'])
+@limiter.limit("10 per minute")
+def search_along_route():
+    """
+    Search for places along the route between two locations
+
+    Expected JSON payload:
+    {
+        "query": "coffee",
+        "origin": "Cambridge, MA",
+        "destination": "Providence, RI",
+        "mode": "driving" (optional),
+        "type": "cafe" (optional),
+        "max_detour": 3000 (optional, meters there and back),
+        "min_rating": 4.0 (optional),
+        "open_now": true (optional),
+        "rank_weights": {"distance": 0.5, "rating": 0.5} (optional),
+        "zoom": 10 (optional)
+    }
+    """
+    try:
+        data = request.get_json()
+        if not data or 'query' not in data:
+            return jsonify({'error': 'Missing query parameter'}), 400
+        if 'origin' not in data or 'destination' not in data:
+            return jsonify({'error': 'Missing origin or destination'}), 400
+        try:
+            validate_along_route(data)
+        except ValidationError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        query = data['query']
+        try:
+            ranking = _ranking_options(data)
+            max_detour = data.get('max_detour')
+            max_detour = float(max_detour) if max_detour is not None else None
+            zoom = data.get('zoom')
+            zoom = float(zoom) if zoom is not None else None
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid search parameters'}), 400
+        
+        location_service = get_location_service()
+        if not location_service:
+            return jsonify({'error': 'Google Maps service not available'}), 503
+        
+        results = location_service.search_along_route(
+            origin=data['origin'],
+            destination=data['destination'],
+            query=query,
+            mode=data.get('mode', 'driving'),
+            place_type=data.get('type'),
+            max_detour=max_detour,
+            min_rating=ranking['min_rating'],
+            open_now=ranking['open_now'],
+            weights=ranking['weights'],
+            zoom=zoom
+        )
+        
+        with stage('llm_response'):
+            llm_response = llm_generator.generate_response(query, results)
+        
+        return jsonify({
+            'llm_response': llm_response,
+            'places_data': results
+        })
+
+    except Exception as e:
+        logger.error("Error in along-route search endpoint: %s", e, extra={'error_class': type(e).__name__})
+        return jsonify({'error': 'Internal server error'}), 500
+
+@api.route('/api/reachable', methods=['POST'])
+@limiter.limit("10 per minute")
+def reachable():
+    """
+    What can be reached from a location within a travel time
+    
+    Expected JSON payload:
+    {
+        "origin": "Union Square, San Francisco",
+        "minutes": 15,
+        "mode": "walking" (optional),
+        "query": "coffee" (optional, only return places reachable in time),
+        "type": "cafe" (optional),
+        "min_rating": 4.0 (optional),
+        "open_now": true (optional),
+        "rank_weights": {"distance": 0.5, "rating": 0.5} (optional)
+    }
+    """
+    try:
+        data = request.get_json()
+        if not data or 'origin' not in data or 'minutes' not in data:
+            return jsonify({'error': 'Missing origin or minutes'}), 400
+        try:
+            validate_reachable(data)
+        except ValidationError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        location_service = get_location_service()
+        if not location_service:
+            return jsonify({'error': 'Google Maps service not available'}), 503
+        
+        try:
+            minutes = float(data['minutes'])
+            ranking = _ranking_options(data)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid search parameters'}), 400
+        if not 0 < minutes <= location_service.reachable_max_minutes:
+            return jsonify({
+                'error': f"minutes must be between 0 and {location_service.reachable_max_minutes:g}"
+            }), 400
+        
+        result = location_service.get_reachable(
+            origin=data['origin'],
+            minutes=minutes,
+            mode=data.get('mode', 'driving'),
+            query=data.get('query'),
+            place_type=data.get('type'),
+            min_rating=ranking['min_rating'],
+            open_now=ranking['open_now'],
+            weights=ranking['weights']
+        )
+        
+        return jsonify(result)
+        
+    except Exception as e:
+        logger.error("Error in reachable endpoint: %s", e, extra={'error_class': type(e).__name__})
+        return jsonify({'error': 'Internal server error'}), 500
+
+@api.route('/api/llm-chat', methods=['POST'])
 @limiter.limit("60 per minute")
 def llm_chat():
     """
     Main endpoint for LLM integration - processes natural language queries
     
+    Turns of a conversation share a context (see conversation.py). Pass back
+    the ``session_id`` of the previous response so that follow-ups such as
+    "what about bars?" reuse the resolved location, and refinements such as
+    "which are open now?" re-rank the previous results without new lookups.
+    
     Expected JSON payload:
     {
         "message": "Find me good Italian restaurants in Manhattan",
-        "context": {...} (optional)
+        "session_id": "..." (optional),
+        "context": {"location": "Manhattan", "radius": 2000, "type": "restaurant"} (optional)
     }
     """
     try:
         data = request.get_json()
         if not data or 'message' not in data:
             return jsonify({'error': 'Missing message parameter'}), 400
+        try:
+            validate_chat(data)
+        except ValidationError as e:
+            return jsonify({'error': str(e)}), 400
         
         message = data['message'].lower()
+        session_id = data.get('session_id')
+        if not valid_session_id(session_id):
+            session_id = new_session_id()
+        conversations = get_conversation_store()
+        context = conversations.load(session_id)
+        try:
+            _apply_chat_context(context, data.get('context'))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid context'}), 400
         
         # Simple intent detection (in production, use a proper NLP model)
-        if any(keyword in message for keyword in ['find', 'search', 'looking for', 'where']):
+        is_search = any(keyword in message for keyword in ['find', 'search', 'looking for', 'where'])
+        follow_up = follow_up_query(message) if context.get('center') or context.get('location') else None
+        refinement = refinement_options(message) if context.get('results') else None
+        
+        if refinement and not is_search and not follow_up:
+            # Re-rank the previous results, no upstream calls needed
+            query = context.get('query') or data['message']
+            places = rank_places(context['results'], center=context.get('center'),
+                                 limit=len(context['results']), **refinement)
+            results = {
+                'success': True,
+                'query': query,
+                'location': context.get('location'),
+                'results_count': len(places),
+                'places': places,
+                'map_center': context.get('center'),
+                'search_radius': context.get('radius'),
+                'refined': True
+            }
+            if places:
+                context['results'] = places
+            conversations.save(session_id, context)
+            
+            return jsonify({
+                'response': llm_generator.generate_response(query, results),
+                'type': 'places',
+                'data': results,
+                'session_id': session_id
+            })
+        
+        elif is_search or follow_up:
             # Extract location query
-            query = data['message']
+            query = follow_up or data['message']
             
-            # Try to extract location from the message
+            # Try to extract location from the message, else stay where the
+            # conversation is
             location = None
             if 'in ' in message:
                 location_part = message.split('in ')[-1]
                 location = location_part.strip()
+            center = None
+            if not location or location == context.get('location'):
+                location = context.get('location')
+                center = context.get('center')
             
+            location_service = get_location_service()
             if not location_service:
                 return jsonify({
                     'response': "I'm sorry, the location service is currently unavailable. Please try again later.",
-                    'type': 'error'
+                    'type': 'error',
+                    'session_id': session_id
                 })
             
             # Search for places
-            results = location_service.search_places(query=query, location=location)
+            results = location_service.search_places(
+                query=query,
+                location=location,
+                radius=context.get('radius') or 5000,
+                place_type=context.get('type'),
+                center=center
+            )
             llm_response = llm_generator.generate_response(query, results)
+            if results.get('success'):
+                context.update({
+                    'location': location,
+                    'center': results.get('map_center'),
+                    'query': query,
+                    'results': results.get('places', []),
+                    'history': context.get('history', []) + [query]
+                })
+                conversations.save(session_id, context)
             
             return jsonify({
                 'response': llm_response,
                 'type': 'places',
-                'data': results
+                'data': results,
+                'session_id': session_id
             })
         
         elif any(keyword in message for keyword in ['directions', 'how to get', 'route']):
             return jsonify({
                 'response': "To get directions, please use the format: 'Get directions from [origin] to [destination]'",
-                'type': 'instruction'
+                'type': 'instruction',
+                'session_id': session_id
             })
         
         else:
             return jsonify({
                 'response': "I can help you find places and get directions! Try asking me to 'find restaurants near me' or 'search for coffee shops in downtown'.",
-                'type': 'help'
+                'type': 'help',
+                'session_id': session_id
             })
         
     except Exception as e:
-        logger.error(f"Error in LLM chat endpoint: {str(e)}")
+        logger.error("Error in LLM chat endpoint: %s", e, extra={'error_class': type(e).__name__})
+        return jsonify({'error': 'Internal server error'}), 500
+
+@api.route('/api/jobs', methods=['POST'])
+@limiter.limit("10 per minute")
+def create_job():
+    """
+    Enqueue a slow, multi-call workload to run in the background
+    
+    Expected JSON payload:
+    {
+        "type": "batch_search" | "batch_directions" | "distance_matrix",
+        "params": {
+            "searches": [{"query": "coffee", "location": "Boston, MA"}, ...]   (batch_search)
+            "routes": [{"origin": "...", "destination": "...", "mode": "..."}]  (batch_directions)
+            "origins": [...], "destinations": [...], "mode": "driving"         (distance_matrix)
+        }
+    }
+    """
+    try:
+        data = request.get_json()
+        if not data or 'type' not in data:
+            return jsonify({'error': 'Missing job type'}), 400
+        
+        try:
+            validate_job(data['type'], data.get('params'))
+            job = get_job_store().enqueue(data['type'], data['params'])
+        except JobError as e:
+            return jsonify({'error': str(e)}), 400
+        except (JobQueueUnavailable, RedisError) as e:
+            logger.warning("Job queue unavailable: %s", e, extra={'error_class': type(e).__name__})
+            return jsonify({'error': 'Job queue not available'}), 503
+        
+        view = _job_view(job)
+        return jsonify(view), 202, {'Location': view['status_url']}
+        
+    except Exception as e:
+        logger.error("Error in jobs endpoint: %s", e, extra={'error_class': type(e).__name__})
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.errorhandler(429)
+@api.route('/api/jobs/<job_id>')
+@limiter.limit("120 per minute")
+def get_job(job_id):
+    """Poll the status, progress and result of a job"""
+    try:
+        _, job = find_job(job_id)
+    except (JobQueueUnavailable, RedisError):
+        return jsonify({'error': 'Job queue not available'}), 503
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(_job_view(job))
+
+@api.route('/api/jobs/<job_id>/stream')
+@limiter.limit("20 per minute")
+def stream_job(job_id):
+    """
+    Stream job progress as server-sent events
+    
+    Each change is sent as a ``progress`` event carrying the job. The stream
+    ends when the job finishes, or after ``timeout`` seconds (default 25, at
+    most 60) so that a long job does not hold a worker thread; clients
+    reconnect or fall back to polling. At most JOBS_MAX_STREAMS streams are
+    open per worker, so that streams never take all of its threads; beyond
+    that clients get a 503 and should poll ``status_url`` instead.
+    """
+    try:
+        store, job = find_job(job_id)
+    except (JobQueueUnavailable, RedisError):
+        return jsonify({'error': 'Job queue not available'}), 503
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    timeout = request.args.get('timeout', 25, type=float)
+    if not math.isfinite(timeout) or timeout <= 0:
+        return jsonify({'error': "'timeout' must be a positive number of seconds"}), 400
+    timeout = min(timeout, 60)
+    
+    streams = current_app.extensions['location_assistant']['job_streams']
+    if not streams.acquire(blocking=False):
+        return jsonify({'error': 'Too many open streams, poll status_url instead',
+                        'status_url': _job_view(job)['status_url']}), 503, {'Retry-After': '5'}
+    
+    def events():
+        current = job
+        deadline = time.monotonic() + timeout
+        yield f"event: progress\ndata: {json.dumps(_job_view(current))}\n\n"
+        while current['status'] not in ('succeeded', 'failed'):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                yield "event: timeout\ndata: {}\n\n"
+                return
+            updated = store.wait_for_change(job_id, current['version'], min(remaining, 15))
+            if updated is None:
+                return
+            if updated['version'] == current['version']:
+                yield ": keep-alive\n\n"
+                continue
+            current = updated
+            yield f"event: progress\ndata: {json.dumps(_job_view(current))}\n\n"
+    
+    response = Response(stream_with_context(events()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Released when the server closes the response, also if the client went away
+    response.call_on_close(streams.release)
+    return response
+
 def ratelimit_handler(e):
-    return jsonify({'error': 'Rate limit exceeded. Please try again later.'}), 429
+    headers = {}
+    current = limiter.current_limit
+    if current is not None:
+        # Tell clients when the window resets so they can retry then
+        headers['Retry-After'] = str(max(1, math.ceil(current.reset_at - time.time())))
+    return jsonify({'error': 'Rate limit exceeded. Please try again later.'}), 429, headers
 
-@app.errorhandler(500)
 def internal_error(error):
     return jsonify({'error': 'Internal server error'}), 500
 
+def create_app(config: Optional[Dict[str, Any]] = None, maps_client: Any = None) -> Flask:
+    """
+    Create and configure the Flask application
+
+    Nothing here touches the network: Redis and Google Maps clients are
+    created lazily on first use in each worker process, so the app can be
+    built in a preloading gunicorn master and forked safely.
+
+    Args:
+        config: Extra Flask config values, applied last
+        maps_client: Google Maps client to use instead of building one from
+            GOOGLE_MAPS_API_KEY (tests, traffic replay)
+
+    Returns:
+        Configured Flask app
+    """
+    load_dotenv()
+
+    app = Flask(__name__)
+    app.secret_key = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key-change-me')
+
+    # Use Redis for rate limits when configured, falling back to memory while it is down
+    app.config.setdefault('RATELIMIT_STORAGE_URI', os.getenv('REDIS_URL', 'memory://'))
+    app.config.setdefault('RATELIMIT_IN_MEMORY_FALLBACK_ENABLED', True)
+    app.config.setdefault('ADMISSION_ENABLED', os.getenv('ADMISSION_ENABLED', 'true').lower() in ('1', 'true', 'yes'))
+    app.config.setdefault('ADMISSION_TARGET_DELAY_MS', int(os.getenv('ADMISSION_TARGET_DELAY_MS', '500')))
+    app.config.setdefault('ADMISSION_INTERVAL_MS', int(os.getenv('ADMISSION_INTERVAL_MS', '1000')))
+    app.config.setdefault('ADMISSION_WORKER_CONCURRENCY', int(os.getenv('ADMISSION_WORKER_CONCURRENCY', '0')))
+    app.config.setdefault('ADMISSION_MAX_INFLIGHT', int(os.getenv('ADMISSION_MAX_INFLIGHT', '0')))
+    app.config.setdefault('JOBS_BACKEND', os.getenv('JOBS_BACKEND', 'auto'))
+    app.config.setdefault('JOBS_RESULT_TTL', int(os.getenv('JOBS_RESULT_TTL', '3600')))
+    app.config.setdefault('JOBS_LOCAL_WORKERS', int(os.getenv('JOBS_LOCAL_WORKERS', '1')))
+    app.config.setdefault('JOBS_MAX_STREAMS', int(os.getenv('JOBS_MAX_STREAMS', '2')))
+    app.config.setdefault('CACHE_ENABLED', os.getenv('CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes'))
+    app.config.setdefault('CACHE_REDIS', os.getenv('CACHE_REDIS', 'true').lower() in ('1', 'true', 'yes'))
+    app.config.setdefault('CACHE_MEMORY_ENTRIES', int(os.getenv('CACHE_MEMORY_ENTRIES', '2048')))
+    app.config.setdefault('CACHE_SHM_PATH', os.getenv('CACHE_SHM_PATH'))
+    app.config.setdefault('CACHE_SHM_SLOTS', int(os.getenv('CACHE_SHM_SLOTS', '1024')))
+    app.config.setdefault('CACHE_SHM_SLOT_SIZE', int(os.getenv('CACHE_SHM_SLOT_SIZE', '32768')))
+    app.config.setdefault('RESPONSE_CACHE_ENABLED', os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes'))
+    app.config.setdefault('RESPONSE_CACHE_TTL', int(os.getenv('RESPONSE_CACHE_TTL', '300')))
+    app.config.setdefault('RESPONSE_CACHE_STALE_TTL', int(os.getenv('RESPONSE_CACHE_STALE_TTL', '3600')))
+    app.config.setdefault('RESPONSE_CACHE_MAX_ENTRIES', int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '1024')))
+    app.config.setdefault('RESPONSE_CACHE_GZIP_MIN_SIZE', int(os.getenv('RESPONSE_CACHE_GZIP_MIN_SIZE', '1024')))
+    app.config.setdefault('WARMING_ENABLED', os.getenv('WARMING_ENABLED', 'true').lower() in ('1', 'true', 'yes'))
+    app.config.setdefault('WARMING_INTERVAL', int(os.getenv('WARMING_INTERVAL', '300')))
+    app.config.setdefault('WARMING_BUDGET', int(os.getenv('WARMING_BUDGET', '100')))
+    app.config.setdefault('WARMING_TOP_QUERIES', int(os.getenv('WARMING_TOP_QUERIES', '50')))
+    app.config.setdefault('WARMING_SNAPSHOT_PATH', os.getenv('WARMING_SNAPSHOT_PATH'))
+    app.config.setdefault('WARMING_LOCK_PATH', os.getenv('WARMING_LOCK_PATH'))
+    app.config.setdefault('CONVERSATION_TTL', int(os.getenv('CONVERSATION_TTL', '1800')))
+    app.config.setdefault('CONVERSATION_MAX_SESSIONS', int(os.getenv('CONVERSATION_MAX_SESSIONS', '1000')))
+    if config:
+        app.config.update(config)
+
+    # Enable CORS
+    CORS(app, origins=["*"])  # In production, specify allowed origins
+
+    clients = ServiceClients(
+        redis_url=os.getenv('REDIS_URL', 'redis://localhost:6379/0'),
+        maps_api_key=os.getenv('GOOGLE_MAPS_API_KEY'),
+        maps_client=maps_client,
+        redis_connect_timeout=float(os.getenv('REDIS_CONNECT_TIMEOUT', '1.0')),
+    )
+    admission = AdmissionController(
+        target_delay=app.config['ADMISSION_TARGET_DELAY_MS'] / 1000,
+        interval=app.config['ADMISSION_INTERVAL_MS'] / 1000,
+        worker_concurrency=app.config['ADMISSION_WORKER_CONCURRENCY'],
+        max_inflight=app.config['ADMISSION_MAX_INFLIGHT']
+    )
+    clients.add_maps_observer(admission)
+    cache = None
+    if app.config['CACHE_ENABLED']:
+        shared = None
+        if app.config['CACHE_SHM_PATH']:
+            # Mapped lazily on first use, in each worker
+            shared = SharedMemoryCache(
+                app.config['CACHE_SHM_PATH'],
+                slots=app.config['CACHE_SHM_SLOTS'],
+                slot_size=app.config['CACHE_SHM_SLOT_SIZE']
+            )
+        cache = TieredCache(
+            memory=MemoryCache(max_entries=app.config['CACHE_MEMORY_ENTRIES']),
+            shared=shared,
+            redis_provider=(lambda: clients.redis) if app.config['CACHE_REDIS'] else None,
+            on_redis_error=clients.redis_failed
+        )
+    app.extensions['location_assistant'] = {
+        'clients': clients,
+        'admission': admission,
+        'cache': cache,
+        'response_cache': None,
+        'conversations': ConversationStore(
+            redis_provider=lambda: clients.redis,
+            on_redis_error=clients.redis_failed,
+            ttl=app.config['CONVERSATION_TTL'],
+            max_sessions=app.config['CONVERSATION_MAX_SESSIONS']
+        ),
+        'query_history': None,
+        'warmer': None,
+        'location_service': None,
+        'job_store': None,
+        'local_job_store': None,
+        'job_worker': None,
+        'job_streams': threading.BoundedSemaphore(max(1, app.config['JOBS_MAX_STREAMS'])),
+        'lock': threading.Lock(),
+    }
+
+    # Request IDs and access logs first, so that shed requests are logged too
+    request_logging = RequestLogging()
+    request_logging.init_app(app)
+    clients.add_maps_observer(request_logging)
+    
+    # Shed load before doing any other per-request work, rate limiting included
+    if app.config['ADMISSION_ENABLED']:
+        admission.init_app(app)
+    limiter.init_app(app)
+    
+    # Optional production traffic capture (see capture.py / replay.py), before
+    # the response cache so that its hits, which skip all later hooks, are
+    # recorded too
+    traffic_capture = TrafficCapture.from_env()
+    if traffic_capture:
+        traffic_capture.init_app(app)
+        clients.add_maps_observer(traffic_capture)
+        logger.info("Traffic capture enabled, writing to %s", traffic_capture.directory)
+    
+    # Keep popular queries warm in the upstream cache; the warmer thread starts
+    # in each worker once it is up (see start_warming), or else on its first
+    # request. With WARMING_LOCK_PATH only one worker per host runs passes
+    if app.config['WARMING_ENABLED'] and cache is not None:
+        history = QueryHistory(
+            redis_provider=lambda: clients.redis,
+            on_redis_error=clients.redis_failed
+        )
+        app.extensions['location_assistant']['query_history'] = history
+        # Before the response cache, like capture, so that its hits count too
+        app.after_request(_record_query)
+        app.extensions['location_assistant']['warmer'] = CacheWarmer(
+            history,
+            get_location_service,
+            cache,
+            admission=admission if app.config['ADMISSION_ENABLED'] else None,
+            redis_provider=lambda: clients.redis,
+            interval=app.config['WARMING_INTERVAL'],
+            budget=app.config['WARMING_BUDGET'],
+            top_queries=app.config['WARMING_TOP_QUERIES'],
+            snapshot_path=app.config['WARMING_SNAPSHOT_PATH'],
+            lock_path=app.config['WARMING_LOCK_PATH'],
+            context_factory=app.app_context
+        )
+        app.before_request(_start_warming)
+    
+    # Answer repeated requests with their stored encoded response, after rate
+    # limiting; while shedding load, stale copies are served instead of 503s
+    if app.config['RESPONSE_CACHE_ENABLED']:
+        response_cache = ResponseCache(
+            ttl=app.config['RESPONSE_CACHE_TTL'],
+            stale_ttl=app.config['RESPONSE_CACHE_STALE_TTL'],
+            max_entries=app.config['RESPONSE_CACHE_MAX_ENTRIES'],
+            gzip_min_size=app.config['RESPONSE_CACHE_GZIP_MIN_SIZE']
+        )
+        response_cache.init_app(app)
+        admission.add_fallback(response_cache.stale_response)
+        app.extensions['location_assistant']['response_cache'] = response_cache
+
+    app.register_blueprint(api)
+    app.register_error_handler(429, ratelimit_handler)
+    app.register_error_handler(500, internal_error)
+    return app
+
+app = create_app()
+
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
     debug = os.getenv('FLASK_ENV') == 'development'
     
-    logger.info(f"Starting server on port {port}")
-    logger.info(f"Google Maps API configured: {gmaps is not None}")
-    logger.info(f"Redis connected: {redis_client is not None}")
+    logger.info("Starting server on port %s", port)
+    with app.app_context():
+        logger.info("Google Maps API configured: %s", get_clients().maps_configured)
+        logger.info("Redis connected: %s", get_clients().redis is not None)
+    # With the debug reloader, only the child process that serves requests warms
+    if not debug or os.getenv('WERKZEUG_RUN_MAIN') == 'true':
+        start_warming(app)
     
     app.run(host='0.0.0.0', port=port, debug=debug)
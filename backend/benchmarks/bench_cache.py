@@ -0,0 +1,137 @@
+"""
+Cache tier lookup latency and memory footprint
+
+Fills each tier with synthetic places_nearby responses and measures hit
+latency, including deserialization where the tier stores bytes:
+
+* per-process: the in-process LRU (what each gunicorn worker holds)
+* shared:      the host-local shared-memory table (get_bytes + json.loads)
+* redis:       Redis only (GET + json.loads), when --redis-url is reachable
+
+Memory is reported for --workers worker processes: the per-process LRU is
+held once per worker, the shared table once per host. Shared reads are also
+run from all workers at once to show they do not contend.
+
+    python benchmarks/bench_cache.py --entries 500 --workers 4
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import MemoryCache  # noqa: E402
+from shm_cache import SharedMemoryCache  # noqa: E402
+
+
+def places_response(i):
+    """A places_nearby response of typical size (20 results)"""
+    rng = random.Random(i)
+    return {'results': [{
+        'name': f"Place {i}-{j}",
+        'place_id': f"ChIJ{rng.getrandbits(96):024x}",
+        'rating': round(rng.uniform(3, 5), 1),
+        'user_ratings_total': rng.randint(1, 5000),
+        'price_level': rng.randint(0, 4),
+        'vicinity': f"{rng.randint(1, 999)} Main Street, Springfield",
+        'types': ['cafe', 'food', 'point_of_interest', 'establishment'],
+        'geometry': {'location': {'lat': 40 + rng.random(), 'lng': -74 + rng.random()}},
+        'opening_hours': {'open_now': rng.random() < 0.5},
+        'photos': [{'photo_reference': f"Aap_uE{rng.getrandbits(256):064x}", 'height': 3024, 'width': 4032}],
+    } for j in range(20)], 'status': 'OK'}
+
+
+def timed_lookups(lookup, keys, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for key in keys:
+            lookup(key)
+    return (time.perf_counter() - start) / (repeat * len(keys))
+
+
+def shared_lookup(cache):
+    def lookup(key):
+        entry = cache.get_bytes(key)
+        return json.loads(entry[0]) if entry else None
+    return lookup
+
+
+def _shared_reader(path, keys, repeat, queue):
+    cache = SharedMemoryCache(path, slots=len(keys) * 4, slot_size=32768)
+    queue.put(timed_lookups(shared_lookup(cache), keys, repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark cache tier latency and footprint')
+    parser.add_argument('--entries', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--redis-url', default=os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+    args = parser.parse_args()
+
+    keys = [f"places_nearby:{i:040x}" for i in range(args.entries)]
+    payloads = {key: json.dumps(places_response(i), separators=(',', ':')).encode()
+                for i, key in enumerate(keys)}
+    payload_bytes = sum(len(p) for p in payloads.values())
+    print(f"{args.entries} entries, {payload_bytes / args.entries / 1024:.1f} KiB serialized on average\n")
+
+    tracemalloc.start()
+    memory = MemoryCache(max_entries=args.entries)
+    for key, payload in payloads.items():
+        memory.set(key, json.loads(payload), 3600)
+    per_process = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    latency = timed_lookups(memory.get, keys, args.repeat)
+    print(f"per-process  {latency * 1e6:8.2f} us/hit   "
+          f"{per_process / 2**20:7.1f} MiB per worker, {per_process * args.workers / 2**20:7.1f} MiB "
+          f"for {args.workers} workers (each warmed separately)")
+
+    with tempfile.TemporaryDirectory(dir='/dev/shm' if os.path.isdir('/dev/shm') else None) as tmp:
+        path = os.path.join(tmp, 'cache')
+        # Sets fill unevenly, so the table is sized with headroom
+        shared = SharedMemoryCache(path, slots=args.entries * 4, slot_size=32768)
+        for key, payload in payloads.items():
+            shared.set_bytes(key, payload, 3600)
+        stored = sum(shared.get_bytes(key) is not None for key in keys)
+        latency = timed_lookups(shared_lookup(shared), keys, args.repeat)
+        raw = timed_lookups(shared.get_bytes, keys, args.repeat)
+        print(f"shared       {latency * 1e6:8.2f} us/hit   "
+              f"{payload_bytes / 2**20:7.1f} MiB of payload in a {shared.size / 2**20:.1f} MiB table, "
+              f"once per host ({stored / len(keys):.0%} of entries kept)")
+        print(f"             {raw * 1e6:8.2f} us/hit without json.loads")
+
+        ctx = multiprocessing.get_context('fork')
+        queue = ctx.Queue()
+        readers = [ctx.Process(target=_shared_reader, args=(path, keys, args.repeat, queue))
+                   for _ in range(args.workers)]
+        for reader in readers:
+            reader.start()
+        results = [queue.get() for _ in readers]
+        for reader in readers:
+            reader.join()
+        print(f"             {sum(results) / len(results) * 1e6:8.2f} us/hit with {args.workers} "
+              f"workers reading concurrently on {os.cpu_count()} CPUs")
+
+    try:
+        import redis
+        client = redis.Redis.from_url(args.redis_url, socket_connect_timeout=1)
+        client.ping()
+    except Exception as e:
+        print(f"redis        skipped ({e})")
+        return
+    for key, payload in payloads.items():
+        client.set(f"bench:{key}", payload, ex=300)
+    latency = timed_lookups(lambda k: json.loads(client.get(f"bench:{k}")), keys, max(1, args.repeat // 4))
+    print(f"redis        {latency * 1e6:8.2f} us/hit   one network round trip per lookup")
+    client.delete(*(f"bench:{key}" for key in keys))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Cold-start benchmark for the backend
+
+Measures, in fresh interpreter processes, how long it takes to import the app
+module and to serve the first /api/health and /api/search requests. Run it
+with an unreachable Redis to see that startup no longer waits on the connect
+timeout:
+
+    python benchmarks/bench_cold_start.py --runs 10 --redis-url redis://10.255.255.1:6379/0
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import json, time
+t0 = time.perf_counter()
+import app as app_module
+t1 = time.perf_counter()
+client = app_module.app.test_client()
+client.get('/api/health')
+t2 = time.perf_counter()
+client.post('/api/search', json={'query': 'coffee'})
+t3 = time.perf_counter()
+print(json.dumps({'import': t1 - t0, 'first_health': t2 - t1, 'first_search': t3 - t2}))
+'''
+
+
+def run_once(env):
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure import and first-request time')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--redis-url', default=None,
+                        help='REDIS_URL for the probe (default: inherit environment)')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.redis_url:
+        env['REDIS_URL'] = args.redis_url
+
+    samples = [run_once(env) for _ in range(args.runs)]
+    print(f"{'stage':<14} {'median ms':>10} {'max ms':>10}")
+    for stage in ('import', 'first_health', 'first_search'):
+        values = [s[stage] * 1000 for s in samples]
+        print(f"{stage:<14} {statistics.median(values):>10.1f} {max(values):>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Route geometry benchmark
+
+Measures polyline decode and Douglas-Peucker simplification throughput on a
+synthetic route, and the payload size of the route shape as raw coordinates,
+as the full encoded polyline and as the simplified encoded polyline at a few
+zoom levels.
+
+    python benchmarks/bench_geometry.py --points 20000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geometry import decode_polyline, encode_polyline, simplify, tolerance_for_zoom  # noqa: E402
+
+
+def decode_reference(encoded):
+    """Character-by-character decoder, the usual pure Python implementation"""
+    points, index, lat, lng = [], 0, 0, 0
+    while index < len(encoded):
+        for coord in range(2):
+            shift = result = 0
+            while True:
+                b = ord(encoded[index]) - 63
+                index += 1
+                result |= (b & 0x1f) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            delta = ~(result >> 1) if result & 1 else result >> 1
+            if coord == 0:
+                lat += delta
+            else:
+                lng += delta
+        points.append((lat / 1e5, lng / 1e5))
+    return points
+
+
+def synthetic_route(n, seed=0):
+    """A meandering route of ``n`` points spaced roughly 10 m apart"""
+    rng = np.random.default_rng(seed)
+    heading = np.cumsum(rng.normal(0, 0.05, n))
+    step = 10 / 111_000
+    lat = 40.7 + np.cumsum(np.cos(heading) * step)
+    lng = -74.0 + np.cumsum(np.sin(heading) * step / np.cos(np.radians(40.7)))
+    return np.round(np.column_stack((lat, lng)), 5)
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark route decode/simplify and payload size')
+    parser.add_argument('--points', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    route = synthetic_route(args.points)
+    encoded = encode_polyline(route)
+
+    ref_time, _ = timed(lambda: decode_reference(encoded), max(1, args.repeat // 5))
+    vec_time, decoded = timed(lambda: decode_polyline(encoded), args.repeat)
+    print(f"decode      reference {args.points / ref_time / 1e6:6.2f} Mpts/s   "
+          f"vectorized {args.points / vec_time / 1e6:6.2f} Mpts/s")
+
+    raw_json = len(json.dumps(decoded.tolist()))
+    print(f"\npayload     raw coordinates JSON {raw_json:>9,} bytes")
+    print(f"            full encoded         {len(encoded):>9,} bytes")
+    for zoom in (10, 13, 16):
+        tolerance = tolerance_for_zoom(zoom, 40.7)
+        simplify_time, simplified = timed(lambda: simplify(decoded, tolerance), args.repeat)
+        size = len(encode_polyline(simplified))
+        print(f"            zoom {zoom:>2} simplified    {size:>9,} bytes   "
+              f"{len(simplified):>6} pts   {raw_json / size:7.1f}x smaller   "
+              f"simplify {args.points / simplify_time / 1e6:5.2f} Mpts/s")
+
+
+if __name__ == '__main__':
+    main()
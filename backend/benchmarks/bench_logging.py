@@ -0,0 +1,92 @@
+"""
+Logging overhead under an error storm
+
+Simulates an upstream outage: several threads log the same error with a
+traceback as fast as they can. Reports the time spent inside the logging call
+on the request threads for
+
+* sync:     the previous setup, a plain synchronous StreamHandler
+* pipeline: the queue-based JSON pipeline with repeat suppression and sampling
+
+Output goes to a temporary file so terminal speed does not skew the numbers.
+
+    python benchmarks/bench_logging.py --threads 8 --calls 2000
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from structured_logging import JsonFormatter, LoggingPipeline, RepeatFilter, SamplingFilter  # noqa: E402
+
+
+def storm(logger: logging.Logger, threads: int, calls: int):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        local = []
+        for i in range(calls):
+            try:
+                raise TimeoutError('Google Maps request timed out')
+            except TimeoutError as e:
+                start = time.perf_counter()
+                logger.error("Error searching places: %s", e, exc_info=True,
+                             extra={'error_class': type(e).__name__})
+                local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    wall = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return latencies, time.perf_counter() - wall
+
+
+def report(name, latencies, wall):
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{name:<10} mean {statistics.mean(latencies) * 1e6:8.1f} us   "
+          f"p99 {p99 * 1e6:8.1f} us   wall {wall:6.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark logging overhead in an error storm')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--calls', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sync_logger = logging.getLogger('bench.sync')
+        sync_logger.propagate = False
+        sync_handler = logging.StreamHandler(open(os.path.join(tmp, 'sync.log'), 'w'))
+        sync_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+        sync_logger.addHandler(sync_handler)
+        report('sync', *storm(sync_logger, args.threads, args.calls))
+        sync_handler.close()
+
+        pipe_logger = logging.getLogger('bench.pipeline')
+        pipe_logger.propagate = False
+        output = logging.StreamHandler(open(os.path.join(tmp, 'pipeline.log'), 'w'))
+        output.setFormatter(JsonFormatter())
+        pipeline = LoggingPipeline(output)
+        pipeline.queue_handler.addFilter(SamplingFilter())
+        pipeline.queue_handler.addFilter(RepeatFilter(burst=5, window=60))
+        pipe_logger.addHandler(pipeline.queue_handler)
+        report('pipeline', *storm(pipe_logger, args.threads, args.calls))
+        pipeline.stop()
+        output.close()
+
+
+if __name__ == '__main__':
+    main()
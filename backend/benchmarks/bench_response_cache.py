@@ -0,0 +1,95 @@
+"""
+Per-request CPU time of /api/search with and without the response cache
+
+Runs the same search through the Flask test client against a stub Maps
+client (no network, upstream cache on) and reports CPU time per request for
+
+* uncached: every request runs the handler, ranking, generate_response
+  and jsonify (upstream results come from the upstream cache)
+* hit:      the encoded body is served from the response cache
+* 304:      the client revalidates with If-None-Match
+
+plus a floor: a trivial POST view returning the same bytes, i.e. the cost of
+the test client and the Flask/WSGI machinery alone. What a hit costs above
+that floor is the response cache's own work.
+
+    python benchmarks/bench_response_cache.py --requests 2000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('ADMISSION_ENABLED', 'false')
+
+from flask import Response  # noqa: E402
+
+from app import create_app  # noqa: E402
+
+CENTER = {'lat': 40.7128, 'lng': -74.0060}
+
+
+class StubMapsClient:
+    def geocode(self, address=None):
+        return [{'geometry': {'location': CENTER}}]
+
+    def places_nearby(self, **kwargs):
+        return {'results': [{
+            'name': f"Cafe {i}",
+            'place_id': f"ChIJplace{i:04d}",
+            'rating': 3.5 + (i % 15) / 10,
+            'price_level': i % 4,
+            'vicinity': f"{100 + i} Main Street, New York",
+            'types': ['cafe', 'food', 'point_of_interest', 'establishment'],
+            'opening_hours': {'open_now': i % 2 == 0},
+            'photos': [{'photo_reference': f"photo-{i}-{j}"} for j in range(3)],
+            'geometry': {'location': {'lat': CENTER['lat'] + 0.001 * i, 'lng': CENTER['lng']}},
+        } for i in range(20)]}
+
+
+def cpu_per_request(client, requests, **kwargs):
+    start = time.process_time()
+    for _ in range(requests):
+        response = client.open(**kwargs)
+        assert response.status_code in (200, 204, 304), response.status_code
+    return (time.process_time() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark per-request CPU on response cache hits')
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    search = {'path': '/api/search', 'method': 'POST',
+              'json': {'query': 'coffee', 'location': 'New York', 'radius': 2000}}
+
+    app = create_app({'RESPONSE_CACHE_ENABLED': False, 'RATELIMIT_ENABLED': False},
+                     maps_client=StubMapsClient())
+    with app.test_client() as client:
+        uncached = cpu_per_request(client, args.requests, **search)
+
+    app = create_app({'RATELIMIT_ENABLED': False}, maps_client=StubMapsClient())
+    stored = {}
+    app.add_url_rule('/bench/static', 'bench_static', methods=['POST'],
+                     view_func=lambda: Response(stored['body'], mimetype='application/json'))
+    with app.test_client() as client:
+        first = client.open(**search)
+        body, etag = first.data, first.headers['ETag']
+        stored['body'] = body
+        hit = cpu_per_request(client, args.requests, **search)
+        not_modified = cpu_per_request(client, args.requests, headers={'If-None-Match': etag}, **search)
+        baseline = cpu_per_request(client, args.requests, **{**search, 'path': '/bench/static'})
+
+    print(f"{len(body)} byte response\n")
+    print(f"{'static bytes (floor)':<22}  {baseline * 1e6:8.1f} us CPU/request")
+    for name, value in (('uncached', uncached), ('response cache hit', hit), ('304 revalidation', not_modified)):
+        print(f"{name:<22}  {value * 1e6:8.1f} us CPU/request   "
+              f"{(value - baseline) * 1e6:8.1f} us above the floor")
+
+
+if __name__ == '__main__':
+    main()
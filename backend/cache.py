@@ -0,0 +1,264 @@
+"""
+Tiered cache for upstream Google Maps responses
+
+Lookups go to a small per-process LRU first, then to an optional shared-memory
+table used by all workers on the host (see shm_cache.py), and then to Redis,
+which is shared by all hosts. Entries are JSON values keyed by the upstream
+method and its normalized parameters, so repeated geocodes, overlapping place
+searches and identical directions requests are served without calling Google.
+Values are serialized once and the same bytes are stored in both shared tiers.
+
+The shared tiers are optional: without them, or when Redis fails, the cache
+keeps working from what is left.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Returned by lookups on a cache miss (None is a valid cached value)
+MISSING = object()
+
+# Seconds entries are cached, per Google Maps method or derived result
+DEFAULT_TTLS = {
+    'geocode': 86400,
+    'places': 900,
+    'places_nearby': 900,
+    'directions': 900,
+    'travel_time_grid': 3600,
+    'radius_hint': 604800,
+    # Upper bound for empty upstream results (unknown location, no places,
+    # no route), so junk input is not re-sent upstream but real changes show up
+    'negative': 300,
+}
+
+
+def ttls_from_env() -> Dict[str, float]:
+    """Cache TTLs from CACHE_TTLS (``geocode:86400,places_nearby:600,...``)"""
+    ttls = dict(DEFAULT_TTLS)
+    for item in os.getenv('CACHE_TTLS', '').split(','):
+        name, _, value = item.strip().partition(':')
+        if name in ttls:
+            try:
+                ttls[name] = float(value)
+            except ValueError:
+                continue
+    return ttls
+
+
+def cache_key(namespace: str, params: Dict[str, Any]) -> str:
+    """Stable key for a method and its (JSON-compatible) parameters"""
+    canonical = json.dumps(params, sort_keys=True, separators=(',', ':'), default=str)
+    return f"{namespace}:{hashlib.sha1(canonical.encode()).hexdigest()}"
+
+
+class MemoryCache:
+    """Thread-safe LRU cache with per-entry expiry"""
+
+    def __init__(self, max_entries: int = 2048, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (self.clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def expires_in(self, key: str) -> Optional[float]:
+        """Seconds until ``key`` expires, or None if it is not cached"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        remaining = entry[0] - self.clock()
+        return remaining if remaining > 0 else None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class TieredCache:
+    """Process memory in front of optional host shared memory and Redis
+
+    Args:
+        memory: Per-process cache
+        shared: Host-local SharedMemoryCache
+        redis_provider: Callable returning a Redis client or None
+        on_redis_error: Called when a Redis command fails (e.g. to reconnect)
+        key_prefix: Prefix for keys stored in Redis
+        memory_ttl: Upper bound for how long entries stay in process memory,
+            so workers pick up refreshed Redis entries reasonably soon (not
+            applied when there is no shared tier to pick them up from)
+    """
+
+    def __init__(self, memory: Optional[MemoryCache] = None, shared: Any = None,
+                 redis_provider: Optional[Callable[[], Any]] = None,
+                 on_redis_error: Optional[Callable[[], None]] = None,
+                 key_prefix: str = 'cache:', memory_ttl: float = 300.0):
+        self.memory = memory if memory is not None else MemoryCache()
+        self.shared = shared
+        self._redis_provider = redis_provider
+        self._on_redis_error = on_redis_error
+        self.key_prefix = key_prefix
+        self.memory_ttl = memory_ttl
+        self._inflight: Dict[str, threading.Event] = {}
+        self._inflight_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _redis(self):
+        return self._redis_provider() if self._redis_provider else None
+
+    def _redis_failed(self, e: Exception) -> None:
+        logger.warning("Redis cache unavailable: %s", e, extra={'error_class': type(e).__name__})
+        if self._on_redis_error:
+            self._on_redis_error()
+
+    def get(self, key: str) -> Any:
+        """Return the cached value, or MISSING"""
+        value = self.memory.get(key)
+        if value is not MISSING:
+            return value
+        if self.shared is not None:
+            entry = self.shared.get_bytes(key)
+            if entry is not None:
+                raw, expires_at = entry
+                value = json.loads(raw)
+                self.memory.set(key, value, min(expires_at - time.time(), self.memory_ttl))
+                return value
+        client = self._redis()
+        if client is None:
+            return MISSING
+        try:
+            raw = client.get(self.key_prefix + key)
+            ttl = client.ttl(self.key_prefix + key) if raw is not None else None
+        except Exception as e:
+            self._redis_failed(e)
+            return MISSING
+        if raw is None:
+            return MISSING
+        value = json.loads(raw)
+        if ttl and ttl > 0:
+            self.memory.set(key, value, min(ttl, self.memory_ttl))
+            if self.shared is not None:
+                self.shared.set_bytes(key, raw if isinstance(raw, bytes) else raw.encode(), ttl)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        shared_tiers = self.shared is not None or self._redis_provider is not None
+        self.memory.set(key, value, min(ttl, self.memory_ttl) if shared_tiers else ttl)
+        client = self._redis()
+        if self.shared is None and client is None:
+            return
+        payload = json.dumps(value, separators=(',', ':')).encode()
+        if self.shared is not None:
+            self.shared.set_bytes(key, payload, ttl)
+        if client is None:
+            return
+        try:
+            client.set(self.key_prefix + key, payload, ex=max(1, int(ttl)))
+        except Exception as e:
+            self._redis_failed(e)
+
+    def expires_in(self, key: str) -> Optional[float]:
+        """
+        Seconds until ``key`` expires, or None if it is not cached
+
+        Asks the most widely shared tier available, so an entry that is only
+        left in process memory after a Redis flush counts as missing.
+        """
+        client = self._redis()
+        if client is not None:
+            try:
+                ttl = client.ttl(self.key_prefix + key)
+                return float(ttl) if ttl and ttl > 0 else None
+            except Exception as e:
+                self._redis_failed(e)
+        if self.shared is not None:
+            entry = self.shared.get_bytes(key)
+            return entry[1] - time.time() if entry is not None else None
+        return self.memory.expires_in(key)
+
+    def delete(self, key: str) -> None:
+        self.memory.delete(key)
+        if self.shared is not None:
+            self.shared.delete(key)
+        client = self._redis()
+        if client is None:
+            return
+        try:
+            client.delete(self.key_prefix + key)
+        except Exception as e:
+            self._redis_failed(e)
+
+    def get_or_load(self, key: str, ttl: Union[float, Callable[[Any], float]],
+                    loader: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for ``key``, calling ``loader`` on a miss
+
+        Concurrent misses for the same key in this process wait for a single
+        load instead of all calling upstream. Exceptions from ``loader`` are
+        not cached. ``ttl`` may be a function of the loaded value.
+        """
+        value = self.get(key)
+        if value is not MISSING:
+            self.hits += 1
+            return value
+
+        with self._inflight_lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+        if not leader:
+            event.wait(timeout=30)
+            value = self.get(key)
+            if value is not MISSING:
+                self.hits += 1
+                return value
+
+        self.misses += 1
+        try:
+            value = loader()
+            self.set(key, value, ttl(value) if callable(ttl) else ttl)
+            return value
+        finally:
+            if leader:
+                with self._inflight_lock:
+                    self._inflight.pop(key, None)
+                event.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'memory_entries': len(self.memory),
+            'shared': self.shared.stats() if self.shared is not None else None
+        }
@@ -0,0 +1,192 @@
+"""
+Production traffic capture
+
+When enabled (``CAPTURE_ENABLED=true``), every API request is written to a
+gzip-compressed JSON-lines log together with its timing and the upstream
+Google Maps responses LocationService received while serving it. The logs can
+be re-driven offline with ``replay.py``.
+
+Request bodies and upstream call parameters are sanitized before they are
+written: fields whose names look like credentials are dropped (except the
+chat ``session_id``), long strings are truncated and e-mail addresses and
+phone numbers in free text are masked. Replay looks recorded calls up by
+their sanitized parameters.
+"""
+
+import atexit
+import glob
+import gzip
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+from flask import Flask, g, has_request_context, request
+
+logger = logging.getLogger(__name__)
+
+SENSITIVE_KEY_PATTERN = re.compile(r'(key|token|secret|password|passwd|auth|cookie|session)', re.I)
+# Kept despite matching the pattern: chat follow-ups need their conversation id
+# to replay, and the Places search term is not a key
+ALLOWED_KEYS = frozenset(('session_id', 'keyword'))
+EMAIL_PATTERN = re.compile(r'[\w.+-]+@[\w-]+\.[\w.-]+')
+PHONE_PATTERN = re.compile(r'\+?\d[\d\s().-]{7,}\d')
+
+
+def sanitize(value: Any, max_length: int = 200) -> Any:
+    """Return a copy of a JSON value that is safe to persist"""
+    if isinstance(value, dict):
+        return {
+            k: sanitize(v, max_length)
+            for k, v in value.items()
+            if k in ALLOWED_KEYS or not SENSITIVE_KEY_PATTERN.search(str(k))
+        }
+    if isinstance(value, list):
+        return [sanitize(v, max_length) for v in value]
+    if isinstance(value, str):
+        value = EMAIL_PATTERN.sub('<email>', value)
+        value = PHONE_PATTERN.sub('<phone>', value)
+        return value[:max_length]
+    return value
+
+
+def sanitize_params(params: Dict[str, Any], max_length: int = 200) -> Dict[str, Any]:
+    """
+    Sanitized upstream call parameters, as captured and as looked up on replay
+
+    Parameters are made JSON-like first (e.g. datetimes become strings), so
+    the same call sanitizes to the same value on both sides.
+    """
+    return sanitize(json.loads(json.dumps(params, default=str)), max_length)
+
+
+class TrafficCapture:
+    """Record API requests and their upstream exchanges to compressed logs
+
+    The capture is registered as an observer on the MapsClientProxy used by
+    LocationService, and attaches upstream calls to the request currently
+    being served via ``flask.g``. Calls made outside a request are ignored.
+    """
+
+    def __init__(self, directory: str, sample_rate: float = 1.0,
+                 max_records_per_file: int = 5000, max_field_length: int = 200):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_records_per_file = max_records_per_file
+        self.max_field_length = max_field_length
+        self._lock = threading.Lock()
+        self._file = None
+        self._records_in_file = 0
+        self._file_seq = 0
+        os.makedirs(directory, exist_ok=True)
+        atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls) -> Optional['TrafficCapture']:
+        """Build a capture from environment variables, or None if disabled"""
+        if os.getenv('CAPTURE_ENABLED', 'false').lower() not in ('1', 'true', 'yes'):
+            return None
+        return cls(
+            directory=os.getenv('CAPTURE_DIR', 'captures'),
+            sample_rate=float(os.getenv('CAPTURE_SAMPLE_RATE', '1.0')),
+            max_records_per_file=int(os.getenv('CAPTURE_MAX_RECORDS_PER_FILE', '5000')),
+        )
+
+    def init_app(self, app: Flask) -> None:
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    # Flask hooks
+
+    def _before_request(self) -> None:
+        if not request.path.startswith('/api/') or request.path == '/api/health':
+            return
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        g._capture_record = {
+            'ts': time.time(),
+            'route': request.path,
+            'method': request.method,
+            'body': sanitize(request.get_json(silent=True), self.max_field_length),
+            'upstream': [],
+        }
+        g._capture_start = time.perf_counter()
+
+    def _after_request(self, response):
+        record = g.pop('_capture_record', None)
+        if record is not None:
+            record['status'] = response.status_code
+            record['duration_ms'] = round((time.perf_counter() - g.pop('_capture_start')) * 1000, 3)
+            self.write(record)
+        return response
+
+    # Upstream observer
+
+    def on_upstream_call(self, method: str, params: Dict[str, Any], response: Any,
+                         error: Optional[BaseException], elapsed: float) -> None:
+        if not has_request_context():
+            return
+        record = g.get('_capture_record')
+        if record is None:
+            return
+        record['upstream'].append({
+            'method': method,
+            'params': sanitize_params(params, self.max_field_length),
+            'response': response,
+            'error': str(error) if error is not None else None,
+            'elapsed_ms': round(elapsed * 1000, 3),
+        })
+
+    # Storage
+
+    def write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, default=str, separators=(',', ':'))
+        with self._lock:
+            if self._file is None:
+                self._open_next_file()
+            self._file.write(line + '\n')
+            self._records_in_file += 1
+            if self._records_in_file >= self.max_records_per_file:
+                self._file.close()
+                self._file = None
+
+    def _open_next_file(self) -> None:
+        self._file_seq += 1
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+        name = f"capture-{stamp}-{os.getpid()}-{self._file_seq:04d}.jsonl.gz"
+        self._file = gzip.open(os.path.join(self.directory, name), 'wt', encoding='utf-8')
+        self._records_in_file = 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_capture(paths: List[str]) -> Iterator[Dict[str, Any]]:
+    """Yield captured records from files, directories or glob patterns"""
+    files: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, '*.jsonl.gz'))))
+        else:
+            files.extend(sorted(glob.glob(path)) or [path])
+    for path in files:
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A worker killed mid-write leaves a truncated last line
+                        logger.warning("Skipping malformed capture line in %s", path)
+                        continue
+                    yield record
+        except (EOFError, OSError) as e:
+            logger.warning("Capture file %s is truncated: %s", path, e)
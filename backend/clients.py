@@ -0,0 +1,211 @@
+"""
+Lazily created, fork-safe clients for Redis and Google Maps
+
+Nothing here touches the network at import time. Clients are built on first
+use in the process that uses them, so gunicorn workers forked from a
+preloading master each get their own connection pool instead of sharing
+sockets inherited from the parent. When a client cannot be created it is
+retried in a background thread with exponential backoff, rather than falling
+back to None for the lifetime of the worker.
+"""
+
+import logging
+import os
+import threading
+import weakref
+from typing import Any, Callable, List, Optional
+
+import googlemaps
+from redis import ConnectionPool, Redis, RedisError
+
+from upstream import MapsClientProxy
+
+logger = logging.getLogger(__name__)
+
+# Every LazyClient, so a forked child can drop what it inherited
+_instances: 'weakref.WeakSet[LazyClient]' = weakref.WeakSet()
+
+
+def _reset_after_fork() -> None:
+    for instance in list(_instances):
+        instance.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class LazyClient:
+    """Build a client on first use and keep it per process
+
+    Args:
+        name: Name used in log messages
+        factory: Callable returning a ready client. It may raise, or return
+            None when the client is not configured at all (no retries then).
+        retry_interval: Initial delay between background reconnect attempts
+        max_retry_interval: Upper bound for the reconnect backoff
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any],
+                 retry_interval: float = 1.0, max_retry_interval: float = 30.0):
+        self.name = name
+        self._factory = factory
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self._stop = threading.Event()
+        self.reset()
+        _instances.add(self)
+
+    def reset(self) -> None:
+        """Forget the current client, e.g. after fork"""
+        self._pid = os.getpid()
+        self._client = None
+        self._attempted = False
+        self._reconnecting = False
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[Any]:
+        """Return the client, or None while it is unavailable
+
+        Only the first call in a process attempts to connect in the foreground;
+        later calls never block on the network.
+        """
+        if self._pid != os.getpid():
+            self.reset()
+        client = self._client
+        if client is not None or self._attempted:
+            return client
+        with self._lock:
+            if not self._attempted:
+                self._connect()
+                self._attempted = True
+        return self._client
+
+    def _connect(self) -> bool:
+        try:
+            client = self._factory()
+        except Exception as e:
+            logger.warning("%s not available (%s), retrying in background", self.name, e)
+            self._start_reconnect()
+            return False
+        self._client = client
+        return client is not None
+
+    def _start_reconnect(self) -> None:
+        if self._reconnecting or self._stop.is_set():
+            return
+        self._reconnecting = True
+        thread = threading.Thread(target=self._reconnect_loop, name=f"{self.name}-reconnect",
+                                  daemon=True)
+        thread.start()
+
+    def _reconnect_loop(self) -> None:
+        pid = os.getpid()
+        delay = self.retry_interval
+        while not self._stop.wait(delay):
+            if pid != os.getpid():
+                return
+            try:
+                client = self._factory()
+            except Exception as e:
+                logger.debug("%s reconnect failed: %s", self.name, e)
+                delay = min(delay * 2, self.max_retry_interval)
+                continue
+            self._client = client
+            self._reconnecting = False
+            logger.info("%s reconnected", self.name)
+            return
+
+    def invalidate(self) -> None:
+        """Drop a client that stopped working and reconnect in the background"""
+        with self._lock:
+            if self._client is None:
+                return
+            self._client = None
+            self._attempted = True
+            self._start_reconnect()
+
+    def close(self) -> None:
+        self._stop.set()
+
+
+class ServiceClients:
+    """Per-app holder for the Redis and Google Maps clients
+
+    Args:
+        redis_url: Redis connection URL, or None to run without Redis
+        maps_api_key: Google Maps API key, or None/placeholder when not configured
+        maps_client: Prebuilt Maps client (tests, replay); takes precedence
+            over ``maps_api_key``
+        redis_connect_timeout: Socket connect timeout for Redis, in seconds
+    """
+
+    PLACEHOLDER_API_KEY = 'your_google_maps_api_key_here'
+
+    def __init__(self, redis_url: Optional[str] = None, maps_api_key: Optional[str] = None,
+                 maps_client: Any = None, redis_connect_timeout: float = 1.0):
+        self.redis_url = redis_url
+        self.maps_api_key = maps_api_key
+        self.redis_connect_timeout = redis_connect_timeout
+        self.maps_observers: List[Any] = []
+        self._maps_client = maps_client
+        self._redis = LazyClient('Redis', self._create_redis)
+        self._maps = LazyClient('Google Maps client', self._create_maps)
+
+    @property
+    def maps_configured(self) -> bool:
+        return self._maps_client is not None or bool(
+            self.maps_api_key and self.maps_api_key != self.PLACEHOLDER_API_KEY
+        )
+
+    @property
+    def redis(self) -> Optional[Redis]:
+        return self._redis.get()
+
+    @property
+    def maps(self) -> Optional[MapsClientProxy]:
+        return self._maps.get()
+
+    def add_maps_observer(self, observer) -> None:
+        """Register an upstream observer on current and future Maps clients"""
+        if observer not in self.maps_observers:
+            self.maps_observers.append(observer)
+        proxy = self._maps._client
+        if proxy is not None:
+            proxy.add_observer(observer)
+
+    def redis_failed(self) -> None:
+        """Report a Redis error seen by a caller so the client is rebuilt"""
+        self._redis.invalidate()
+
+    def close(self) -> None:
+        self._redis.close()
+        self._maps.close()
+
+    def _create_redis(self) -> Optional[Redis]:
+        if not self.redis_url:
+            return None
+        pool = ConnectionPool.from_url(
+            self.redis_url,
+            socket_connect_timeout=self.redis_connect_timeout,
+            socket_timeout=self.redis_connect_timeout * 2,
+            health_check_interval=30,
+        )
+        client = Redis(connection_pool=pool)
+        try:
+            client.ping()
+        except RedisError:
+            pool.disconnect()
+            raise
+        return client
+
+    def _create_maps(self) -> Optional[MapsClientProxy]:
+        if self._maps_client is not None:
+            client = self._maps_client
+        elif self.maps_configured:
+            client = googlemaps.Client(key=self.maps_api_key)
+        else:
+            logger.warning("GOOGLE_MAPS_API_KEY not found or using placeholder value. "
+                           "Maps functionality will be limited.")
+            return None
+        return MapsClientProxy(client, self.maps_observers)
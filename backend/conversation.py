@@ -0,0 +1,149 @@
+"""
+Conversation context for multi-turn chat
+
+Each chat session keeps what the last turns resolved: the location string and
+its geocoded center, the query, radius and type, and the last result set. A
+follow-up like "what about bars?" then searches around the stored center
+without geocoding again, and a refinement like "which are open now?" is
+answered by re-ranking the stored results without any upstream call.
+
+Contexts live in Redis with a sliding TTL so that every web worker sees them,
+and in a bounded in-process LRU when Redis is not available. Each context is
+capped in size: results are stripped to the fields needed for re-ranking and
+only the last few queries are kept.
+"""
+
+import json
+import logging
+import re
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from cache import MISSING, MemoryCache
+
+logger = logging.getLogger(__name__)
+
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,128}$')
+
+# Fields of a place kept in the context, enough to re-rank and present it
+PLACE_FIELDS = ('name', 'place_id', 'rating', 'price_level', 'address', 'location',
+                'opening_hours', 'google_maps_url')
+
+FOLLOW_UP_PREFIXES = ('what about', 'how about', 'and what about', 'any', 'and', 'also')
+
+# Phrases that refine the previous results, with the ranking options they map to
+REFINEMENTS = (
+    (('open now', 'open ones', 'still open', 'which are open'), {'open_now': True}),
+    (('top rated', 'best rated', 'highest rated', 'best ones'), {'min_rating': 4.0, 'weights': {'rating': 1.0}}),
+    (('closest', 'nearest', 'closer'), {'weights': {'distance': 1.0, 'rating': 0.1}}),
+    (('cheapest', 'cheaper', 'less expensive'), {'weights': {'price': 1.0}}),
+)
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+def valid_session_id(session_id: Any) -> bool:
+    return isinstance(session_id, str) and bool(SESSION_ID_PATTERN.match(session_id))
+
+
+def follow_up_query(message: str) -> Optional[str]:
+    """The new subject of a follow-up such as "what about bars?", else None"""
+    text = message.strip().lower()
+    for prefix in FOLLOW_UP_PREFIXES:
+        if text.startswith(prefix + ' '):
+            subject = text[len(prefix):].strip(' ?.!')
+            return subject or None
+    return None
+
+
+def refinement_options(message: str) -> Optional[Dict[str, Any]]:
+    """Ranking options for a message refining the previous results, else None"""
+    text = message.lower()
+    options: Dict[str, Any] = {}
+    for phrases, values in REFINEMENTS:
+        if any(phrase in text for phrase in phrases):
+            for key, value in values.items():
+                if key == 'weights':
+                    options.setdefault('weights', {}).update(value)
+                else:
+                    options[key] = value
+    return options or None
+
+
+def compact_places(places: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    """Places stripped to PLACE_FIELDS, at most ``limit`` of them"""
+    return [{field: place.get(field) for field in PLACE_FIELDS} for place in places[:limit]]
+
+
+class ConversationStore:
+    """Per-session chat context in Redis, with an in-process fallback
+
+    Args:
+        redis_provider: Callable returning a Redis client or None
+        on_redis_error: Called when a Redis command fails (e.g. to reconnect)
+        ttl: Seconds a session is kept after its last turn
+        max_sessions: Sessions kept in process memory, least recently used
+            evicted first
+        max_results: Places kept from the last result set
+        max_history: Queries kept per session
+    """
+
+    KEY = 'chat:context:{}'
+
+    def __init__(self, redis_provider: Optional[Callable[[], Any]] = None,
+                 on_redis_error: Optional[Callable[[], None]] = None,
+                 ttl: int = 1800, max_sessions: int = 1000,
+                 max_results: int = 10, max_history: int = 5):
+        self._redis_provider = redis_provider
+        self._on_redis_error = on_redis_error
+        self.ttl = ttl
+        self.max_results = max_results
+        self.max_history = max_history
+        self.memory = MemoryCache(max_entries=max_sessions)
+
+    def _redis(self):
+        return self._redis_provider() if self._redis_provider else None
+
+    def _redis_failed(self, e: Exception) -> None:
+        logger.warning("Redis conversation store unavailable: %s", e,
+                       extra={'error_class': type(e).__name__})
+        if self._on_redis_error:
+            self._on_redis_error()
+
+    def load(self, session_id: str) -> Dict[str, Any]:
+        """Context of a session, empty if unknown or expired"""
+        client = self._redis()
+        if client is not None:
+            try:
+                raw = client.get(self.KEY.format(session_id))
+                if raw is not None:
+                    return json.loads(raw)
+            except Exception as e:
+                self._redis_failed(e)
+        context = self.memory.get(session_id)
+        return dict(context) if context is not MISSING else {}
+
+    def save(self, session_id: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Store a session's context, trimmed to the per-session bounds"""
+        context = dict(context)
+        context['results'] = compact_places(context.get('results') or [], self.max_results)
+        context['history'] = list(context.get('history') or [])[-self.max_history:]
+        self.memory.set(session_id, context, self.ttl)
+        client = self._redis()
+        if client is not None:
+            try:
+                client.set(self.KEY.format(session_id), json.dumps(context), ex=self.ttl)
+            except Exception as e:
+                self._redis_failed(e)
+        return context
+
+    def delete(self, session_id: str) -> None:
+        self.memory.delete(session_id)
+        client = self._redis()
+        if client is not None:
+            try:
+                client.delete(self.KEY.format(session_id))
+            except Exception as e:
+                self._redis_failed(e)
@@ -0,0 +1,112 @@
+"""
+Route corridor sampling for places-along-route search
+
+A route is covered by a chain of overlapping search circles. The number of
+circles adapts to the route length (a short walk needs a couple, a long drive
+is capped at ``max_samples``), circle centers are snapped to a coarse grid so
+that nearby or repeated routes produce identical, cacheable upstream requests,
+and candidates are scored by the detour needed to reach them from the route.
+"""
+
+import math
+from typing import Tuple
+
+import numpy as np
+
+from geometry import EARTH_RADIUS_M, _project
+
+# Shortest spacing between samples per travel mode, in meters
+MIN_SPACING_M = {
+    'walking': 250,
+    'bicycling': 600,
+    'transit': 1000,
+    'driving': 1500,
+}
+# Places API nearby search accepts radii up to 50 km
+MAX_RADIUS_M = 50000
+# Radii are rounded up to this step so that similar routes share cache entries
+RADIUS_STEP_M = 250
+METERS_PER_DEGREE = math.pi / 180 * EARTH_RADIUS_M
+
+
+def route_offsets(points: np.ndarray) -> np.ndarray:
+    """Cumulative distance in meters along a polyline at each of its points"""
+    if len(points) < 2:
+        return np.zeros(len(points))
+    xy = _project(points)
+    return np.concatenate(([0.0], np.cumsum(np.hypot(*np.diff(xy, axis=0).T))))
+
+
+def sample_plan(length_m: float, mode: str = 'driving', max_samples: int = 12) -> Tuple[int, float]:
+    """
+    Number of samples and search radius covering a route of ``length_m``
+
+    Samples are spread evenly from start to end, never closer than the
+    mode's minimum spacing. The radius overlaps neighbouring circles so that
+    the corridor is covered without gaps.
+    """
+    min_spacing = MIN_SPACING_M.get(mode, MIN_SPACING_M['driving'])
+    count = int(min(max(1, max_samples), math.ceil(length_m / min_spacing) + 1))
+    spacing = length_m / (count - 1) if count > 1 else length_m
+    radius = max(0.75 * spacing, min_spacing / 2)
+    radius = min(MAX_RADIUS_M, math.ceil(radius / RADIUS_STEP_M) * RADIUS_STEP_M)
+    return count, float(radius)
+
+
+def sample_route(points: np.ndarray, count: int) -> np.ndarray:
+    """``count`` points spaced evenly by distance along a polyline"""
+    if len(points) == 0:
+        return np.empty((0, 2))
+    offsets = route_offsets(points)
+    positions = np.linspace(0.0, offsets[-1], count) if count > 1 else np.array([offsets[-1] / 2])
+    return np.column_stack((np.interp(positions, offsets, points[:, 0]),
+                            np.interp(positions, offsets, points[:, 1])))
+
+
+def snap_to_grid(points: np.ndarray, cell_m: float) -> np.ndarray:
+    """
+    Snap points to the centers of a global grid of ``cell_m`` cells
+
+    Points falling into the same cell collapse into one; order along the
+    route is preserved.
+    """
+    if len(points) == 0:
+        return points
+    lat_step = cell_m / METERS_PER_DEGREE
+    rows = np.floor(points[:, 0] / lat_step)
+    lat = (rows + 0.5) * lat_step
+    lng_step = lat_step / np.maximum(np.cos(np.radians(lat)), 0.01)
+    cols = np.floor(points[:, 1] / lng_step)
+    snapped = np.round(np.column_stack((lat, (cols + 0.5) * lng_step)), 6)
+    _, first = np.unique(np.column_stack((rows, cols)), axis=0, return_index=True)
+    return snapped[np.sort(first)]
+
+
+def distance_to_route(lat: np.ndarray, lng: np.ndarray,
+                      route: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Distance from each point to the nearest point on a polyline
+
+    Returns:
+        Tuple of (distance to the route, offset along the route of the
+        nearest route point), both in meters
+    """
+    points = np.column_stack((lat, lng))
+    xy = _project(np.vstack((route, points)))
+    line, targets = xy[:len(route)], xy[len(route):]
+    if len(route) == 1:
+        return np.hypot(*(targets - line[0]).T), np.zeros(len(points))
+
+    start = line[:-1]
+    segment = line[1:] - start
+    seg_len2 = np.maximum((segment ** 2).sum(axis=1), 1e-9)
+    offsets = np.concatenate(([0.0], np.cumsum(np.hypot(*segment.T))))
+    # Projection of every point on every segment, clamped to the segment
+    rel = targets[:, None, :] - start[None, :, :]
+    t = np.clip((rel * segment[None, :, :]).sum(axis=2) / seg_len2, 0.0, 1.0)
+    nearest = start[None, :, :] + t[..., None] * segment[None, :, :]
+    dist = np.hypot(*(targets[:, None, :] - nearest).transpose(2, 0, 1))
+    best = np.argmin(dist, axis=1)
+    rows = np.arange(len(points))
+    along = offsets[best] + t[rows, best] * np.sqrt(seg_len2[best])
+    return dist[rows, best], along
@@ -1,80 +1,17 @@
 """
 Simple client example for testing the LLM Location Assistant API
+
+Uses the location_client package: one LocationClient keeps a pooled
+keep-alive connection, retries rate-limited or shed requests and caches
+responses as the server's Cache-Control headers allow.
 """
 
-import requests
-import json
-from typing import Dict, Any
+import os
+import sys
 
-class LocationAPIClient:
-    """Client for interacting with the Location Assistant API"""
-    
-    def __init__(self, base_url: str = "http://localhost:5001"):
-        self.base_url = base_url
-        self.session = requests.Session()
-        
-    def health_check(self) -> Dict[str, Any]:
-        """Check API health status"""
-        try:
-            response = self.session.get(f"{self.base_url}/api/health")
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            return {"error": str(e)}
-    
-    def search_places(self, query: str, location: str = None, 
-                     radius: int = 5000, place_type: str = None) -> Dict[str, Any]:
-        """Search for places"""
-        payload = {"query": query}
-        if location:
-            payload["location"] = location
-        if radius != 5000:
-            payload["radius"] = radius
-        if place_type:
-            payload["type"] = place_type
-            
-        try:
-            response = self.session.post(
-                f"{self.base_url}/api/search",
-                json=payload
-            )
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            return {"error": str(e)}
-    
-    def get_directions(self, origin: str, destination: str, 
-                      mode: str = "driving") -> Dict[str, Any]:
-        """Get directions between locations"""
-        payload = {
-            "origin": origin,
-            "destination": destination,
-            "mode": mode
-        }
-        
-        try:
-            response = self.session.post(
-                f"{self.base_url}/api/directions",
-                json=payload
-            )
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            return {"error": str(e)}
-    
-    def chat_query(self, message: str) -> Dict[str, Any]:
-        """Send a natural language query to the LLM chat endpoint"""
-        payload = {"message": message}
-        
-        try:
-            response = self.session.post(
-                f"{self.base_url}/api/llm-chat",
-                json=payload
-            )
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            return {"error": str(e)}
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from location_client import LocationAPIError, LocationClient  # noqa: E402
 
 def main():
     """Example usage of the Location API Client"""
@@ -82,15 +19,23 @@ def main():
     print("🗺️ LLM Location Assistant - Client Example")
     print("==========================================")
     
-    # Initialize client
-    client = LocationAPIClient()
+    # One client for all calls, reusing its connections
+    with LocationClient() as client:
+        run_examples(client)
+    
+    print("\n" + "=" * 50)
+    print("✅ Example completed! Check the web interface at http://localhost:5000")
+
+def run_examples(client: LocationClient):
+    """Call each endpoint once and print the results"""
     
     # Health check
     print("\n1. Health Check")
     print("-" * 30)
-    health = client.health_check()
-    if "error" in health:
-        print(f"❌ Error: {health['error']}")
+    try:
+        health = client.health()
+    except LocationAPIError as e:
+        print(f"❌ Error: {e}")
         return
     else:
         print(f"✅ Status: {health['status']}")
@@ -100,14 +45,14 @@ def main():
     # Example 1: Search for places
     print("\n2. Search for Places")
     print("-" * 30)
-    search_result = client.search_places(
-        query="Italian restaurants",
-        location="Manhattan, New York",
-        radius=2000
-    )
-    
-    if "error" in search_result:
-        print(f"❌ Error: {search_result['error']}")
+    try:
+        search_result = client.search_places(
+            query="Italian restaurants",
+            location="Manhattan, New York",
+            radius=2000
+        )
+    except LocationAPIError as e:
+        print(f"❌ Error: {e}")
     else:
         print(f"🔍 Query: {search_result['query_info']['original_query']}")
         places_data = search_result.get('places_data', {})
@@ -123,14 +68,14 @@ def main():
     # Example 2: Get directions
     print("\n3. Get Directions")
     print("-" * 30)
-    directions_result = client.get_directions(
-        origin="Times Square, New York",
-        destination="Central Park, New York",
-        mode="walking"
-    )
-    
-    if "error" in directions_result:
-        print(f"❌ Error: {directions_result['error']}")
+    try:
+        directions_result = client.get_directions(
+            origin="Times Square, New York",
+            destination="Central Park, New York",
+            mode="walking"
+        )
+    except LocationAPIError as e:
+        print(f"❌ Error: {e}")
     else:
         if directions_result.get('success'):
             print(f"🚶 From: {directions_result['start_address']}")
@@ -143,10 +88,10 @@ def main():
     # Example 3: Natural language chat
     print("\n4. Natural Language Query")
     print("-" * 30)
-    chat_result = client.chat_query("Find me good coffee shops near Brooklyn Bridge")
-    
-    if "error" in chat_result:
-        print(f"❌ Error: {chat_result['error']}")
+    try:
+        chat_result = client.chat("Find me good coffee shops near Brooklyn Bridge")
+    except LocationAPIError as e:
+        print(f"❌ Error: {e}")
     else:
         print(f"🤖 Response: {chat_result['response'][:200]}...")
         if chat_result.get('type') == 'places':
@@ -154,8 +99,16 @@ def main():
         else:
             print(f"💬 Type: {chat_result.get('type', 'General')}")
     
-    print("\n" + "=" * 50)
-    print("✅ Example completed! Check the web interface at http://localhost:5000")
+    # Example 4: Several searches at once over the same connections
+    print("\n5. Batch Search")
+    print("-" * 30)
+    searches = [{"query": query, "location": "Brooklyn, New York"}
+                for query in ("bakeries", "bookstores", "parks")]
+    for search, result in zip(searches, client.search_many(searches, return_exceptions=True)):
+        if isinstance(result, LocationAPIError):
+            print(f"❌ {search['query']}: {result}")
+        else:
+            print(f"📍 {search['query']}: {result['places_data'].get('results_count', 0)} places")
 
 if __name__ == "__main__":
     main()
@@ -3,12 +3,34 @@ Example integration with Open WebUI for LLM Location Assistant
 
 This example shows how to create a custom function for Open WebUI
 that integrates with our location API.
+
+All calls share one LocationClient per API URL (see location_client), so
+connections are kept alive between function calls and repeated questions
+are answered from the client's cache.
 """
 
-import requests
-import json
+import os
+import sys
+import threading
 from typing import Dict, Any
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from location_client import LocationAPIError, LocationClient  # noqa: E402
+
+_clients: Dict[str, LocationClient] = {}
+_clients_lock = threading.Lock()
+
+def get_client(api_base_url: str) -> LocationClient:
+    """Return the shared client for an API URL, creating it on first use"""
+    client = _clients.get(api_base_url)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(api_base_url)
+            if client is None:
+                client = _clients[api_base_url] = LocationClient(api_base_url, timeout=30.0)
+    return client
+
 class LocationAssistantFunction:
     """
     Open WebUI function for location-based queries
@@ -25,6 +47,10 @@ class LocationAssistantFunction:
     def __init__(self):
         self.valves = self.Valves()
     
+    @property
+    def client(self) -> LocationClient:
+        return get_client(self.valves.api_base_url)
+    
     def search_places(self, query: str, location: str = None) -> Dict[str, Any]:
         """
         Search for places using the location API
@@ -37,26 +63,11 @@ class LocationAssistantFunction:
             Dict containing search results
         """
         try:
-            response = requests.post(
-                f"{self.valves.api_base_url}/api/search",
-                json={
-                    "query": query,
-                    "location": location
-                },
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return {
-                    "error": f"API request failed with status {response.status_code}",
-                    "details": response.text
-                }
-        
-        except requests.RequestException as e:
+            return self.client.search_places(query, location=location)
+        except LocationAPIError as e:
             return {
-                "error": f"Failed to connect to location API: {str(e)}"
+                "error": str(e),
+                "details": e.payload
             }
     
     def get_directions(self, origin: str, destination: str, mode: str = "driving") -> Dict[str, Any]:
@@ -72,27 +83,11 @@ class LocationAssistantFunction:
             Dict containing directions data
         """
         try:
-            response = requests.post(
-                f"{self.valves.api_base_url}/api/directions",
-                json={
-                    "origin": origin,
-                    "destination": destination,
-                    "mode": mode
-                },
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return {
-                    "error": f"API request failed with status {response.status_code}",
-                    "details": response.text
-                }
-        
-        except requests.RequestException as e:
+            return self.client.get_directions(origin, destination, mode)
+        except LocationAPIError as e:
             return {
-                "error": f"Failed to connect to location API: {str(e)}"
+                "error": str(e),
+                "details": e.payload
             }
     
     def process_location_query(self, user_message: str) -> str:
@@ -106,36 +101,27 @@ class LocationAssistantFunction:
             Formatted response with location information
         """
         try:
-            response = requests.post(
-                f"{self.valves.api_base_url}/api/llm-chat",
-                json={"message": user_message},
-                timeout=30
-            )
+            data = self.client.chat(user_message)
+        except LocationAPIError as e:
+            if e.status_code is None:
+                return f"Sorry, I couldn't connect to the location service: {str(e)}"
+            return f"Sorry, I encountered an error processing your request (Status: {e.status_code})"
+        
+        if data.get('type') == 'places' and data.get('data', {}).get('places'):
+            # Format the response with places information
+            places = data['data']['places']
+            response_text = data['response']
             
-            if response.status_code == 200:
-                data = response.json()
-                
-                if data.get('type') == 'places' and data.get('data', {}).get('places'):
-                    # Format the response with places information
-                    places = data['data']['places']
-                    response_text = data['response']
-                    
-                    # Add interactive map links
-                    response_text += "\n\n🗺️ **Quick Actions:**\n"
-                    for i, place in enumerate(places[:3], 1):
-                        name = place.get('name', 'Unknown')
-                        maps_url = place.get('google_maps_url', '#')
-                        response_text += f"{i}. [Open {name} in Google Maps]({maps_url})\n"
-                    
-                    return response_text
-                else:
-                    return data.get('response', 'I couldn\'t process your location query.')
+            # Add interactive map links
+            response_text += "\n\n🗺️ **Quick Actions:**\n"
+            for i, place in enumerate(places[:3], 1):
+                name = place.get('name', 'Unknown')
+                maps_url = place.get('google_maps_url', '#')
+                response_text += f"{i}. [Open {name} in Google Maps]({maps_url})\n"
             
-            else:
-                return f"Sorry, I encountered an error processing your request (Status: {response.status_code})"
+            return response_text
         
-        except requests.RequestException as e:
-            return f"Sorry, I couldn't connect to the location service: {str(e)}"
+        return data.get('response', 'I couldn\'t process your location query.')
 
 # Example usage functions for Open WebUI
 
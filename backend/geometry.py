@@ -0,0 +1,173 @@
+"""
+Route geometry: polyline decoding, simplification and encoding
+
+Google returns route shapes as encoded polylines. To let the map draw a route
+without another round trip, get_directions decodes them into coordinate
+arrays, simplifies them with Douglas-Peucker at a tolerance matching the map
+zoom level (no point keeping detail smaller than a pixel), and re-encodes the
+result in the same compact polyline format.
+"""
+
+import math
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+# Ground resolution of one pixel at zoom 0 on the equator (Web Mercator, 256px tiles)
+METERS_PER_PIXEL_Z0 = 156543.03392
+MIN_ZOOM = 0
+MAX_ZOOM = 21
+
+
+def decode_polyline(encoded: str, precision: int = 5) -> np.ndarray:
+    """
+    Decode a Google encoded polyline into an (N, 2) array of (lat, lng)
+
+    The varints are decoded for the whole string at once with NumPy rather
+    than character by character.
+    """
+    if not encoded:
+        return np.empty((0, 2))
+    chars = np.frombuffer(encoded.encode('ascii'), dtype=np.uint8).astype(np.int64) - 63
+    if chars.min() < 0 or chars.max() > 63:
+        raise ValueError("Invalid character in encoded polyline")
+    last = chars < 0x20
+    if not last[-1]:
+        raise ValueError("Truncated encoded polyline")
+
+    # Index of the varint each character belongs to, and its 5-bit position in it
+    varint = np.cumsum(last) - last
+    starts = np.flatnonzero(np.concatenate(([True], last[:-1])))
+    shift = 5 * (np.arange(len(chars)) - starts[varint])
+    values = np.bincount(varint, weights=(chars & 0x1f) << shift).astype(np.int64)
+    if len(values) % 2:
+        raise ValueError("Encoded polyline has an odd number of values")
+
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+    return np.cumsum(deltas.reshape(-1, 2), axis=0) / 10 ** precision
+
+
+def _encode_value(value: int, out: List[str]) -> None:
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        out.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    out.append(chr(value + 63))
+
+
+def encode_polyline(points: Iterable, precision: int = 5) -> str:
+    """Encode (lat, lng) points as a Google encoded polyline"""
+    coords = np.round(np.asarray(points, dtype=float).reshape(-1, 2) * 10 ** precision).astype(np.int64)
+    if not len(coords):
+        return ''
+    deltas = np.diff(coords, axis=0, prepend=[[0, 0]])
+    out: List[str] = []
+    for lat, lng in deltas.tolist():
+        _encode_value(lat, out)
+        _encode_value(lng, out)
+    return ''.join(out)
+
+
+def _project(points: np.ndarray) -> np.ndarray:
+    """Equirectangular projection to meters around the points' mean latitude"""
+    lat0 = np.radians(points[:, 0].mean())
+    scale = np.pi / 180 * EARTH_RADIUS_M
+    return np.column_stack((points[:, 1] * scale * np.cos(lat0), points[:, 0] * scale))
+
+
+def simplify(points: np.ndarray, tolerance_m: float) -> np.ndarray:
+    """
+    Douglas-Peucker simplification with a tolerance in meters
+
+    Returns the subset of ``points`` (endpoints always kept) such that no
+    dropped point is farther than ``tolerance_m`` from the simplified line.
+    """
+    n = len(points)
+    if n <= 2 or tolerance_m <= 0:
+        return points
+    xy = _project(points)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, end = xy[first], xy[last]
+        segment = end - start
+        inner = xy[first + 1:last] - start
+        length = math.hypot(*segment)
+        if length == 0:
+            dist = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            dist = np.abs(segment[0] * inner[:, 1] - segment[1] * inner[:, 0]) / length
+        index = int(np.argmax(dist))
+        if dist[index] > tolerance_m:
+            split = first + 1 + index
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return points[keep]
+
+
+def tolerance_for_zoom(zoom: float, latitude: float, pixel_tolerance: float = 1.0) -> float:
+    """Ground distance (m) covered by ``pixel_tolerance`` pixels at a zoom level"""
+    return pixel_tolerance * METERS_PER_PIXEL_Z0 * math.cos(math.radians(latitude)) / 2 ** zoom
+
+
+def fit_zoom(bounds: Optional[Dict[str, Any]], viewport_px: int = 640) -> float:
+    """Zoom level at which route bounds fill a square viewport"""
+    if not bounds:
+        return 12.0
+    ne, sw = bounds['northeast'], bounds['southwest']
+    lat = (ne['lat'] + sw['lat']) / 2
+    height = abs(ne['lat'] - sw['lat']) * math.pi / 180 * EARTH_RADIUS_M
+    width = abs(ne['lng'] - sw['lng']) * math.pi / 180 * EARTH_RADIUS_M * math.cos(math.radians(lat))
+    span = max(height, width, 1.0)
+    zoom = math.log2(METERS_PER_PIXEL_Z0 * math.cos(math.radians(lat)) * viewport_px / span)
+    return float(min(MAX_ZOOM, max(MIN_ZOOM, math.floor(zoom))))
+
+
+def route_geometry(route: Dict[str, Any], zoom: Optional[float] = None,
+                   pixel_tolerance: float = 1.0) -> Dict[str, Any]:
+    """
+    Simplified overview and step geometry for a Directions API route
+
+    Args:
+        route: One route from the Directions API response
+        zoom: Map zoom level the geometry is drawn at; fitted to the route
+            bounds when not given
+        pixel_tolerance: Allowed deviation from the full shape, in pixels
+
+    Returns:
+        Dict with encoded ``overview`` and ``steps`` polylines plus point counts
+    """
+    bounds = route.get('bounds')
+    if zoom is None:
+        zoom = fit_zoom(bounds)
+    zoom = min(MAX_ZOOM, max(MIN_ZOOM, float(zoom)))
+
+    overview = decode_polyline(route.get('overview_polyline', {}).get('points', ''))
+    latitude = float(overview[:, 0].mean()) if len(overview) else 0.0
+    tolerance = tolerance_for_zoom(zoom, latitude, pixel_tolerance)
+    simplified = simplify(overview, tolerance)
+
+    steps = []
+    step_points = 0
+    for leg in route.get('legs', []):
+        for step in leg.get('steps', []):
+            points = simplify(decode_polyline(step.get('polyline', {}).get('points', '')), tolerance)
+            step_points += len(points)
+            steps.append(encode_polyline(points))
+
+    return {
+        'zoom': zoom,
+        'tolerance_m': round(tolerance, 2),
+        'overview': encode_polyline(simplified),
+        'overview_points': len(simplified),
+        'original_points': len(overview),
+        'steps': steps,
+        'step_points': step_points,
+        'bounds': bounds
+    }
@@ -0,0 +1,41 @@
+"""
+Gunicorn thread worker that reports how long requests waited for a thread
+
+Under load, requests queue inside each gunicorn worker until one of its
+threads is free. That wait is the queueing delay AdmissionController sheds on
+(see admission.py), but without a proxy in front nothing measures it. This
+worker notes when a connection with a request to read is handed to the thread
+pool and passes it on as ``X-Request-Start``. A header already on the request
+is kept only when it comes from a trusted proxy (gunicorn's
+``forwarded_allow_ips``, as for ``X-Forwarded-Proto``); anyone else could
+send an old timestamp to get requests shed. Enabled in gunicorn.conf.py.
+"""
+
+import time
+
+from gunicorn.workers.gthread import ThreadWorker
+
+REQUEST_START_HEADER = 'X-REQUEST-START'
+
+
+class QueueTimedThreadWorker(ThreadWorker):
+    """gthread worker stamping X-Request-Start when a request is queued"""
+
+    def enqueue_req(self, conn):
+        conn.queued_at = time.time()
+        super().enqueue_req(conn)
+
+    def _trusted_proxy(self, peer_addr) -> bool:
+        allowed = self.cfg.forwarded_allow_ips
+        # Peers on a unix socket are trusted, as gunicorn does
+        return '*' in allowed or not isinstance(peer_addr, tuple) or peer_addr[0] in allowed
+
+    def handle_request(self, req, conn):
+        stamped = any(name == REQUEST_START_HEADER for name, _ in req.headers)
+        if stamped and not self._trusted_proxy(req.peer_addr):
+            req.headers = [(name, value) for name, value in req.headers if name != REQUEST_START_HEADER]
+            stamped = False
+        queued_at = getattr(conn, 'queued_at', None)
+        if queued_at is not None and not stamped:
+            req.headers.append((REQUEST_START_HEADER, f"t={queued_at:.6f}"))
+        return super().handle_request(req, conn)
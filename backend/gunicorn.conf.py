@@ -0,0 +1,34 @@
+"""
+Gunicorn settings for the LLM Location Assistant
+
+Loaded automatically when gunicorn starts in this directory (the Docker
+image does). Workers are threaded (gthread), so a long-lived request such as
+a job progress stream occupies one thread of a worker rather than the whole
+worker; see JOBS_MAX_STREAMS in app.py for the cap on concurrent streams.
+
+The worker class also stamps ``X-Request-Start`` when a request starts
+waiting for a thread (see gthread_worker.py), which admission control needs
+to shed load without a proxy in front. A proxy's own header is only kept when
+it connects from FORWARDED_ALLOW_IPS (gunicorn's default: 127.0.0.1,::1).
+"""
+
+import os
+
+bind = '0.0.0.0:5000'
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+worker_class = 'gthread_worker.QueueTimedThreadWorker'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+timeout = 120
+preload_app = True
+
+# Admission control predicts waits from the number of threads per worker
+os.environ.setdefault('ADMISSION_WORKER_CONCURRENCY', str(threads))
+# Only one worker per host runs cache warming passes
+os.environ.setdefault('WARMING_LOCK_PATH', '/tmp/location-assistant-warming.lock')
+
+
+def post_worker_init(worker):
+    """Start cache warming as soon as a worker is up, not on its first request"""
+    state = getattr(worker.wsgi, 'extensions', {}).get('location_assistant')
+    if state and state['warmer'] is not None:
+        state['warmer'].start()
@@ -0,0 +1,138 @@
+"""
+Reachability (isochrone) polygons from a polar travel-time grid
+
+Travel times are measured from the origin to a grid of points laid out in
+rings around it, one point per bearing per ring. Rings get wider apart away
+from the origin, where a coarser answer is good enough. The grid is built
+once per origin cell and mode for a fixed time horizon and then reused: the
+polygon for any time limit, and the travel time to any point inside the
+horizon, are interpolated from it without further upstream calls.
+"""
+
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from geometry import EARTH_RADIUS_M
+
+# Typical straight-line progress per travel mode, in meters per second. The
+# grid for a mode reaches as far as this speed covers in the time horizon.
+MODE_SPEED_MPS = {
+    'walking': 1.4,
+    'bicycling': 4.2,
+    'transit': 8.0,
+    'driving': 15.0,
+}
+
+
+def horizon_radius(mode: str, max_minutes: float) -> float:
+    """Radius in meters of the travel-time grid for a mode"""
+    return MODE_SPEED_MPS.get(mode, MODE_SPEED_MPS['driving']) * max_minutes * 60
+
+
+def ring_distances(radius_m: float, rings: int) -> np.ndarray:
+    """Distance of each ring from the origin, the origin itself first (0)"""
+    return radius_m * (np.arange(rings + 1) / rings) ** 1.5
+
+
+def offset_points(center: Dict[str, float], distances: np.ndarray,
+                  bearings: np.ndarray) -> np.ndarray:
+    """Points at the given distances (m) and bearings (radians, from north) from center"""
+    lat = center['lat'] + np.degrees(distances * np.cos(bearings) / EARTH_RADIUS_M)
+    lng = center['lng'] + np.degrees(distances * np.sin(bearings) / EARTH_RADIUS_M
+                                     / math.cos(math.radians(center['lat'])))
+    return np.column_stack((np.round(lat, 6), np.round(lng, 6)))
+
+
+def grid_points(center: Dict[str, float], radius_m: float, rings: int, bearings: int) -> np.ndarray:
+    """(rings * bearings, 2) grid points, ring by ring, excluding the origin"""
+    distances = np.repeat(ring_distances(radius_m, rings)[1:], bearings)
+    angles = np.tile(np.arange(bearings) * 2 * np.pi / bearings, rings)
+    return offset_points(center, distances, angles)
+
+
+def _durations(grid: Dict) -> np.ndarray:
+    """(rings + 1, bearings) travel times in seconds, inf where unreachable"""
+    times = np.array([[np.inf if t is None else t for t in row] for row in grid['durations']], dtype=float)
+    return np.vstack((np.zeros(times.shape[1]), times))
+
+
+def reach_distances(grid: Dict, limit_s: float) -> Tuple[np.ndarray, bool]:
+    """
+    How far the origin reaches along each bearing within ``limit_s``
+
+    Along each bearing the farthest ring reached in time is found, and the
+    reach is interpolated linearly towards the next ring.
+
+    Returns:
+        Tuple of (distance in meters per bearing, whether the limit reaches
+        the edge of the grid on some bearing)
+    """
+    times = _durations(grid)
+    distances = ring_distances(grid['radius_m'], len(grid['durations']))
+    rings, bearings = times.shape
+    within = times <= limit_s
+    last = rings - 1 - np.argmax(within[::-1], axis=0)
+    cols = np.arange(bearings)
+    reach = distances[last]
+    inner = last < rings - 1
+    nxt = np.minimum(last + 1, rings - 1)
+    t0, t1 = times[last, cols], times[nxt, cols]
+    step = inner & np.isfinite(t1) & (t1 > t0)
+    fraction = np.zeros(bearings)
+    fraction[step] = (limit_s - t0[step]) / (t1[step] - t0[step])
+    reach = reach + np.clip(fraction, 0, 1) * (distances[nxt] - distances[last])
+    return reach, bool((~inner).any())
+
+
+def reach_polygon(grid: Dict, limit_s: float) -> Tuple[List[Dict[str, float]], bool]:
+    """Closed polygon (list of {'lat', 'lng'}) of what is reachable within ``limit_s``"""
+    reach, truncated = reach_distances(grid, limit_s)
+    bearings = np.arange(len(reach)) * 2 * np.pi / len(reach)
+    points = offset_points(grid['center'], reach, bearings)
+    polygon = [{'lat': lat, 'lng': lng} for lat, lng in points.tolist()]
+    return polygon + polygon[:1], truncated
+
+
+def travel_times(grid: Dict, lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+    """
+    Estimated travel time (s) from the grid origin to arbitrary points
+
+    Interpolated bilinearly in (distance, bearing) between grid points; inf
+    where a neighbouring grid point is unreachable or the point lies outside
+    the grid.
+    """
+    center = grid['center']
+    times = _durations(grid)
+    rings, bearings = times.shape
+    distances = ring_distances(grid['radius_m'], rings - 1)
+
+    north = np.radians(np.asarray(lat) - center['lat']) * EARTH_RADIUS_M
+    east = np.radians(np.asarray(lng) - center['lng']) * EARTH_RADIUS_M * math.cos(math.radians(center['lat']))
+    distance = np.hypot(north, east)
+    position = (np.arctan2(east, north) % (2 * np.pi)) / (2 * np.pi) * bearings
+
+    ring = np.clip(np.searchsorted(distances, distance, side='right') - 1, 0, rings - 2)
+    ring_frac = np.clip((distance - distances[ring]) / (distances[ring + 1] - distances[ring]), 0, 1)
+    b0 = np.floor(position).astype(int) % bearings
+    b1 = (b0 + 1) % bearings
+    bearing_frac = position - np.floor(position)
+
+    with np.errstate(invalid='ignore'):
+        inner = times[ring, b0] * (1 - bearing_frac) + times[ring, b1] * bearing_frac
+        outer = times[ring + 1, b0] * (1 - bearing_frac) + times[ring + 1, b1] * bearing_frac
+        estimate = inner * (1 - ring_frac) + outer * ring_frac
+    estimate[np.isnan(estimate) | (distance > distances[-1])] = np.inf
+    return estimate
+
+
+def polygon_area_km2(polygon: List[Dict[str, float]]) -> Optional[float]:
+    """Approximate area of a small lat/lng polygon (shoelace formula on a local projection)"""
+    if len(polygon) < 4:
+        return None
+    lat = np.array([p['lat'] for p in polygon])
+    lng = np.array([p['lng'] for p in polygon])
+    y = np.radians(lat) * EARTH_RADIUS_M
+    x = np.radians(lng) * EARTH_RADIUS_M * math.cos(math.radians(lat.mean()))
+    return round(float(abs(np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1])) / 2 / 1e6), 3)
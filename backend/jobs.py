@@ -0,0 +1,478 @@
+"""
+Asynchronous jobs for slow, multi-call location workloads
+
+Big batches and matrix requests do not fit in a synchronous request on one of
+the gunicorn workers. ``POST /api/jobs`` enqueues them instead; a JobWorker
+pool (``python worker.py`` in production, threads inside the web process for
+local runs without Redis) executes them with the same LocationService and
+records progress and results, which clients poll or stream.
+
+Job handlers are plain functions registered in JOB_HANDLERS. They receive the
+LocationService, the validated params and a ``progress(done, total)``
+callback, and return a JSON-serializable result.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from validation import MAX_TEXT_LENGTH, TRAVEL_MODES, ValidationError, validate_directions, validate_search
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_SIZE = int(os.getenv('JOBS_MAX_BATCH_SIZE', '100'))
+
+
+class JobError(ValueError):
+    """Raised for job requests that cannot be accepted"""
+
+
+class JobQueueUnavailable(Exception):
+    """Raised when the job queue cannot take or report work right now"""
+
+
+# Job handlers
+
+def _batch_search(service, params: Dict[str, Any], progress: Callable[[int, int], None]) -> Dict[str, Any]:
+    searches = params['searches']
+    results = []
+    for i, search in enumerate(searches):
+        results.append(service.search_places(
+            query=search['query'],
+            location=search.get('location'),
+            radius=search.get('radius', 5000),
+            place_type=search.get('type')
+        ))
+        progress(i + 1, len(searches))
+    return {'results': results}
+
+
+def _batch_directions(service, params: Dict[str, Any], progress: Callable[[int, int], None]) -> Dict[str, Any]:
+    routes = params['routes']
+    results = []
+    for i, route in enumerate(routes):
+        results.append(service.get_directions(
+            route['origin'], route['destination'], route.get('mode', 'driving')
+        ))
+        progress(i + 1, len(routes))
+    return {'results': results}
+
+
+def _distance_matrix(service, params: Dict[str, Any], progress: Callable[[int, int], None]) -> Dict[str, Any]:
+    return service.get_distance_matrix(
+        params['origins'], params['destinations'],
+        mode=params.get('mode', 'driving'), progress=progress
+    )
+
+
+def _validate_batch(params: Dict[str, Any], field: str, required: List[str],
+                    validate: Callable[[Dict[str, Any]], None]) -> None:
+    items = params.get(field)
+    if not isinstance(items, list) or not items:
+        raise JobError(f"'{field}' must be a non-empty list")
+    if len(items) > MAX_BATCH_SIZE:
+        raise JobError(f"'{field}' is limited to {MAX_BATCH_SIZE} entries")
+    for i, item in enumerate(items):
+        if not isinstance(item, dict) or any(not item.get(key) for key in required):
+            raise JobError(f"Each entry in '{field}' needs {', '.join(required)}")
+        try:
+            validate(item)
+        except ValidationError as e:
+            raise JobError(f"Entry {i} in '{field}': {e}")
+
+
+def _validate_matrix(params: Dict[str, Any]) -> None:
+    for field in ('origins', 'destinations'):
+        items = params.get(field)
+        if not isinstance(items, list) or not items or not all(isinstance(i, str) for i in items):
+            raise JobError(f"'{field}' must be a non-empty list of locations")
+        if any(len(i) > MAX_TEXT_LENGTH for i in items):
+            raise JobError(f"Locations in '{field}' are limited to {MAX_TEXT_LENGTH} characters")
+    if params.get('mode', 'driving') not in TRAVEL_MODES:
+        raise JobError(f"'mode' must be one of: {', '.join(TRAVEL_MODES)}")
+    if len(params['origins']) * len(params['destinations']) > MAX_BATCH_SIZE * 25:
+        raise JobError("Distance matrix is too large")
+
+
+JOB_HANDLERS: Dict[str, Dict[str, Callable]] = {
+    'batch_search': {
+        'run': _batch_search,
+        'validate': lambda p: _validate_batch(p, 'searches', ['query'], validate_search),
+    },
+    'batch_directions': {
+        'run': _batch_directions,
+        'validate': lambda p: _validate_batch(p, 'routes', ['origin', 'destination'], validate_directions),
+    },
+    'distance_matrix': {
+        'run': _distance_matrix,
+        'validate': _validate_matrix,
+    },
+}
+
+
+def validate_job(job_type: Any, params: Any) -> None:
+    """Raise JobError unless ``job_type`` and ``params`` describe a runnable job"""
+    if not isinstance(job_type, str) or job_type not in JOB_HANDLERS:
+        raise JobError(f"Unknown job type: {job_type}. Expected one of: {', '.join(sorted(JOB_HANDLERS))}")
+    if not isinstance(params, dict):
+        raise JobError("'params' must be an object")
+    JOB_HANDLERS[job_type]['validate'](params)
+
+
+def new_job(job_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    now = time.time()
+    return {
+        'id': uuid.uuid4().hex,
+        'type': job_type,
+        'params': params,
+        'status': 'queued',
+        'progress': {'done': 0, 'total': None},
+        'result': None,
+        'error': None,
+        'created_at': now,
+        'updated_at': now,
+        'version': 0,
+    }
+
+
+# Job stores
+
+class InMemoryJobStore:
+    """Process-local job queue for local runs without Redis
+
+    Jobs are only visible to the process that created them, so this store is
+    meant for a single development server, not for several gunicorn workers.
+    """
+
+    def __init__(self, result_ttl: int = 3600, max_jobs: int = 1000):
+        self.result_ttl = result_ttl
+        self.max_jobs = max_jobs
+        self._queue: 'queue.Queue[str]' = queue.Queue()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._changed = threading.Condition()
+
+    def enqueue(self, job_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        job = new_job(job_type, params)
+        with self._changed:
+            self._prune()
+            if len(self._jobs) >= self.max_jobs:
+                raise JobQueueUnavailable("Too many jobs queued, try again later")
+            self._jobs[job['id']] = job
+        self._queue.put(job['id'])
+        return dict(job)
+
+    def dequeue(self, timeout: float = 1.0) -> Optional[Dict[str, Any]]:
+        try:
+            job_id = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._changed:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def update(self, job_id: str, **fields) -> None:
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            job['updated_at'] = time.time()
+            job['version'] += 1
+            self._changed.notify_all()
+
+    def wait_for_change(self, job_id: str, version: int, timeout: float) -> Optional[Dict[str, Any]]:
+        with self._changed:
+            self._changed.wait_for(
+                lambda: self._jobs.get(job_id, {}).get('version', version) != version,
+                timeout=timeout
+            )
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    # Jobs are lost with the process anyway, so there are no leases to keep
+
+    def touch(self, job_id: str) -> None:
+        pass
+
+    def ack(self, job_id: str) -> None:
+        pass
+
+    def requeue_stale(self) -> int:
+        return 0
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.result_ttl
+        for job_id in [j['id'] for j in self._jobs.values()
+                       if j['status'] in ('succeeded', 'failed') and j['updated_at'] < cutoff]:
+            del self._jobs[job_id]
+
+
+class RedisJobStore:
+    """Redis-backed job queue shared by the web workers and the worker pool
+
+    A taken job moves from the queue to a processing list, and its worker
+    holds a lease on it that it renews while the job runs (``touch``) and
+    drops when it is done (``ack``). Jobs whose lease ran out, because their
+    worker crashed or was killed, are put back on the queue by
+    ``requeue_stale``, or failed once they were interrupted ``max_attempts``
+    times.
+
+    Args:
+        redis_provider: Callable returning the current Redis client (or None)
+        result_ttl: Seconds job records are kept after their last update
+        lease_ttl: Seconds a lease lasts unless renewed
+        max_attempts: Runs of a job before an interrupted one is failed
+    """
+
+    QUEUE_KEY = 'jobs:queue'
+    PROCESSING_KEY = 'jobs:processing'
+    JOB_KEY = 'jobs:job:{}'
+    LEASE_KEY = 'jobs:lease:{}'
+
+    def __init__(self, redis_provider: Callable[[], Any], result_ttl: int = 3600,
+                 poll_interval: float = 0.5, lease_ttl: int = 60, max_attempts: int = 3):
+        self._redis_provider = redis_provider
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.lease_ttl = lease_ttl
+        self.max_attempts = max_attempts
+        # Jobs found without a lease on the last requeue_stale call
+        self._unleased: Set[str] = set()
+
+    @property
+    def _redis(self):
+        client = self._redis_provider()
+        if client is None:
+            raise JobQueueUnavailable("Job queue is not available")
+        return client
+
+    def enqueue(self, job_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        job = new_job(job_type, params)
+        pipe = self._redis.pipeline()
+        pipe.set(self.JOB_KEY.format(job['id']), json.dumps(job), ex=self.result_ttl)
+        pipe.lpush(self.QUEUE_KEY, job['id'])
+        pipe.execute()
+        return job
+
+    def dequeue(self, timeout: float = 1.0) -> Optional[Dict[str, Any]]:
+        item = self._redis.blmove(self.QUEUE_KEY, self.PROCESSING_KEY, max(1, int(timeout)),
+                                  src='RIGHT', dest='LEFT')
+        if not item:
+            return None
+        job_id = item.decode() if isinstance(item, bytes) else item
+        self.touch(job_id)
+        job = self.get(job_id)
+        if job is None:
+            # Expired while it was queued
+            self.ack(job_id)
+        return job
+
+    def touch(self, job_id: str) -> None:
+        """Take or renew the lease on a job this worker runs"""
+        self._redis.set(self.LEASE_KEY.format(job_id), '1', ex=self.lease_ttl)
+
+    def ack(self, job_id: str) -> None:
+        """Drop a finished job from the processing list, with its lease"""
+        pipe = self._redis.pipeline()
+        pipe.lrem(self.PROCESSING_KEY, 1, job_id)
+        pipe.delete(self.LEASE_KEY.format(job_id))
+        pipe.execute()
+
+    def requeue_stale(self) -> int:
+        """
+        Put jobs whose worker stopped renewing their lease back on the queue
+
+        A job is only taken back when it was found without a lease on the
+        previous call too, so that a worker that has just taken it has time
+        to set one. Returns the number of jobs requeued or failed.
+        """
+        client = self._redis
+        job_ids = [i.decode() if isinstance(i, bytes) else i
+                   for i in client.lrange(self.PROCESSING_KEY, 0, -1)]
+        pipe = client.pipeline()
+        for job_id in job_ids:
+            pipe.exists(self.LEASE_KEY.format(job_id))
+        unleased = {job_id for job_id, leased in zip(job_ids, pipe.execute()) if not leased}
+        stale, self._unleased = unleased & self._unleased, unleased - self._unleased
+        reclaimed = 0
+        for job_id in stale:
+            # Whoever removes it from the processing list reclaims it
+            if not client.lrem(self.PROCESSING_KEY, 1, job_id):
+                continue
+            job = self.get(job_id)
+            if job is None or job['status'] in ('succeeded', 'failed'):
+                continue
+            attempts = job.get('attempts', 0) + 1
+            if attempts >= self.max_attempts:
+                logger.error("Job %s (%s) was interrupted %d times, failing it", job_id, job['type'], attempts)
+                self.update(job_id, status='failed', attempts=attempts,
+                            error='The job was interrupted too many times')
+            else:
+                logger.warning("Job %s (%s) was interrupted, requeueing it", job_id, job['type'])
+                self.update(job_id, status='queued', attempts=attempts)
+                client.lpush(self.QUEUE_KEY, job_id)
+            reclaimed += 1
+        return reclaimed
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raw = self._redis.get(self.JOB_KEY.format(job_id))
+        return json.loads(raw) if raw else None
+
+    def update(self, job_id: str, **fields) -> None:
+        # Each job is only ever updated by the worker running it, or by
+        # requeue_stale once that worker lost its lease, so a plain
+        # read-modify-write is safe here
+        job = self.get(job_id)
+        if job is None:
+            return
+        job.update(fields)
+        job['updated_at'] = time.time()
+        job['version'] += 1
+        self._redis.set(self.JOB_KEY.format(job_id), json.dumps(job), ex=self.result_ttl)
+
+    def wait_for_change(self, job_id: str, version: int, timeout: float) -> Optional[Dict[str, Any]]:
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job['version'] != version or time.monotonic() >= deadline:
+                return job
+            time.sleep(self.poll_interval)
+
+
+# Worker pool
+
+class JobWorker:
+    """Run queued jobs on a small pool of threads
+
+    Args:
+        store: Job store to take work from
+        service_provider: Callable returning a LocationService (or None)
+        concurrency: Number of jobs run at the same time
+        context_factory: Optional callable returning a context manager entered
+            around each job (e.g. ``app.app_context``)
+        lease_interval: Seconds between renewals of the leases on running
+            jobs, and between looks for interrupted jobs; well below the
+            store's lease TTL
+    """
+
+    def __init__(self, store, service_provider: Callable[[], Any], concurrency: int = 1,
+                 context_factory: Optional[Callable[[], Any]] = None, lease_interval: float = 10.0):
+        self.store = store
+        self.service_provider = service_provider
+        self.concurrency = concurrency
+        self.context_factory = context_factory
+        self.lease_interval = lease_interval
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._running: Set[str] = set()
+        self._running_lock = threading.Lock()
+
+    def start(self) -> None:
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._keep_leases, name='job-leases', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def run_forever(self) -> None:
+        self.start()
+        try:
+            while not self._stop.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            self.stop()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                job = self.store.dequeue(timeout=1.0)
+            except Exception as e:
+                logger.warning("Could not take job from queue: %s", e)
+                self._stop.wait(1.0)
+                continue
+            if job is None:
+                continue
+            try:
+                self.run_job(job)
+            except Exception as e:
+                # Never let one job take the thread down with it
+                logger.error("Job %s (%s) could not be run: %s", job.get('id'), job.get('type'), e)
+
+    def _keep_leases(self) -> None:
+        while not self._stop.wait(self.lease_interval):
+            with self._running_lock:
+                running = list(self._running)
+            try:
+                for job_id in running:
+                    self.store.touch(job_id)
+                self.store.requeue_stale()
+            except Exception as e:
+                logger.warning("Could not renew job leases: %s", e)
+
+    def run_job(self, job: Dict[str, Any]) -> None:
+        job_id = job['id']
+        with self._running_lock:
+            self._running.add(job_id)
+        try:
+            self._run(job)
+        finally:
+            with self._running_lock:
+                self._running.discard(job_id)
+            try:
+                self.store.ack(job_id)
+            except Exception as e:
+                # Its lease runs out and requeue_stale drops it
+                logger.warning("Could not acknowledge job %s: %s", job_id, e)
+
+    def _run(self, job: Dict[str, Any]) -> None:
+        job_id = job['id']
+
+        def progress(done: int, total: int) -> None:
+            self._update(job_id, progress={'done': done, 'total': total})
+
+        try:
+            self.store.update(job_id, status='running')
+            if self.context_factory:
+                with self.context_factory():
+                    result = self._execute(job, progress)
+            else:
+                result = self._execute(job, progress)
+        except Exception as e:
+            logger.error("Job %s (%s) failed: %s", job_id, job['type'], e)
+            self._update(job_id, status='failed', error=str(e), final=True)
+            return
+        if not self._update(job_id, status='succeeded', result=result, final=True):
+            self._update(job_id, status='failed', error='Could not store the job result', final=True)
+
+    def _update(self, job_id: str, final: bool = False, **fields) -> bool:
+        """Update a job, logging instead of raising; final updates are retried a few times"""
+        for attempt in range(3 if final else 1):
+            if attempt:
+                self._stop.wait(attempt)
+            try:
+                self.store.update(job_id, **fields)
+                return True
+            except Exception as e:
+                logger.warning("Could not update job %s: %s", job_id, e)
+        return False
+
+    def _execute(self, job: Dict[str, Any], progress: Callable[[int, int], None]) -> Any:
+        service = self.service_provider()
+        if service is None:
+            raise JobError("Google Maps service not available")
+        return JOB_HANDLERS[job['type']]['run'](service, job['params'], progress)
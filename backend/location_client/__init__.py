@@ -0,0 +1,21 @@
+"""
+Python client for the LLM Location Assistant API
+
+    from location_client import LocationClient
+
+    with LocationClient('http://localhost:5001') as client:
+        results = client.search_places('coffee', location='Boston, MA')
+
+AsyncLocationClient offers the same calls for asyncio code.
+"""
+
+from .cache import HTTPCache
+from .client import AsyncLocationClient, LocationAPIError, LocationClient, parse_retry_after
+
+__all__ = [
+    'AsyncLocationClient',
+    'HTTPCache',
+    'LocationAPIError',
+    'LocationClient',
+    'parse_retry_after',
+]
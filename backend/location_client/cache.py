@@ -0,0 +1,100 @@
+"""
+Local cache of API responses, driven by the server's caching headers
+
+The API marks cacheable responses with ``Cache-Control: max-age`` and an
+``ETag`` (see response_cache.py on the server). Within max-age a repeated
+request is answered locally without a round trip; after that it is sent with
+``If-None-Match`` and a ``304 Not Modified`` reuses the stored body.
+``no-store`` responses are never kept, ``no-cache`` ones are always
+revalidated.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+
+class CacheEntry(NamedTuple):
+    body: Any
+    etag: Optional[str]
+    fresh_until: float
+
+
+def request_key(method: str, path: str, payload: Any = None) -> str:
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return f"{method} {path} {hashlib.sha1(canonical.encode()).hexdigest()}"
+
+
+def max_age(cache_control: Optional[str]) -> Optional[float]:
+    """Seconds a response may be reused without revalidation, or None if it must not be stored"""
+    directives = {}
+    for part in (cache_control or '').split(','):
+        name, _, value = part.strip().partition('=')
+        directives[name.lower()] = value.strip('"')
+    if 'no-store' in directives:
+        return None
+    if 'no-cache' in directives:
+        return 0.0
+    try:
+        return max(0.0, float(directives.get('max-age', 0)))
+    except ValueError:
+        return 0.0
+
+
+class HTTPCache:
+    """Thread-safe LRU of decoded response bodies with their ETag and freshness
+
+    Args:
+        max_entries: Responses kept, least recently used evicted first
+        clock: Monotonic clock, replaceable in tests
+    """
+
+    def __init__(self, max_entries: int = 256, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, CacheEntry]' = OrderedDict()
+        self.hits = 0
+        self.revalidated = 0
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return entry.fresh_until > self.clock()
+
+    def store(self, key: str, body: Any, headers) -> None:
+        """Keep a 200 response if its headers allow it"""
+        age = max_age(headers.get('Cache-Control'))
+        etag = headers.get('ETag')
+        if age is None or (age == 0 and not etag):
+            return
+        with self._lock:
+            self._entries[key] = CacheEntry(body, etag, self.clock() + age)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def refresh(self, key: str, entry: CacheEntry, headers) -> CacheEntry:
+        """Extend a stored entry after a 304 and return it"""
+        age = max_age(headers.get('Cache-Control'))
+        entry = entry._replace(etag=headers.get('ETag', entry.etag),
+                               fresh_until=self.clock() + (age or 0.0))
+        with self._lock:
+            self._entries[key] = entry
+        self.revalidated += 1
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {'entries': len(self._entries), 'hits': self.hits, 'revalidated': self.revalidated}
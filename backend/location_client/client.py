@@ -0,0 +1,369 @@
+"""
+Synchronous and asyncio clients for the Location Assistant API
+
+Both clients keep one pooled keep-alive connection pool (an httpx client) for
+their lifetime, so repeated calls reuse connections instead of reconnecting.
+Create one client per process (or per event loop) and share it.
+
+Requests the server turned away without processing them (``429`` rate
+limited, ``503`` load shed) are retried after the server's ``Retry-After``;
+other gateway errors and connection failures are retried with exponential
+backoff and jitter, for idempotent requests only. Responses are cached
+locally as the server's ``Cache-Control`` and ``ETag`` headers allow (see
+cache.py).
+"""
+
+import asyncio
+import email.utils
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+import httpx
+
+from .cache import CacheEntry, HTTPCache, request_key
+
+DEFAULT_BASE_URL = 'http://localhost:5001'
+# Statuses worth retrying; the server did not process 429 and 503 at all
+RETRY_STATUSES = frozenset((429, 502, 503, 504))
+NOT_PROCESSED_STATUSES = frozenset((429, 503))
+# Longest Retry-After honored before giving up
+MAX_RETRY_AFTER = 90.0
+
+
+class LocationAPIError(Exception):
+    """Raised when the API cannot be reached or answers with an error
+
+    Attributes:
+        status_code: HTTP status, None if the API was not reached
+        payload: Decoded error body, if any
+    """
+
+    def __init__(self, message: str, status_code: Optional[int] = None, payload: Any = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.payload = payload
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (seconds or HTTP date), or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - (now if now is not None else time.time()))
+
+
+def _compact(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in payload.items() if value is not None}
+
+
+class _BaseClient:
+    """Request preparation, retry policy and response handling shared by both clients"""
+
+    def __init__(self, max_retries: int, backoff: float, max_backoff: float,
+                 cache: Union[bool, HTTPCache]):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        if cache is True:
+            cache = HTTPCache()
+        self.cache: Optional[HTTPCache] = cache if isinstance(cache, HTTPCache) else None
+
+    def _lookup(self, method: str, path: str, payload: Any):
+        """Cache key, stored entry (or None) and conditional request headers"""
+        if self.cache is None:
+            return None, None, {}
+        key = request_key(method, path, payload)
+        entry = self.cache.get(key)
+        headers = {'If-None-Match': entry.etag} if entry is not None and entry.etag else {}
+        return key, entry, headers
+
+    def _fresh(self, entry: Optional[CacheEntry]) -> bool:
+        if entry is None or not self.cache.is_fresh(entry):
+            return False
+        self.cache.hits += 1
+        return True
+
+    def _retry_delay(self, attempt: int, status: Optional[int], idempotent: bool,
+                     response: Optional[httpx.Response] = None) -> Optional[float]:
+        """Seconds to wait before retrying, or None if the request should not be retried"""
+        if attempt >= self.max_retries:
+            return None
+        if status is None or status not in NOT_PROCESSED_STATUSES:
+            if not idempotent or (status is not None and status not in RETRY_STATUSES):
+                return None
+        if response is not None:
+            delay = parse_retry_after(response.headers.get('Retry-After'))
+            if delay is not None:
+                return delay if delay <= MAX_RETRY_AFTER else None
+        return min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    def _finish(self, key: Optional[str], entry: Optional[CacheEntry], response: httpx.Response) -> Any:
+        if response.status_code == 304 and entry is not None:
+            return self.cache.refresh(key, entry, response.headers).body
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        if response.is_success:
+            if key is not None and response.status_code == 200:
+                self.cache.store(key, body, response.headers)
+            return body
+        message = body.get('error') if isinstance(body, dict) else None
+        raise LocationAPIError(message or f"API request failed with status {response.status_code}",
+                               status_code=response.status_code, payload=body)
+
+    # Request payloads
+
+    @staticmethod
+    def _search_payload(query: str, location: Optional[str] = None, radius: Optional[float] = None,
+                        place_type: Optional[str] = None, **options) -> Dict[str, Any]:
+        return _compact({'query': query, 'location': location, 'radius': radius,
+                         'type': place_type, **options})
+
+    @staticmethod
+    def _directions_payload(origin: str, destination: str, mode: Optional[str] = None,
+                            **options) -> Dict[str, Any]:
+        return _compact({'origin': origin, 'destination': destination, 'mode': mode, **options})
+
+    @staticmethod
+    def _chat_payload(message: str, session_id: Optional[str] = None,
+                      context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return _compact({'message': message, 'session_id': session_id, 'context': context})
+
+
+class LocationClient(_BaseClient):
+    """Thread-safe synchronous client
+
+    Args:
+        base_url: Root URL of the API
+        timeout: Seconds per request attempt
+        max_retries: Retries after the first attempt
+        backoff: Initial backoff in seconds, doubled per retry
+        max_backoff: Upper bound for a backoff delay
+        max_connections: Size of the keep-alive connection pool
+        cache: HTTPCache to use (shareable between clients), True for a new
+            one, False to disable local caching
+        transport: httpx transport, e.g. ``httpx.MockTransport`` in tests
+        sleep: Function used to wait between retries
+    """
+
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, *, timeout: float = 30.0,
+                 max_retries: int = 3, backoff: float = 0.5, max_backoff: float = 30.0,
+                 max_connections: int = 20, cache: Union[bool, HTTPCache] = True,
+                 transport: Optional[httpx.BaseTransport] = None,
+                 sleep: Callable[[float], None] = time.sleep):
+        super().__init__(max_retries, backoff, max_backoff, cache)
+        self.max_connections = max_connections
+        self._sleep = sleep
+        self._http = httpx.Client(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport
+        )
+
+    def request(self, method: str, path: str, payload: Any = None, idempotent: bool = True) -> Any:
+        """Send a request with retries and local caching; returns the decoded body"""
+        key, entry, headers = self._lookup(method, path, payload)
+        if self._fresh(entry):
+            return entry.body
+        attempt = 0
+        while True:
+            try:
+                response = self._http.request(method, path, json=payload, headers=headers)
+            except httpx.TransportError as e:
+                delay = self._retry_delay(attempt, None, idempotent)
+                if delay is None:
+                    raise LocationAPIError(f"Failed to connect to location API: {e}") from e
+            else:
+                delay = self._retry_delay(attempt, response.status_code, idempotent, response)
+                if response.status_code not in RETRY_STATUSES or delay is None:
+                    return self._finish(key, entry, response)
+            self._sleep(delay)
+            attempt += 1
+
+    def close(self) -> None:
+        self._http.close()
+
+    def __enter__(self) -> 'LocationClient':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # Endpoints
+
+    def health(self) -> Dict[str, Any]:
+        return self.request('GET', '/api/health')
+
+    def search_places(self, query: str, location: Optional[str] = None, radius: Optional[float] = None,
+                      place_type: Optional[str] = None, **options) -> Dict[str, Any]:
+        """POST /api/search; ``options`` are further payload fields (min_rating, ...)"""
+        return self.request('POST', '/api/search', self._search_payload(query, location, radius, place_type, **options))
+
+    def get_directions(self, origin: str, destination: str, mode: Optional[str] = None,
+                       **options) -> Dict[str, Any]:
+        return self.request('POST', '/api/directions', self._directions_payload(origin, destination, mode, **options))
+
+    def search_along_route(self, query: str, origin: str, destination: str, **options) -> Dict[str, Any]:
+        return self.request('POST', '/api/search/along-route',
+                            _compact({'query': query, 'origin': origin, 'destination': destination, **options}))
+
+    def reachable(self, origin: str, minutes: float, **options) -> Dict[str, Any]:
+        return self.request('POST', '/api/reachable', _compact({'origin': origin, 'minutes': minutes, **options}))
+
+    def chat(self, message: str, session_id: Optional[str] = None,
+             context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        # Each turn updates the session's context, so it must not be applied twice
+        return self.request('POST', '/api/llm-chat', self._chat_payload(message, session_id, context),
+                            idempotent=False)
+
+    def create_job(self, job_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        return self.request('POST', '/api/jobs', {'type': job_type, 'params': params}, idempotent=False)
+
+    def get_job(self, job_id: str) -> Dict[str, Any]:
+        return self.request('GET', f"/api/jobs/{job_id}")
+
+    # Batches
+
+    def _batch(self, path: str, payloads: Iterable[Dict[str, Any]], concurrency: int,
+               return_exceptions: bool) -> List[Any]:
+        payloads = list(payloads)
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, self.max_connections, len(payloads) or 1))) as pool:
+            futures = [pool.submit(self.request, 'POST', path, payload) for payload in payloads]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except LocationAPIError as e:
+                if not return_exceptions:
+                    raise
+                results.append(e)
+        return results
+
+    def search_many(self, searches: Iterable[Dict[str, Any]], concurrency: int = 8,
+                    return_exceptions: bool = False) -> List[Any]:
+        """Run /api/search payloads concurrently; results in input order"""
+        return self._batch('/api/search', searches, concurrency, return_exceptions)
+
+    def directions_many(self, routes: Iterable[Dict[str, Any]], concurrency: int = 8,
+                        return_exceptions: bool = False) -> List[Any]:
+        """Run /api/directions payloads concurrently; results in input order"""
+        return self._batch('/api/directions', routes, concurrency, return_exceptions)
+
+
+class AsyncLocationClient(_BaseClient):
+    """asyncio client; arguments as for LocationClient (``sleep`` is a coroutine function)"""
+
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, *, timeout: float = 30.0,
+                 max_retries: int = 3, backoff: float = 0.5, max_backoff: float = 30.0,
+                 max_connections: int = 20, cache: Union[bool, HTTPCache] = True,
+                 transport: Optional[httpx.AsyncBaseTransport] = None,
+                 sleep: Callable[[float], Any] = asyncio.sleep):
+        super().__init__(max_retries, backoff, max_backoff, cache)
+        self.max_connections = max_connections
+        self._sleep = sleep
+        self._http = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport
+        )
+
+    async def request(self, method: str, path: str, payload: Any = None, idempotent: bool = True) -> Any:
+        """Send a request with retries and local caching; returns the decoded body"""
+        key, entry, headers = self._lookup(method, path, payload)
+        if self._fresh(entry):
+            return entry.body
+        attempt = 0
+        while True:
+            try:
+                response = await self._http.request(method, path, json=payload, headers=headers)
+            except httpx.TransportError as e:
+                delay = self._retry_delay(attempt, None, idempotent)
+                if delay is None:
+                    raise LocationAPIError(f"Failed to connect to location API: {e}") from e
+            else:
+                delay = self._retry_delay(attempt, response.status_code, idempotent, response)
+                if response.status_code not in RETRY_STATUSES or delay is None:
+                    return self._finish(key, entry, response)
+            await self._sleep(delay)
+            attempt += 1
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+    async def __aenter__(self) -> 'AsyncLocationClient':
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    # Endpoints
+
+    async def health(self) -> Dict[str, Any]:
+        return await self.request('GET', '/api/health')
+
+    async def search_places(self, query: str, location: Optional[str] = None, radius: Optional[float] = None,
+                            place_type: Optional[str] = None, **options) -> Dict[str, Any]:
+        """POST /api/search; ``options`` are further payload fields (min_rating, ...)"""
+        return await self.request('POST', '/api/search',
+                                  self._search_payload(query, location, radius, place_type, **options))
+
+    async def get_directions(self, origin: str, destination: str, mode: Optional[str] = None,
+                             **options) -> Dict[str, Any]:
+        return await self.request('POST', '/api/directions',
+                                  self._directions_payload(origin, destination, mode, **options))
+
+    async def search_along_route(self, query: str, origin: str, destination: str, **options) -> Dict[str, Any]:
+        return await self.request('POST', '/api/search/along-route',
+                                  _compact({'query': query, 'origin': origin, 'destination': destination, **options}))
+
+    async def reachable(self, origin: str, minutes: float, **options) -> Dict[str, Any]:
+        return await self.request('POST', '/api/reachable', _compact({'origin': origin, 'minutes': minutes, **options}))
+
+    async def chat(self, message: str, session_id: Optional[str] = None,
+                   context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return await self.request('POST', '/api/llm-chat', self._chat_payload(message, session_id, context),
+                                  idempotent=False)
+
+    async def create_job(self, job_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.request('POST', '/api/jobs', {'type': job_type, 'params': params}, idempotent=False)
+
+    async def get_job(self, job_id: str) -> Dict[str, Any]:
+        return await self.request('GET', f"/api/jobs/{job_id}")
+
+    # Batches
+
+    async def _batch(self, path: str, payloads: Iterable[Dict[str, Any]], concurrency: int,
+                     return_exceptions: bool) -> List[Any]:
+        semaphore = asyncio.Semaphore(max(1, min(concurrency, self.max_connections)))
+
+        async def run(payload):
+            async with semaphore:
+                return await self.request('POST', path, payload)
+
+        results = await asyncio.gather(*(run(payload) for payload in payloads), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException) and not (return_exceptions and isinstance(result, LocationAPIError)):
+                raise result
+        return list(results)
+
+    async def search_many(self, searches: Iterable[Dict[str, Any]], concurrency: int = 8,
+                          return_exceptions: bool = False) -> List[Any]:
+        """Run /api/search payloads concurrently; results in input order"""
+        return await self._batch('/api/search', searches, concurrency, return_exceptions)
+
+    async def directions_many(self, routes: Iterable[Dict[str, Any]], concurrency: int = 8,
+                              return_exceptions: bool = False) -> List[Any]:
+        """Run /api/directions payloads concurrently; results in input order"""
+        return await self._batch('/api/directions', routes, concurrency, return_exceptions)
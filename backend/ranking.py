@@ -0,0 +1,136 @@
+"""
+Distance-aware ranking and filtering of place results
+
+All candidates from the upstream search are scored in one vectorized NumPy
+pass: haversine distance from the search center, rating, price level and
+whether the place is open now are each turned into a 0..1 score and blended
+with configurable weights. Filters (minimum rating, open now, maximum
+distance) are applied to the full candidate set before it is sorted and
+truncated, so the best results are never lost to upstream ordering.
+"""
+
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+
+DEFAULT_WEIGHTS = {
+    'distance': 0.4,
+    'rating': 0.4,
+    'price': 0.1,
+    'open_now': 0.1,
+}
+
+
+def weights_from_env() -> Dict[str, float]:
+    """Ranking weights from RANKING_WEIGHTS (``distance:0.5,rating:0.3,...``)"""
+    weights = dict(DEFAULT_WEIGHTS)
+    for item in os.getenv('RANKING_WEIGHTS', '').split(','):
+        name, _, value = item.strip().partition(':')
+        if name in weights:
+            try:
+                weights[name] = float(value)
+            except ValueError:
+                continue
+    return weights
+
+
+def haversine_m(lat: np.ndarray, lng: np.ndarray, center_lat: float, center_lng: float) -> np.ndarray:
+    """Great-circle distance in meters from one center to arrays of points"""
+    lat1 = np.radians(center_lat)
+    lat2 = np.radians(lat)
+    dlat = lat2 - lat1
+    dlng = np.radians(lng) - np.radians(center_lng)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _column(places: List[Dict[str, Any]], getter) -> np.ndarray:
+    values = np.full(len(places), np.nan)
+    for i, place in enumerate(places):
+        value = getter(place)
+        if value is not None:
+            values[i] = value
+    return values
+
+
+def rank_places(places: List[Dict[str, Any]], center: Optional[Dict[str, float]] = None,
+                weights: Optional[Dict[str, float]] = None, min_rating: Optional[float] = None,
+                open_now: Optional[bool] = None, max_distance: Optional[float] = None,
+                distance_scale: Optional[float] = None, limit: Optional[int] = None,
+                distances: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+    """
+    Filter and order processed places by a blended score
+
+    Args:
+        places: Places as returned by LocationService._process_place_details
+        center: Search center ({'lat', 'lng'}); without it distance is ignored
+        weights: Score weights for distance, rating, price and open_now
+        min_rating: Drop places rated below this (unrated places are dropped)
+        open_now: When True, keep only places known to be open now
+        max_distance: Drop places farther than this many meters from center
+        distance_scale: Distance (m) at which the distance score reaches 0;
+            defaults to max_distance, else the farthest candidate
+        limit: Return at most this many places
+        distances: Precomputed distances (m), one per place, used instead of
+            the distance from ``center`` (e.g. detour from a route)
+
+    Returns:
+        New place dicts, best first, with ``distance_m`` and ``score`` added
+    """
+    if not places:
+        return []
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+
+    rating = _column(places, lambda p: p.get('rating'))
+    price = _column(places, lambda p: p.get('price_level'))
+    is_open = _column(places, lambda p: None if p.get('opening_hours') is None
+                      else float(bool(p.get('opening_hours'))))
+
+    if distances is not None:
+        distance = np.asarray(distances, dtype=float)
+    elif center:
+        lat = _column(places, lambda p: (p.get('location') or {}).get('lat'))
+        lng = _column(places, lambda p: (p.get('location') or {}).get('lng'))
+        distance = haversine_m(lat, lng, center['lat'], center['lng'])
+    else:
+        distance = np.full(len(places), np.nan)
+
+    keep = np.ones(len(places), dtype=bool)
+    if min_rating is not None:
+        keep &= rating >= min_rating
+    if open_now:
+        keep &= is_open == 1.0
+    has_distance = center is not None or distances is not None
+    if max_distance is not None and has_distance:
+        keep &= distance <= max_distance
+
+    scale = distance_scale or max_distance or (np.nanmax(distance) if np.isfinite(distance).any() else 0)
+    distance_score = np.clip(1.0 - distance / scale, 0.0, 1.0) if scale else np.zeros(len(places))
+    components = {
+        'distance': np.nan_to_num(distance_score, nan=0.0),
+        'rating': np.nan_to_num(rating / 5.0, nan=0.0),
+        # Cheaper is better; unknown price is neutral
+        'price': np.nan_to_num(1.0 - price / 4.0, nan=0.5),
+        'open_now': np.nan_to_num(is_open, nan=0.5),
+    }
+    if not has_distance:
+        weights['distance'] = 0.0
+    total_weight = sum(max(0.0, weights[name]) for name in components) or 1.0
+    score = sum(max(0.0, weights[name]) * values for name, values in components.items()) / total_weight
+
+    indices = np.flatnonzero(keep)
+    # Stable sort keeps upstream order (Google's relevance) among equal scores
+    order = indices[np.argsort(-score[indices], kind='stable')]
+    if limit is not None:
+        order = order[:limit]
+
+    ranked = []
+    for i in order:
+        place = dict(places[i])
+        place['distance_m'] = None if np.isnan(distance[i]) else int(round(distance[i]))
+        place['score'] = round(float(score[i]), 4)
+        ranked.append(place)
+    return ranked
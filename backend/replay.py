@@ -0,0 +1,217 @@
+"""
+Replay captured production traffic against the current build
+
+Re-drives requests recorded by capture.py through the Flask app in-process,
+preserving their relative timing (optionally accelerated 1x-50x). Google Maps
+is never contacted: LocationService is given a client that serves the upstream
+responses recorded alongside each request.
+
+Usage:
+    python replay.py captures/ --speed 10
+    python replay.py 'captures/capture-2024*.jsonl.gz' --speed 50 --concurrency 32
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from capture import read_capture, sanitize_params
+from upstream import UPSTREAM_METHODS
+
+MIN_SPEED = 1.0
+MAX_SPEED = 50.0
+
+# Keep replays repeatable and away from production state: no shared cache
+# tiers, no warming, and rate limits counted in memory
+REPLAY_CONFIG = {
+    'CACHE_REDIS': False,
+    'CACHE_SHM_PATH': None,
+    'WARMING_ENABLED': False,
+    'WARMING_SNAPSHOT_PATH': None,
+    'RATELIMIT_STORAGE_URI': 'memory://',
+}
+
+
+class ReplayUpstreamError(Exception):
+    """Raised for upstream calls that failed when they were captured"""
+
+
+class ReplayMapsClient:
+    """Stand-in Google Maps client serving responses from a capture
+
+    Responses are matched on method name and call parameters, sanitized the
+    way capture.py stored them (``max_field_length`` must match the capture).
+    Repeated calls with the same parameters get the captured responses in
+    order, and the last one is reused once they run out. Calls that were never
+    captured raise LookupError and are counted in ``misses``.
+    """
+
+    def __init__(self, records: List[Dict[str, Any]], max_field_length: int = 200):
+        self.max_field_length = max_field_length
+        self._responses: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._cursors: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        for record in records:
+            for call in record.get('upstream', []):
+                self._responses[self.key(call['method'], call['params'])].append(call)
+
+    @staticmethod
+    def key(method: str, params: Dict[str, Any]) -> str:
+        return method + ':' + json.dumps(params, sort_keys=True, default=str)
+
+    def __getattr__(self, name: str):
+        if name not in UPSTREAM_METHODS:
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            params: Dict[str, Any] = dict(kwargs)
+            if args:
+                params['_args'] = list(args)
+            key = self.key(name, sanitize_params(params, self.max_field_length))
+            with self._lock:
+                calls = self._responses.get(key)
+                if not calls:
+                    self.misses += 1
+                    raise LookupError(f"No captured response for {name} {params}")
+                self.hits += 1
+                captured = calls[min(self._cursors[key], len(calls) - 1)]
+                self._cursors[key] += 1
+            if captured.get('error'):
+                raise ReplayUpstreamError(captured['error'])
+            return captured['response']
+        return call
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def build_replay_app(records: List[Dict[str, Any]]):
+    """
+    Build an isolated app with capture disabled and upstream served from records
+
+    Redis is disconnected as well (REDIS_URL is cleared), so replayed chat
+    sessions and jobs never touch the production instance.
+    """
+    os.environ['CAPTURE_ENABLED'] = 'false'
+    os.environ['REDIS_URL'] = ''
+    from app import create_app, limiter
+
+    replay_client = ReplayMapsClient(records)
+    flask_app = create_app(REPLAY_CONFIG, maps_client=replay_client)
+    # Captured traffic was already admitted once; don't rate limit it again
+    limiter.enabled = False
+    return flask_app, replay_client
+
+
+def replay(records: List[Dict[str, Any]], flask_app, speed: float = 1.0,
+           concurrency: int = 16) -> Dict[str, Any]:
+    """Send captured requests to ``flask_app`` on their original schedule
+
+    Returns a summary with latency percentiles, status mismatches against the
+    capture and how far dispatch lagged behind schedule.
+    """
+    if not MIN_SPEED <= speed <= MAX_SPEED:
+        raise ValueError(f"speed must be between {MIN_SPEED:g} and {MAX_SPEED:g}")
+    records = sorted(records, key=lambda r: r['ts'])
+    if not records:
+        return {'requests': 0}
+
+    latencies: List[float] = []
+    captured_latencies: List[float] = []
+    lags: List[float] = []
+    mismatches: List[Dict[str, Any]] = []
+    lock = threading.Lock()
+
+    def send(record: Dict[str, Any]) -> None:
+        client = flask_app.test_client()
+        start = time.perf_counter()
+        response = client.open(record['route'], method=record['method'], json=record.get('body'))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed_ms)
+            captured_latencies.append(record.get('duration_ms', 0.0))
+            if response.status_code != record.get('status'):
+                mismatches.append({
+                    'route': record['route'],
+                    'captured_status': record.get('status'),
+                    'replayed_status': response.status_code,
+                })
+
+    t0 = records[0]['ts']
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for record in records:
+            due = (record['ts'] - t0) / speed
+            delay = due - (time.perf_counter() - wall_start)
+            if delay > 0:
+                time.sleep(delay)
+            lags.append(max(0.0, -delay) * 1000)
+            executor.submit(send, record)
+    wall_time = time.perf_counter() - wall_start
+    captured_span = records[-1]['ts'] - t0
+
+    return {
+        'requests': len(records),
+        'speed': speed,
+        'wall_time_s': round(wall_time, 3),
+        'captured_span_s': round(captured_span, 3),
+        'effective_speed': round(captured_span / wall_time, 2) if wall_time > 0 else None,
+        'status_mismatches': len(mismatches),
+        'mismatch_examples': mismatches[:10],
+        'latency_ms': {
+            'p50': round(_percentile(latencies, 50), 3),
+            'p95': round(_percentile(latencies, 95), 3),
+            'p99': round(_percentile(latencies, 99), 3),
+        },
+        'captured_latency_ms': {
+            'p50': round(_percentile(captured_latencies, 50), 3),
+            'p95': round(_percentile(captured_latencies, 95), 3),
+            'p99': round(_percentile(captured_latencies, 99), 3),
+        },
+        'dispatch_lag_ms_p99': round(_percentile(lags, 99), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay captured API traffic offline')
+    parser.add_argument('paths', nargs='+', help='Capture files, directories or glob patterns')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help=f'Replay speed multiplier ({MIN_SPEED:g}-{MAX_SPEED:g})')
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help='Maximum requests in flight')
+    parser.add_argument('--limit', type=int, default=None,
+                        help='Only replay the first N requests')
+    args = parser.parse_args()
+
+    if not MIN_SPEED <= args.speed <= MAX_SPEED:
+        parser.error(f"--speed must be between {MIN_SPEED:g} and {MAX_SPEED:g}")
+
+    records = list(read_capture(args.paths))
+    records.sort(key=lambda r: r['ts'])
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        print("No captured requests found", file=sys.stderr)
+        sys.exit(1)
+
+    flask_app, replay_client = build_replay_app(records)
+    summary = replay(records, flask_app, speed=args.speed, concurrency=args.concurrency)
+    summary['upstream'] = {'served': replay_client.hits, 'missing': replay_client.misses}
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""
+Cache of encoded API responses
+
+The upstream cache (cache.py) saves Google calls, but a repeated search still
+rebuilds the result dicts, re-renders the LLM answer and re-encodes the JSON.
+ResponseCache keeps the final response body instead: the encoded JSON, a
+gzip-compressed copy and its ETag, keyed on the endpoint and the normalized
+request payload. A hit is answered from ``before_request`` by handing the
+stored bytes object to the WSGI server as is, so no JSON is parsed, built or
+encoded and the body is not copied. Clients that send the ETag back in
+``If-None-Match`` get an empty ``304 Not Modified``.
+
+Entries are kept for a while after they go stale; when the admission
+controller sheds a request (see admission.py), the stale copy is served in
+place of a 503.
+"""
+
+import gzip
+import hashlib
+import json
+import time
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from flask import Flask, Response, g, request
+
+from cache import MISSING, MemoryCache
+
+# Endpoints whose responses depend only on their JSON payload
+CACHEABLE_ENDPOINTS = (
+    'api.search_places',
+    'api.get_directions',
+    'api.search_along_route',
+    'api.reachable',
+)
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    gzipped: Optional[bytes]
+    etag: str
+    fresh_until: float
+
+
+def _normalize(value: Any) -> Any:
+    """Strip and collapse whitespace in strings so trivially different requests share a key"""
+    if isinstance(value, str):
+        return ' '.join(value.split())
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def request_key(endpoint: str, payload: Any) -> str:
+    canonical = json.dumps(_normalize(payload), sort_keys=True, separators=(',', ':'))
+    return f"{endpoint}:{hashlib.sha1(canonical.encode()).hexdigest()}"
+
+
+def _succeeded(payload: Any) -> bool:
+    """Whether a JSON response reports success (failed lookups are not cached)"""
+    if not isinstance(payload, dict):
+        return False
+    data = payload.get('places_data', payload)
+    return isinstance(data, dict) and data.get('success', True) is not False
+
+
+class ResponseCache:
+    """Stores encoded responses of CACHEABLE_ENDPOINTS and serves them from before_request
+
+    Args:
+        ttl: Seconds a response is served as fresh
+        stale_ttl: Further seconds it is kept for serving while shedding load
+        max_entries: Keys kept per process, least recently used evicted (a
+            response is stored under up to two keys)
+        gzip_min_size: Bodies at least this large are also stored gzipped
+            (0 disables compression)
+    """
+
+    def __init__(self, ttl: float = 300, stale_ttl: float = 3600, max_entries: int = 1024,
+                 gzip_min_size: int = 1024, clock=time.monotonic):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.gzip_min_size = gzip_min_size
+        self.clock = clock
+        self.entries = MemoryCache(max_entries=max_entries, clock=clock)
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.served_stale = 0
+
+    def init_app(self, app: Flask) -> None:
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _lookup(self) -> Tuple[Optional[Tuple[str, str]], Any]:
+        """
+        Cache keys and entry (or MISSING) for the current request
+
+        Entries are stored under the normalized payload and under the exact
+        request body, so a byte-identical repeat is found without parsing JSON.
+        """
+        if request.method != 'POST' or request.endpoint not in CACHEABLE_ENDPOINTS:
+            return None, MISSING
+        raw_key = f"{request.endpoint}:raw:{hashlib.blake2b(request.get_data(), digest_size=16).hexdigest()}"
+        entry = self.entries.get(raw_key)
+        if entry is not MISSING and entry.fresh_until > self.clock():
+            return (raw_key, raw_key), entry
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict):
+            return None, MISSING
+        key = request_key(request.endpoint, payload)
+        entry = self.entries.get(key)
+        if entry is not MISSING:
+            self.entries.set(raw_key, entry, entry.fresh_until - self.clock() + self.stale_ttl)
+        return (key, raw_key), entry
+
+    def _respond(self, entry: CachedResponse, state: str) -> Response:
+        max_age = max(0, int(entry.fresh_until - self.clock()))
+        headers = {
+            'ETag': entry.etag,
+            'Cache-Control': f"private, max-age={max_age}",
+            'Vary': 'Accept-Encoding',
+            'X-Cache': state,
+        }
+        if request.if_none_match.contains_weak(entry.etag.strip('"')):
+            self.not_modified += 1
+            return Response(status=304, headers=headers)
+        body = entry.body
+        if entry.gzipped is not None and request.accept_encodings['gzip']:
+            body = entry.gzipped
+            headers['Content-Encoding'] = 'gzip'
+        return Response(body, status=200, mimetype='application/json', headers=headers)
+
+    # Flask hooks
+
+    def _before_request(self):
+        keys, entry = self._lookup()
+        if keys is None:
+            return None
+        if entry is not MISSING and entry.fresh_until > self.clock():
+            self.hits += 1
+            return self._respond(entry, 'HIT')
+        self.misses += 1
+        g._response_cache_keys = keys
+        return None
+
+    def _after_request(self, response: Response) -> Response:
+        keys = g.pop('_response_cache_keys', None)
+        if keys is None or response.status_code != 200 or response.mimetype != 'application/json':
+            return response
+        if response.direct_passthrough or 'Content-Encoding' in response.headers:
+            return response
+        body = response.get_data()
+        try:
+            if not _succeeded(json.loads(body)):
+                return response
+        except ValueError:
+            return response
+
+        gzipped = None
+        if self.gzip_min_size and len(body) >= self.gzip_min_size:
+            gzipped = gzip.compress(body, compresslevel=6, mtime=0)
+        etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        entry = CachedResponse(body, gzipped, etag, self.clock() + self.ttl)
+        for key in set(keys):
+            self.entries.set(key, entry, self.ttl + self.stale_ttl)
+
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = f"private, max-age={int(self.ttl)}"
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['X-Cache'] = 'MISS'
+        if gzipped is not None and request.accept_encodings['gzip']:
+            response.set_data(gzipped)
+            response.headers['Content-Encoding'] = 'gzip'
+        return response
+
+    # Admission fallback
+
+    def stale_response(self) -> Optional[Response]:
+        """The cached response for the current request, even if stale, or None"""
+        keys, entry = self._lookup()
+        if keys is None or entry is MISSING:
+            return None
+        self.served_stale += 1
+        return self._respond(entry, 'STALE')
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'not_modified': self.not_modified,
+            'served_stale': self.served_stale,
+            'entries': len(self.entries)
+        }
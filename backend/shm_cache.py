@@ -0,0 +1,212 @@
+"""
+Host-local shared-memory cache for upstream responses
+
+Gunicorn workers do not share memory, so a per-process cache is filled, and
+held, once per worker. This cache lives in a memory-mapped file (on /dev/shm
+in production) that every worker on the host maps, and sits between the
+per-process LRU and Redis in TieredCache.
+
+Layout: a small header followed by a fixed table of equally sized slots,
+grouped into sets of ``ways`` slots. A key hashes to one set and may live in
+any slot of it; when the set is full the entry closest to expiry is evicted.
+Each slot holds a header, the key and the value as already serialized JSON
+bytes, so a hit costs one copy and one ``json.loads``.
+
+Readers take no locks. Every slot has a sequence number that writers make odd
+while they modify the slot and even again when they are done; a reader that
+sees an odd or changed sequence number retries, and a CRC of key and value
+catches anything that still slips through. Writers lock the set they modify
+(a byte-range lock on the file, plus a thread lock within the process).
+"""
+
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'LACACHE1'
+# magic, layout version, slots, slot size, ways
+HEADER = struct.Struct('<8sIIII')
+HEADER_SIZE = 64
+# sequence, key hash (0 = empty), expires at (wall clock), key length, value length, crc32
+SLOT = struct.Struct('<QQdIII4x')
+SLOT_FIELDS = struct.Struct('<QdIII')
+SEQUENCE = struct.Struct('<Q')
+READ_RETRIES = 3
+
+
+def _key_hash(key: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little') or 1
+
+
+class SharedMemoryCache:
+    """Fixed-size, set-associative cache in a shared memory-mapped file
+
+    Args:
+        path: File backing the cache; use a tmpfs such as /dev/shm
+        slots: Number of slots (rounded down to a multiple of ``ways``)
+        slot_size: Bytes per slot, including a 40 byte header and the key;
+            larger values are not cached here
+        ways: Slots per set
+    """
+
+    def __init__(self, path: str, slots: int = 1024, slot_size: int = 32768, ways: int = 4):
+        self.path = path
+        self.ways = ways
+        self.slots = max(ways, slots - slots % ways)
+        self.slot_size = slot_size
+        self.size = HEADER_SIZE + self.slots * self.slot_size
+        self._map: Optional[mmap.mmap] = None
+        self._fd: Optional[int] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.oversize = 0
+
+    def _open(self) -> mmap.mmap:
+        if self._map is not None:
+            return self._map
+        with self._lock:
+            if self._map is None:
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                try:
+                    header = HEADER.pack(MAGIC, 1, self.slots, self.slot_size, self.ways)
+                    current = os.pread(fd, HEADER.size, 0)
+                    if current != header or os.fstat(fd).st_size != self.size:
+                        # New file or a different layout: start empty
+                        os.ftruncate(fd, 0)
+                        os.ftruncate(fd, self.size)
+                        os.pwrite(fd, header, 0)
+                finally:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                self._fd = fd
+                self._map = mmap.mmap(fd, self.size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        return self._map
+
+    def _set_offset(self, key_hash: int) -> int:
+        return HEADER_SIZE + (key_hash % (self.slots // self.ways)) * self.ways * self.slot_size
+
+    def get_bytes(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """Serialized value and expiry time (``time.time()``) of a key, or None"""
+        mm = self._open()
+        key_bytes = key.encode()
+        key_hash = _key_hash(key_bytes)
+        base = self._set_offset(key_hash)
+        for way in range(self.ways):
+            offset = base + way * self.slot_size
+            for _ in range(READ_RETRIES):
+                seq, slot_hash, expires_at, key_len, value_len, crc = SLOT.unpack_from(mm, offset)
+                if slot_hash != key_hash:
+                    break
+                if seq & 1:
+                    continue
+                start = offset + SLOT.size
+                data = mm[start:start + key_len + value_len]
+                if SEQUENCE.unpack_from(mm, offset)[0] != seq:
+                    continue
+                if zlib.crc32(data) != crc or data[:key_len] != key_bytes:
+                    break
+                if expires_at <= time.time():
+                    self.misses += 1
+                    return None
+                self.hits += 1
+                return data[key_len:], expires_at
+        self.misses += 1
+        return None
+
+    def set_bytes(self, key: str, value: bytes, ttl: float) -> bool:
+        """Store a serialized value; returns False if it does not fit in a slot
+
+        A value that does not fit still drops the key's current entry, which
+        would otherwise be served in its place until it expires.
+        """
+        mm = self._open()
+        key_bytes = key.encode()
+        if SLOT.size + len(key_bytes) + len(value) > self.slot_size:
+            self.oversize += 1
+            self.delete(key)
+            return False
+        key_hash = _key_hash(key_bytes)
+        base = self._set_offset(key_hash)
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, self.ways * self.slot_size, base)
+            try:
+                offset = self._choose_slot(mm, base, key_hash)
+                seq = SEQUENCE.unpack_from(mm, offset)[0]
+                seq += 1 if seq % 2 == 0 else 0
+                SEQUENCE.pack_into(mm, offset, seq)
+                start = offset + SLOT.size
+                mm[start:start + len(key_bytes) + len(value)] = key_bytes + value
+                SLOT_FIELDS.pack_into(mm, offset + SEQUENCE.size, key_hash, time.time() + ttl,
+                                      len(key_bytes), len(value), zlib.crc32(key_bytes + value))
+                SEQUENCE.pack_into(mm, offset, seq + 1)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, self.ways * self.slot_size, base)
+        return True
+
+    def _choose_slot(self, mm: mmap.mmap, base: int, key_hash: int) -> int:
+        """Slot for a key: its current slot, else a free or expired one, else the one expiring first"""
+        now = time.time()
+        free = None
+        victim, victim_expiry = base, float('inf')
+        for way in range(self.ways):
+            offset = base + way * self.slot_size
+            _, slot_hash, expires_at, _, _, _ = SLOT.unpack_from(mm, offset)
+            if slot_hash == key_hash:
+                return offset
+            if free is None and (slot_hash == 0 or expires_at <= now):
+                free = offset
+            if expires_at < victim_expiry:
+                victim, victim_expiry = offset, expires_at
+        return free if free is not None else victim
+
+    def delete(self, key: str) -> None:
+        mm = self._open()
+        key_bytes = key.encode()
+        key_hash = _key_hash(key_bytes)
+        base = self._set_offset(key_hash)
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, self.ways * self.slot_size, base)
+            try:
+                for way in range(self.ways):
+                    offset = base + way * self.slot_size
+                    seq, slot_hash = SLOT.unpack_from(mm, offset)[:2]
+                    if slot_hash == key_hash:
+                        seq += 1 if seq % 2 == 0 else 0
+                        SEQUENCE.pack_into(mm, offset, seq)
+                        SLOT_FIELDS.pack_into(mm, offset + SEQUENCE.size, 0, 0.0, 0, 0, 0)
+                        SEQUENCE.pack_into(mm, offset, seq + 1)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, self.ways * self.slot_size, base)
+
+    def stats(self) -> Dict[str, Any]:
+        used = 0
+        if self._map is not None:
+            now = time.time()
+            for slot in range(self.slots):
+                _, slot_hash, expires_at, _, _, _ = SLOT.unpack_from(self._map, HEADER_SIZE + slot * self.slot_size)
+                used += slot_hash != 0 and expires_at > now
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'oversize': self.oversize,
+            'slots': self.slots,
+            'slots_used': used,
+            'size_bytes': self.size
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                os.close(self._fd)
+                self._map = self._fd = None
@@ -0,0 +1,321 @@
+"""
+Non-blocking structured logging
+
+Log records are put on a bounded in-memory queue by the request thread and
+written as JSON lines by a background listener thread, so a burst of errors
+during an upstream outage does not add I/O latency to the request path. On
+the way in, records pass through:
+
+* SamplingFilter, which keeps only a fraction of records per route and per
+  error class (e.g. keep 10% of access logs for /api/search, 5% of
+  ``Timeout`` errors);
+* RepeatFilter, which lets a burst of identical errors through and then
+  suppresses repeats for the rest of a time window, reporting how many were
+  dropped on the next record that gets through;
+* RequestContextFilter, which attaches the request ID and route.
+
+RequestLogging gives every request an ID (taken from ``X-Request-ID`` when the
+caller sends one), collects per-stage timings, including upstream Google Maps
+calls, and writes one access record per request.
+"""
+
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from flask import Flask, g, has_request_context, request
+
+# Attributes every LogRecord has; anything else was passed via ``extra``
+_STANDARD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+access_logger = logging.getLogger('access')
+
+
+def parse_rates(spec: Optional[str]) -> Dict[str, float]:
+    """Parse ``"name:rate,name:rate"`` into a dict of sampling rates"""
+    rates: Dict[str, float] = {}
+    for item in (spec or '').split(','):
+        name, sep, rate = item.strip().rpartition(':')
+        if sep and name:
+            try:
+                rates[name] = min(1.0, max(0.0, float(rate)))
+            except ValueError:
+                continue
+    return rates
+
+
+def error_class(record: logging.LogRecord) -> Optional[str]:
+    """Exception class name of a record, from exc_info or ``extra``"""
+    if record.exc_info and record.exc_info[0] is not None:
+        return record.exc_info[0].__name__
+    return getattr(record, 'error_class', None)
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = ''.join(traceback.format_exception(*record.exc_info)).rstrip()
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach the current request ID and route to records"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if has_request_context():
+            if not hasattr(record, 'request_id'):
+                record.request_id = g.get('request_id')
+            if not hasattr(record, 'route'):
+                record.route = request.endpoint
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a configurable fraction of records per route and per error class
+
+    Records with an error class are sampled by ``error_rates`` (falling back to
+    ``default_rate``); other records by ``route_rates`` using the Flask
+    endpoint of the current request. CRITICAL records are always kept.
+    """
+
+    def __init__(self, route_rates: Optional[Dict[str, float]] = None,
+                 error_rates: Optional[Dict[str, float]] = None, default_rate: float = 1.0):
+        super().__init__()
+        self.route_rates = route_rates or {}
+        self.error_rates = error_rates or {}
+        self.default_rate = default_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.CRITICAL:
+            return True
+        cls = error_class(record)
+        if cls is not None:
+            rate = self.error_rates.get(cls, self.default_rate)
+        else:
+            route = getattr(record, 'route', None)
+            if route is None and has_request_context():
+                route = request.endpoint
+            rate = self.route_rates.get(route, self.default_rate)
+        if rate >= 1.0:
+            return True
+        if random.random() < rate:
+            record.sample_rate = rate
+            return True
+        return False
+
+
+class RepeatFilter(logging.Filter):
+    """Rate-limit repeated identical warnings and errors
+
+    Records are identical when they share logger, level, message template and
+    error class. The first ``burst`` of them in each ``window`` seconds pass;
+    the rest are dropped and counted, and the count is attached as
+    ``suppressed_repeats`` to the first record let through in a later window.
+    """
+
+    def __init__(self, burst: int = 5, window: float = 60.0, max_keys: int = 1000,
+                 clock=time.monotonic):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.max_keys = max_keys
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._state: Dict[tuple, list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING:
+            return True
+        key = (record.name, record.levelno, str(record.msg), error_class(record))
+        now = self.clock()
+        with self._lock:
+            state = self._state.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                if len(self._state) >= self.max_keys:
+                    self._state.clear()
+                self._state[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed_repeats = suppressed
+                return True
+            state[1] += 1
+            if state[1] <= self.burst:
+                return True
+            state[2] += 1
+            return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full
+
+    Only the message is rendered on the calling thread; JSON encoding and
+    traceback formatting happen on the listener thread.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        dropped = self.dropped
+        if dropped:
+            record.dropped_records = dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        self.dropped -= dropped
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+
+class LoggingPipeline:
+    """Owns the queue, handler and listener thread of the logging pipeline"""
+
+    def __init__(self, handler: logging.Handler, queue_size: int = 10000):
+        self.queue_size = queue_size
+        self.target = handler
+        self.queue_handler = NonBlockingQueueHandler(queue.Queue(queue_size))
+        self.listener = logging.handlers.QueueListener(
+            self.queue_handler.queue, handler, respect_handler_level=True
+        )
+        self.listener.start()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._restart_after_fork)
+
+    def _restart_after_fork(self) -> None:
+        # The listener thread does not survive fork, and the queue's locks may
+        # have been held by it at the time; start over with fresh ones
+        self.queue_handler.queue = queue.Queue(self.queue_size)
+        self.listener = logging.handlers.QueueListener(
+            self.queue_handler.queue, self.target, respect_handler_level=True
+        )
+        self.listener.start()
+
+    def stop(self) -> None:
+        self.listener.stop()
+
+
+_pipeline: Optional[LoggingPipeline] = None
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None,
+                      stream=None) -> Optional[LoggingPipeline]:
+    """
+    Install the logging pipeline on the root logger (once per process)
+
+    Args:
+        level: Log level name, default LOG_LEVEL or INFO
+        fmt: ``json`` for the queue-based JSON pipeline (default, LOG_FORMAT),
+            ``text`` for plain synchronous logging as before
+        stream: Output stream, default stderr
+
+    Returns:
+        The pipeline, or None when plain text logging was configured
+    """
+    global _pipeline
+    level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+    fmt = (fmt or os.getenv('LOG_FORMAT', 'json')).lower()
+    root = logging.getLogger()
+    root.setLevel(level)
+
+    if fmt != 'json':
+        logging.basicConfig(level=level)
+        return None
+    if _pipeline is not None:
+        return _pipeline
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter())
+    _pipeline = LoggingPipeline(output, queue_size=int(os.getenv('LOG_QUEUE_SIZE', '10000')))
+
+    handler = _pipeline.queue_handler
+    handler.addFilter(SamplingFilter(
+        route_rates=parse_rates(os.getenv('LOG_SAMPLE_ROUTES')),
+        error_rates=parse_rates(os.getenv('LOG_SAMPLE_ERRORS')),
+        default_rate=float(os.getenv('LOG_SAMPLE_DEFAULT', '1.0'))
+    ))
+    handler.addFilter(RepeatFilter(
+        burst=int(os.getenv('LOG_REPEAT_BURST', '5')),
+        window=float(os.getenv('LOG_REPEAT_WINDOW', '60'))
+    ))
+    handler.addFilter(RequestContextFilter())
+    root.addHandler(handler)
+    return _pipeline
+
+
+@contextmanager
+def stage(name: str):
+    """Time a stage of the current request and record it in the access log"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if has_request_context():
+            timings = g.setdefault('stage_timings', {})
+            timings[name] = round(timings.get(name, 0.0) + (time.perf_counter() - start) * 1000, 3)
+
+
+class RequestLogging:
+    """Request IDs, stage timings and one access record per request"""
+
+    def init_app(self, app: Flask) -> None:
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def on_upstream_call(self, method: str, params: Dict[str, Any], response: Any,
+                         error: Optional[BaseException], elapsed: float) -> None:
+        if not has_request_context():
+            return
+        timings = g.setdefault('stage_timings', {})
+        key = f"upstream.{method}"
+        timings[key] = round(timings.get(key, 0.0) + elapsed * 1000, 3)
+
+    def _before_request(self) -> None:
+        g.request_id = (request.headers.get('X-Request-ID') or uuid.uuid4().hex)[:64]
+        g.request_start = time.perf_counter()
+
+    def _after_request(self, response):
+        response.headers['X-Request-ID'] = g.get('request_id', '')
+        start = g.get('request_start')
+        if start is not None:
+            access_logger.info(
+                "%s %s %s", request.method, request.path, response.status_code,
+                extra={
+                    'status': response.status_code,
+                    'duration_ms': round((time.perf_counter() - start) * 1000, 3),
+                    'stages': g.get('stage_timings', {}),
+                }
+            )
+        return response
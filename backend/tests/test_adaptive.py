@@ -0,0 +1,142 @@
+"""
+Tests for adaptive radius search
+"""
+
+import pytest
+
+from adaptive import MIN_RADIUS_M, radius_hint, search_rings
+from app import LocationService, create_app
+from cache import TieredCache
+from corridor import MAX_RADIUS_M, METERS_PER_DEGREE
+
+CENTER = {'lat': 40.0, 'lng': -74.0}
+
+
+def place(name, meters_north):
+    return {'name': name, 'place_id': name, 'rating': 4.0,
+            'geometry': {'location': {'lat': CENTER['lat'] + meters_north / METERS_PER_DEGREE,
+                                      'lng': CENTER['lng']}}}
+
+
+class FakeMapsClient:
+    """Places north of CENTER at the given distances; nearby search returns up to 20 in range"""
+
+    def __init__(self, distances):
+        self.places = [place(f"p{i}", d) for i, d in enumerate(distances)]
+        self.radii = []
+
+    def geocode(self, address=None):
+        return [{'geometry': {'location': CENTER}}]
+
+    def places_nearby(self, location=None, radius=None, **kwargs):
+        self.radii.append(radius)
+        in_range = [p for p in self.places
+                    if (p['geometry']['location']['lat'] - location['lat']) * METERS_PER_DEGREE <= radius]
+        return {'results': in_range[:20]}
+
+
+class TestSearchRings:
+    """Test the radii searched"""
+
+    def test_doubles_and_rounds(self):
+        assert search_rings(1000, 3) == [1000, 2000, 4000, 8000]
+        assert search_rings(1100, 1) == [1250, 2500]
+        assert search_rings(10, 0) == [MIN_RADIUS_M]
+
+    def test_capped(self):
+        assert search_rings(30000, 3) == [30000, MAX_RADIUS_M]
+
+
+class TestRadiusHint:
+    """Test learning a radius from the places found"""
+
+    def test_covers_target_place_with_margin(self):
+        places = [place(str(d), d) for d in (100, 300, 900, 4000)]
+        assert radius_hint(places, CENTER, 3) == 1250
+
+    def test_no_hint_when_target_missed(self):
+        places = [place(str(d), d) for d in (100, 300)]
+        assert radius_hint(places, CENTER, 3) is None
+
+
+class TestAdaptiveSearch:
+    """Test LocationService.search_places with target_results"""
+
+    def test_dense_area_stops_early(self):
+        gmaps = FakeMapsClient([50 * i for i in range(1, 40)])
+        service = LocationService(gmaps)
+        results = service.search_places('coffee', 'Here', radius=1000, target_results=10)
+        assert gmaps.radii == [1000]
+        assert results['results_count'] == 10
+        assert results['adaptive']['radii'] == [1000]
+        # The tenth place is 500m away, so the next search starts closer
+        assert results['adaptive']['next_radius'] == 750
+
+    def test_sparse_area_expands_and_learns(self):
+        gmaps = FakeMapsClient([800, 1500, 3000, 3500, 6000, 7000])
+        service = LocationService(gmaps, cache=TieredCache())
+        results = service.search_places('coffee', 'Here', radius=1000, target_results=5)
+        assert sorted(gmaps.radii) == [1000, 2000, 4000, 8000]
+        # Rings overlap; places are merged by place_id
+        assert results['candidates_count'] == 6
+        assert results['search_radius'] == 8000
+        assert not results['adaptive']['hint_used']
+
+        gmaps.radii.clear()
+        again = service.search_places('coffee', 'Here', radius=1000, target_results=5)
+        assert gmaps.radii == [7500]
+        assert again['adaptive']['hint_used']
+        assert again['results_count'] >= 5
+
+    def test_hint_is_per_query(self):
+        gmaps = FakeMapsClient([800, 1500, 3000, 3500, 6000, 7000])
+        service = LocationService(gmaps)
+        service.search_places('coffee', 'Here', radius=1000, target_results=5)
+        gmaps.radii.clear()
+        service.search_places('bars', 'Here', radius=1000, target_results=5)
+        assert gmaps.radii[0] == 1000
+
+    def test_hint_is_per_target(self):
+        # 16 places within 1km, the next ones beyond the widest ring
+        gmaps = FakeMapsClient([50 * i for i in range(1, 17)] + [20000 + i for i in range(20)])
+        service = LocationService(gmaps)
+        service.search_places('coffee', 'Here', radius=1000, target_results=15)
+        gmaps.radii.clear()
+        # Misses its target after widening to 8km, which must not move the target-15 hint
+        assert service.search_places('coffee', 'Here', radius=1000,
+                                     target_results=20)['results_count'] == 16
+        gmaps.radii.clear()
+        again = service.search_places('coffee', 'Here', radius=1000, target_results=15)
+        assert gmaps.radii == [1000]
+        assert again['adaptive']['hint_used']
+
+    def test_no_hint_when_target_missed(self):
+        gmaps = FakeMapsClient([800, 1500])
+        service = LocationService(gmaps)
+        missed = service.search_places('coffee', 'Here', radius=1000, target_results=5)
+        assert missed['adaptive']['next_radius'] is None
+        gmaps.radii.clear()
+        again = service.search_places('coffee', 'Here', radius=1000, target_results=5)
+        assert gmaps.radii[0] == 1000
+        assert not again['adaptive']['hint_used']
+
+    def test_endpoint(self):
+        flask_app = create_app(maps_client=FakeMapsClient([100 * i for i in range(1, 30)]))
+        flask_app.config['TESTING'] = True
+        with flask_app.test_client() as client:
+            for invalid in (0, '5', True, 21):
+                response = client.post('/api/search', json={'query': 'coffee', 'location': 'Here',
+                                                             'target_results': invalid})
+                assert response.status_code == 400
+            response = client.post('/api/search', json={'query': 'coffee', 'location': 'Here',
+                                                         'target_results': 15})
+            assert response.status_code == 200
+            data = response.get_json()['places_data']
+            assert data['results_count'] == 15
+            assert data['adaptive']['target_results'] == 15
+
+
+@pytest.mark.parametrize('target', [1, 20])
+def test_hint_within_bounds(target):
+    places = [place(str(i), 10 * i) for i in range(1, 30)]
+    assert MIN_RADIUS_M <= radius_hint(places, CENTER, target) <= MAX_RADIUS_M
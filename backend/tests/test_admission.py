@@ -0,0 +1,194 @@
+"""
+Tests for admission control and load shedding
+"""
+
+import contextlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from flask import jsonify
+
+from admission import AdmissionController, parse_request_start
+from app import create_app
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestParseRequestStart:
+    """Test X-Request-Start parsing"""
+
+    @pytest.mark.parametrize('header', ['t={:.3f}', '{:.3f}', 't={:.0f}000', '{:.0f}000000'])
+    def test_units(self, header):
+        now = 1_700_000_000.0
+        assert parse_request_start(header.format(now - 2), now=now) == pytest.approx(2, abs=0.01)
+
+    def test_missing_or_invalid(self):
+        assert parse_request_start(None) is None
+        assert parse_request_start('garbage') is None
+
+
+class TestAdmissionController:
+    """Test shedding decisions"""
+
+    def test_sustained_queue_delay_triggers_shedding(self):
+        clock = FakeClock()
+        controller = AdmissionController(target_delay=0.1, interval=1.0, clock=clock)
+        assert not controller.should_shed(0.5)
+        clock.now = 0.5
+        assert not controller.should_shed(0.5)
+        clock.now = 1.2
+        assert controller.should_shed(0.5)
+        # Delay back under target resets the interval
+        assert not controller.should_shed(0.01)
+        assert not controller.should_shed(0.5)
+
+    def test_predicted_wait_from_in_flight_work(self):
+        controller = AdmissionController(target_delay=0.5, worker_concurrency=2)
+        controller.service_time = 0.4
+        controller.in_flight = 2
+        assert controller.expected_wait() == pytest.approx(0.2)
+        assert not controller.should_shed(None)
+        controller.in_flight = 4
+        assert controller.should_shed(None)
+        assert controller.retry_after() >= 1
+
+    def test_no_predicted_wait_without_concurrency(self):
+        controller = AdmissionController(target_delay=0.5)
+        controller.service_time = 2.0
+        controller.in_flight = 4
+        assert controller.expected_wait() == 0.0
+        assert not controller.should_shed(None)
+
+    def test_tracks_upstream_latency(self):
+        controller = AdmissionController()
+        controller.on_upstream_call('geocode', {}, None, None, 1.0)
+        controller.on_upstream_call('geocode', {}, None, None, 2.0)
+        assert controller.upstream_latency == pytest.approx(1.2)
+
+
+class TestAdmissionMiddleware:
+    """Test shedding through the Flask app"""
+
+    @pytest.fixture
+    def flask_app(self):
+        flask_app = create_app({'ADMISSION_INTERVAL_MS': 0, 'ADMISSION_TARGET_DELAY_MS': 100})
+        return flask_app
+
+    def _stale_header(self):
+        return {'X-Request-Start': f"t={time.time() - 5:.3f}"}
+
+    def test_sheds_with_retry_after(self, flask_app):
+        client = flask_app.test_client()
+        response = client.post('/api/search', json={'query': 'coffee'}, headers=self._stale_header())
+        assert response.status_code == 503
+        assert int(response.headers['Retry-After']) >= 1
+        admission = flask_app.extensions['location_assistant']['admission']
+        assert admission.shed == 1
+        assert admission.in_flight == 0
+
+    def test_health_always_gets_through(self, flask_app):
+        client = flask_app.test_client()
+        assert client.get('/api/health', headers=self._stale_header()).status_code == 200
+
+    def test_fallback_answers_shed_requests(self, flask_app):
+        admission = flask_app.extensions['location_assistant']['admission']
+        admission.add_fallback(lambda: jsonify({'stale': True}))
+        client = flask_app.test_client()
+        response = client.post('/api/search', json={'query': 'coffee'}, headers=self._stale_header())
+        assert response.status_code == 200
+        assert response.get_json() == {'stale': True}
+        assert admission.served_stale == 1
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SLOW_APP = """
+import time
+from flask import Flask, jsonify, request
+from admission import AdmissionController
+
+app = Flask(__name__)
+AdmissionController(target_delay=0.2, interval=0.0).init_app(app)
+
+@app.route('/api/slow')
+def slow():
+    time.sleep(0.5)
+    return jsonify({'request_start': request.headers.get('X-Request-Start')})
+"""
+
+
+@contextlib.contextmanager
+def run_gunicorn(tmp_path, *args):
+    """Serve SLOW_APP with the shipped gunicorn.conf.py, one worker thread; yields its URL"""
+    (tmp_path / 'slow_app.py').write_text(SLOW_APP)
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(BACKEND_DIR, 'gunicorn.conf.py'),
+         '--bind', f"127.0.0.1:{port}", '--workers', '1', '--threads', '1',
+         '--chdir', str(tmp_path), *args, 'slow_app:app'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = time.time() + 15
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+                break
+            except OSError:
+                if time.time() > deadline or process.poll() is not None:
+                    pytest.fail('gunicorn did not start')
+                time.sleep(0.1)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        process.wait(10)
+
+
+def get(url, headers=None):
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers or {}), timeout=10) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='gunicorn needs a POSIX system')
+class TestUnderGunicorn:
+    """Test shedding with the shipped gunicorn.conf.py, without a proxy"""
+
+    def test_queued_requests_are_shed(self, tmp_path):
+        with run_gunicorn(tmp_path) as server:
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                results = list(pool.map(lambda _: get(server + '/api/slow'), range(4)))
+        statuses = sorted(status for status, _ in results)
+        # One thread: the first request is served, those queued behind it wait
+        # 0.5s for the thread, more than the target delay, and are shed
+        assert statuses[0] == 200 and statuses[-1] == 503
+        assert all(body['request_start'].startswith('t=') for status, body in results if status == 200)
+
+    def test_request_start_only_trusted_from_proxies(self, tmp_path):
+        old = {'X-Request-Start': f"t={time.time() - 5:.3f}"}
+        # The test client connects from 127.0.0.1, a trusted proxy by default
+        with run_gunicorn(tmp_path) as server:
+            assert get(server + '/api/slow', old)[0] == 503
+        with run_gunicorn(tmp_path, '--forwarded-allow-ips', '192.0.2.1') as server:
+            status, body = get(server + '/api/slow', old)
+        assert status == 200
+        assert body['request_start'] != old['X-Request-Start']
@@ -5,7 +5,7 @@ Unit tests for the LLM Location Assistant API
 import pytest
 import json
 import os
-from app import app, location_service
+from app import app
 
 @pytest.fixture
 def client():
@@ -206,6 +206,16 @@ class TestRateLimiting:
         response = client.get('/api/health')
         # Flask-Limiter may add rate limit headers
         # This test ensures the endpoint is accessible
+    
+    def test_rate_limited_response_has_retry_after(self):
+        """Test that a 429 tells clients when to retry"""
+        from app import create_app
+        limited_app = create_app({'RATELIMIT_STORAGE_URI': 'memory://'})
+        with limited_app.test_client() as limited_client:
+            for _ in range(61):
+                response = limited_client.post('/api/llm-chat', json={'message': 'hello'})
+        assert response.status_code == 429
+        assert 1 <= int(response.headers['Retry-After']) <= 61
 
 if __name__ == '__main__':
     pytest.main([__file__])
@@ -0,0 +1,136 @@
+"""
+Tests for the tiered upstream response cache
+"""
+
+import json
+import threading
+import time
+
+from app import LocationService
+from cache import MISSING, MemoryCache, TieredCache, cache_key
+
+
+class FakeRedis:
+    """Minimal Redis stand-in for get/set/ttl/delete"""
+
+    def __init__(self, fail=False):
+        self.data = {}
+        self.fail = fail
+
+    def get(self, key):
+        if self.fail:
+            raise ConnectionError('redis down')
+        return self.data.get(key, (None,))[0]
+
+    def ttl(self, key):
+        return self.data[key][1] if key in self.data else -2
+
+    def set(self, key, value, ex=None):
+        if self.fail:
+            raise ConnectionError('redis down')
+        self.data[key] = (value, ex)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class TestMemoryCache:
+    """Test the per-process LRU"""
+
+    def test_expiry(self):
+        now = [0.0]
+        cache = MemoryCache(clock=lambda: now[0])
+        cache.set('a', 1, ttl=10)
+        assert cache.get('a') == 1
+        now[0] = 11
+        assert cache.get('a') is MISSING
+
+    def test_evicts_least_recently_used(self):
+        cache = MemoryCache(max_entries=2)
+        cache.set('a', 1, ttl=60)
+        cache.set('b', 2, ttl=60)
+        cache.get('a')
+        cache.set('c', 3, ttl=60)
+        assert cache.get('b') is MISSING
+        assert cache.get('a') == 1
+
+
+class TestTieredCache:
+    """Test memory/Redis tiers and load coalescing"""
+
+    def test_key_ignores_parameter_order(self):
+        assert cache_key('maps:geocode', {'a': 1, 'b': 2}) == cache_key('maps:geocode', {'b': 2, 'a': 1})
+        assert cache_key('maps:geocode', {'a': 1}) != cache_key('maps:places', {'a': 1})
+
+    def test_shared_through_redis(self):
+        redis = FakeRedis()
+        first = TieredCache(redis_provider=lambda: redis)
+        second = TieredCache(redis_provider=lambda: redis)
+        first.set('k', {'results': [1]}, ttl=60)
+        assert json.loads(redis.data['cache:k'][0]) == {'results': [1]}
+        assert second.get('k') == {'results': [1]}
+
+    def test_redis_failure_falls_back_to_memory(self):
+        failures = []
+        cache = TieredCache(redis_provider=lambda: FakeRedis(fail=True),
+                            on_redis_error=lambda: failures.append(1))
+        cache.set('k', 'v', ttl=60)
+        assert cache.get('k') == 'v'
+        assert cache.get('other') is MISSING
+        assert len(failures) == 2
+
+    def test_concurrent_misses_load_once(self):
+        cache = TieredCache()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            time.sleep(0.05)
+            return 'value'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_load('k', 60, loader)))
+                   for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert results == ['value'] * 5
+        assert len(calls) == 1
+
+    def test_errors_are_not_cached(self):
+        cache = TieredCache()
+
+        def failing():
+            raise TimeoutError('upstream')
+
+        try:
+            cache.get_or_load('k', 60, failing)
+        except TimeoutError:
+            pass
+        assert cache.get_or_load('k', 60, lambda: 'ok') == 'ok'
+
+
+class TestServiceCaching:
+    """Test LocationService going through the cache"""
+
+    class CountingMapsClient:
+        def __init__(self):
+            self.calls = 0
+
+        def geocode(self, address=None):
+            self.calls += 1
+            return [{'geometry': {'location': {'lat': 40.7, 'lng': -74.0}}}]
+
+        def places_nearby(self, **kwargs):
+            self.calls += 1
+            return {'results': []}
+
+    def test_repeated_search_hits_cache(self):
+        gmaps = self.CountingMapsClient()
+        service = LocationService(gmaps, cache=TieredCache())
+        service.search_places('coffee', location='New York')
+        service.search_places('coffee', location='New York')
+        assert gmaps.calls == 2
+        service.search_places('tea', location='New York')
+        assert gmaps.calls == 3
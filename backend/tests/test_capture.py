@@ -0,0 +1,181 @@
+"""
+Tests for traffic capture and replay
+"""
+
+import pytest
+from flask import Flask, jsonify
+
+import app as app_module
+from capture import TrafficCapture, read_capture, sanitize
+from replay import ReplayMapsClient, ReplayUpstreamError, build_replay_app, replay
+from upstream import MapsClientProxy
+
+GEOCODE_RESPONSE = [{'geometry': {'location': {'lat': 40.7128, 'lng': -74.0060}}}]
+PLACES_RESPONSE = {'results': [{'name': 'Cafe One', 'place_id': 'p1', 'rating': 4.4}]}
+
+
+class FakeMapsClient:
+    """Minimal stand-in for googlemaps.Client"""
+
+    def geocode(self, address=None):
+        return GEOCODE_RESPONSE
+
+    def places_nearby(self, **kwargs):
+        return PLACES_RESPONSE
+
+
+@pytest.fixture
+def capture(tmp_path):
+    capture = TrafficCapture(str(tmp_path), max_records_per_file=2)
+    yield capture
+    capture.close()
+
+
+class TestSanitize:
+    """Test request body sanitization"""
+
+    def test_drops_credential_fields(self):
+        assert sanitize({'query': 'cafe', 'api_key': 'abc', 'Auth-Token': 'x'}) == {'query': 'cafe'}
+
+    def test_keeps_chat_session_id(self):
+        cleaned = sanitize({'message': 'what about bars?', 'session_id': 'abc', 'session_token': 'x'})
+        assert cleaned == {'message': 'what about bars?', 'session_id': 'abc'}
+
+    def test_masks_contact_details_and_truncates(self):
+        cleaned = sanitize({'message': 'mail me at a.b@example.com or +1 (555) 123-4567'})
+        assert 'example.com' not in cleaned['message']
+        assert '555' not in cleaned['message']
+        assert len(sanitize('x' * 500, max_length=50)) == 50
+
+
+class TestTrafficCapture:
+    """Test recording requests with their upstream exchanges"""
+
+    def test_records_request_and_upstream_calls(self, capture, tmp_path):
+        flask_app = Flask(__name__)
+        proxy = MapsClientProxy(FakeMapsClient(), observers=[capture])
+        capture.init_app(flask_app)
+
+        @flask_app.route('/api/search', methods=['POST'])
+        def search():
+            proxy.geocode(address='New York')
+            return jsonify(proxy.places_nearby(keyword='coffee'))
+
+        client = flask_app.test_client()
+        for _ in range(3):
+            assert client.post('/api/search', json={'query': 'coffee', 'token': 's'}).status_code == 200
+        capture.close()
+
+        records = list(read_capture([str(tmp_path)]))
+        assert len(records) == 3
+        # Rotation after two records per file
+        assert len(list(tmp_path.glob('*.jsonl.gz'))) == 2
+        record = records[0]
+        assert record['body'] == {'query': 'coffee'}
+        assert record['status'] == 200
+        assert [call['method'] for call in record['upstream']] == ['geocode', 'places_nearby']
+        assert record['upstream'][1]['response'] == PLACES_RESPONSE
+
+    def test_records_response_cache_hits(self, tmp_path, monkeypatch):
+        monkeypatch.setenv('CAPTURE_ENABLED', 'true')
+        monkeypatch.setenv('CAPTURE_DIR', str(tmp_path))
+        flask_app = app_module.create_app({'WARMING_ENABLED': False}, maps_client=FakeMapsClient())
+        monkeypatch.setattr(app_module.limiter, 'enabled', False)
+        client = flask_app.test_client()
+        hits = [client.post('/api/search', json={'query': 'coffee', 'location': 'New York'}).headers['X-Cache']
+                for _ in range(3)]
+        assert hits == ['MISS', 'HIT', 'HIT']
+        observers = flask_app.extensions['location_assistant']['clients'].maps_observers
+        next(o for o in observers if isinstance(o, TrafficCapture)).close()
+
+        records = list(read_capture([str(tmp_path)]))
+        assert len(records) == 3
+        assert [len(record['upstream']) for record in records] == [2, 0, 0]
+
+    def test_sanitizes_upstream_params_and_replays_them(self, tmp_path, monkeypatch):
+        monkeypatch.setenv('CAPTURE_ENABLED', 'true')
+        monkeypatch.setenv('CAPTURE_DIR', str(tmp_path))
+        flask_app = app_module.create_app({'WARMING_ENABLED': False}, maps_client=FakeMapsClient())
+        monkeypatch.setattr(app_module.limiter, 'enabled', False)
+        body = {'query': 'call me at +1 (555) 123-4567', 'location': 'home of a.b@example.com'}
+        assert flask_app.test_client().post('/api/search', json=body).status_code == 200
+        observers = flask_app.extensions['location_assistant']['clients'].maps_observers
+        next(o for o in observers if isinstance(o, TrafficCapture)).close()
+
+        records = list(read_capture([str(tmp_path)]))
+        geocode, places = records[0]['upstream']
+        assert geocode['params'] == {'address': 'home of <email>'}
+        assert places['params']['keyword'] == 'call me at <phone>'
+
+        replay_client = ReplayMapsClient(records)
+        monkeypatch.setenv('CAPTURE_ENABLED', 'false')
+        replay_app = app_module.create_app({'WARMING_ENABLED': False}, maps_client=replay_client)
+        assert replay(records, replay_app, speed=50)['status_mismatches'] == 0
+        assert (replay_client.hits, replay_client.misses) == (2, 0)
+
+    def test_ignores_calls_outside_requests(self, capture):
+        proxy = MapsClientProxy(FakeMapsClient(), observers=[capture])
+        assert proxy.geocode(address='Boston') == GEOCODE_RESPONSE
+
+
+class TestReplay:
+    """Test serving captured upstream responses and re-driving requests"""
+
+    def _record(self, ts, status=200):
+        return {
+            'ts': ts,
+            'route': '/api/search',
+            'method': 'POST',
+            'body': {'query': 'coffee', 'location': 'New York'},
+            'status': status,
+            'duration_ms': 5.0,
+            'upstream': [
+                {'method': 'geocode', 'params': {'address': 'New York'},
+                 'response': GEOCODE_RESPONSE, 'error': None},
+                {'method': 'places_nearby',
+                 'params': {'location': {'lat': 40.7128, 'lng': -74.006}, 'radius': 5000,
+                            'keyword': 'coffee', 'type': None},
+                 'response': PLACES_RESPONSE, 'error': None},
+            ],
+        }
+
+    def test_replay_client_serves_captured_responses(self):
+        client = ReplayMapsClient([self._record(0)])
+        assert client.geocode(address='New York') == GEOCODE_RESPONSE
+        with pytest.raises(LookupError):
+            client.geocode(address='Paris')
+        assert (client.hits, client.misses) == (1, 1)
+
+    def test_replay_client_raises_captured_errors(self):
+        record = self._record(0)
+        record['upstream'][0]['error'] = 'OVER_QUERY_LIMIT'
+        with pytest.raises(ReplayUpstreamError):
+            ReplayMapsClient([record]).geocode(address='New York')
+
+    def test_replay_rejects_out_of_range_speed(self):
+        with pytest.raises(ValueError):
+            replay([self._record(0)], app_module.app, speed=100)
+
+    def test_replay_app_is_isolated(self, monkeypatch):
+        monkeypatch.setenv('REDIS_URL', 'redis://production:6379/0')
+        monkeypatch.setenv('CAPTURE_ENABLED', 'true')
+        monkeypatch.setenv('CACHE_SHM_PATH', '/dev/shm/location-assistant-cache')
+        monkeypatch.setattr(app_module.limiter, 'enabled', True)
+        flask_app, _ = build_replay_app([self._record(0)])
+        state = flask_app.extensions['location_assistant']
+        assert state['clients'].redis is None
+        assert state['cache'].shared is None and state['cache']._redis_provider is None
+        assert state['warmer'] is None
+
+    def test_replay_drives_app_offline(self, monkeypatch):
+        records = [self._record(ts) for ts in (0.0, 0.5, 1.0)]
+        replay_client = ReplayMapsClient(records)
+        flask_app = app_module.create_app(maps_client=replay_client)
+        monkeypatch.setattr(app_module.limiter, 'enabled', False)
+
+        summary = replay(records, flask_app, speed=50)
+
+        assert summary['requests'] == 3
+        assert summary['status_mismatches'] == 0
+        assert summary['wall_time_s'] < 1.0
+        assert replay_client.misses == 0
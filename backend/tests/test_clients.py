@@ -0,0 +1,90 @@
+"""
+Tests for lazily created, fork-safe service clients
+"""
+
+import os
+import time
+
+from app import create_app, get_location_service
+from clients import LazyClient, ServiceClients
+from upstream import MapsClientProxy
+
+
+class FlakyFactory:
+    """Factory that fails a number of times before returning a client"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError('connection refused')
+        return object()
+
+
+class TestLazyClient:
+    """Test lazy creation and background reconnect"""
+
+    def test_not_created_until_first_use(self):
+        factory = FlakyFactory(0)
+        client = LazyClient('test', factory)
+        assert factory.calls == 0
+        assert client.get() is client.get()
+        assert factory.calls == 1
+
+    def test_reconnects_in_background(self):
+        factory = FlakyFactory(2)
+        client = LazyClient('test', factory, retry_interval=0.01)
+        assert client.get() is None
+        deadline = time.time() + 2
+        while client.get() is None and time.time() < deadline:
+            time.sleep(0.01)
+        assert client.get() is not None
+        assert factory.calls == 3
+        client.close()
+
+    def test_rebuilds_after_pid_change(self, monkeypatch):
+        client = LazyClient('test', FlakyFactory(0))
+        first = client.get()
+        monkeypatch.setattr(client, '_pid', os.getpid() + 1)
+        assert client.get() is not first
+
+
+class TestServiceClients:
+    """Test the per-app client holder"""
+
+    def test_without_redis_url(self):
+        assert ServiceClients(redis_url=None).redis is None
+
+    def test_placeholder_key_is_not_configured(self):
+        clients = ServiceClients(maps_api_key=ServiceClients.PLACEHOLDER_API_KEY)
+        assert not clients.maps_configured
+        assert clients.maps is None
+
+    def test_prebuilt_maps_client_is_proxied(self):
+        fake = object()
+        observer = object()
+        clients = ServiceClients(maps_client=fake)
+        clients.add_maps_observer(observer)
+        assert isinstance(clients.maps, MapsClientProxy)
+        assert clients.maps.client is fake
+        assert observer in clients.maps.observers
+
+
+class TestCreateApp:
+    """Test the application factory"""
+
+    def test_location_service_follows_maps_client(self):
+        flask_app = create_app(maps_client=object())
+        with flask_app.app_context():
+            service = get_location_service()
+            assert service is get_location_service()
+            assert service.gmaps.client is not None
+
+    def test_without_maps_client(self, monkeypatch):
+        monkeypatch.delenv('GOOGLE_MAPS_API_KEY', raising=False)
+        flask_app = create_app()
+        with flask_app.app_context():
+            assert get_location_service() is None
@@ -0,0 +1,154 @@
+"""
+Tests for chat conversation context
+"""
+
+import pytest
+
+from app import create_app
+from conversation import (ConversationStore, follow_up_query, refinement_options,
+                          valid_session_id)
+
+BOSTON = {'lat': 42.3601, 'lng': -71.0589}
+
+
+class FakeRedis:
+    def __init__(self, fail=False):
+        self.data = {}
+        self.fail = fail
+
+    def get(self, key):
+        if self.fail:
+            raise ConnectionError('redis down')
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        if self.fail:
+            raise ConnectionError('redis down')
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class TestParsing:
+    """Test follow-up and refinement detection"""
+
+    @pytest.mark.parametrize('message, expected', [
+        ('What about bars?', 'bars'),
+        ('how about pizza', 'pizza'),
+        ('find coffee in Boston', None),
+        ('what about', None),
+    ])
+    def test_follow_up_query(self, message, expected):
+        assert follow_up_query(message) == expected
+
+    def test_refinement_options(self):
+        assert refinement_options('Which are open now?') == {'open_now': True}
+        assert refinement_options('show me the closest')['weights']['distance'] == 1.0
+        assert refinement_options('find coffee') is None
+
+    def test_session_id_validation(self):
+        assert valid_session_id('a1b2c3d4e5')
+        assert not valid_session_id('short')
+        assert not valid_session_id('../../etc/passwd')
+        assert not valid_session_id(None)
+
+
+class TestConversationStore:
+    """Test storage bounds and Redis fallback"""
+
+    def test_context_is_trimmed(self):
+        store = ConversationStore(max_results=2, max_history=2)
+        places = [{'name': f"p{i}", 'place_id': f"p{i}", 'photos': ['x'] * 3} for i in range(5)]
+        store.save('session-1', {'results': places, 'history': ['a', 'b', 'c']})
+        context = store.load('session-1')
+        assert [p['place_id'] for p in context['results']] == ['p0', 'p1']
+        assert 'photos' not in context['results'][0]
+        assert context['history'] == ['b', 'c']
+
+    def test_least_recent_sessions_evicted(self):
+        store = ConversationStore(max_sessions=2)
+        for name in ('session-1', 'session-2', 'session-3'):
+            store.save(name, {'query': name})
+        assert store.load('session-1') == {}
+        assert store.load('session-3')['query'] == 'session-3'
+
+    def test_shared_through_redis(self):
+        redis = FakeRedis()
+        ConversationStore(redis_provider=lambda: redis).save('session-1', {'query': 'coffee'})
+        assert ConversationStore(redis_provider=lambda: redis).load('session-1')['query'] == 'coffee'
+
+    def test_falls_back_to_memory(self):
+        store = ConversationStore(redis_provider=lambda: FakeRedis(fail=True))
+        store.save('session-1', {'query': 'coffee'})
+        assert store.load('session-1')['query'] == 'coffee'
+
+
+class CountingMapsClient:
+    def __init__(self):
+        self.geocodes = 0
+        self.searches = []
+
+    def geocode(self, address=None):
+        self.geocodes += 1
+        return [{'geometry': {'location': BOSTON}}]
+
+    def places_nearby(self, location=None, keyword=None, **kwargs):
+        self.searches.append(keyword)
+        return {'results': [
+            {'name': f"{keyword} {i}", 'place_id': f"{keyword}-{i}", 'rating': 4.0 + i / 10,
+             'opening_hours': {'open_now': i % 2 == 0},
+             'geometry': {'location': {'lat': BOSTON['lat'] + i * 0.001, 'lng': BOSTON['lng']}}}
+            for i in range(4)
+        ]}
+
+
+class TestChatFollowUps:
+    """Test multi-turn chat reusing the stored context"""
+
+    @pytest.fixture
+    def chat(self):
+        gmaps = CountingMapsClient()
+        flask_app = create_app({'CACHE_ENABLED': False}, maps_client=gmaps)
+        flask_app.config['TESTING'] = True
+        with flask_app.test_client() as client:
+            def send(message, session_id=None, **extra):
+                response = client.post('/api/llm-chat', json={'message': message, 'session_id': session_id, **extra})
+                assert response.status_code == 200
+                return response.get_json()
+            yield send, gmaps
+
+    def test_follow_up_reuses_location(self, chat):
+        send, gmaps = chat
+        first = send('find coffee in boston')
+        session_id = first['session_id']
+        assert gmaps.geocodes == 1
+
+        second = send('what about bars?', session_id)
+        assert second['type'] == 'places'
+        assert second['data']['map_center'] == BOSTON
+        assert gmaps.geocodes == 1
+        assert gmaps.searches[-1] == 'bars'
+
+    def test_refinement_uses_stored_results(self, chat):
+        send, gmaps = chat
+        session_id = send('find coffee in boston')['session_id']
+        calls = (gmaps.geocodes, len(gmaps.searches))
+
+        refined = send('which are open now?', session_id)
+        assert refined['data']['refined']
+        assert refined['data']['results_count'] == 2
+        assert all(p['opening_hours'] for p in refined['data']['places'])
+        assert (gmaps.geocodes, len(gmaps.searches)) == calls
+
+    def test_sessions_are_separate(self, chat):
+        send, gmaps = chat
+        send('find coffee in boston')
+        other = send('what about bars?')
+        assert other['type'] == 'help'
+
+    def test_explicit_context_location(self, chat):
+        send, gmaps = chat
+        result = send('find coffee', context={'location': 'Boston, MA', 'radius': 1000})
+        assert result['data']['map_center'] == BOSTON
+        assert result['data']['search_radius'] == 1000
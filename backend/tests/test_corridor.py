@@ -0,0 +1,116 @@
+"""
+Tests for places-along-route search
+"""
+
+import numpy as np
+import pytest
+
+from app import LocationService, create_app
+from cache import TieredCache
+from corridor import distance_to_route, route_offsets, sample_plan, sample_route, snap_to_grid
+from geometry import encode_polyline
+
+# A straight route heading north for about 22 km
+ROUTE = np.column_stack((np.linspace(40.60, 40.80, 50), np.full(50, -74.0)))
+
+
+class TestSampling:
+    """Test corridor sampling helpers"""
+
+    def test_route_length(self):
+        assert route_offsets(ROUTE)[-1] == pytest.approx(22_239, rel=0.01)
+
+    def test_plan_adapts_to_length_and_mode(self):
+        count, radius = sample_plan(22_000, 'driving', max_samples=12)
+        assert count == 12
+        assert radius >= 0.75 * 22_000 / 11
+        walk_count, walk_radius = sample_plan(600, 'walking', max_samples=12)
+        assert walk_count == 4
+        assert walk_radius < radius
+
+    def test_samples_cover_both_ends(self):
+        samples = sample_route(ROUTE, 5)
+        assert samples[0] == pytest.approx(ROUTE[0])
+        assert samples[-1] == pytest.approx(ROUTE[-1])
+        assert np.diff(samples[:, 0]) == pytest.approx(np.full(4, 0.05))
+
+    def test_snapping_is_stable_and_dedupes(self):
+        points = np.array([(40.70001, -74.00001), (40.70002, -74.00002), (40.75, -74.0)])
+        snapped = snap_to_grid(points, 500)
+        assert len(snapped) == 2
+        shifted = snap_to_grid(points + 0.00001, 500)
+        assert shifted.tolist() == snapped.tolist()
+
+    def test_distance_to_route(self):
+        lat = np.array([40.70, 40.70])
+        lng = np.array([-74.0, -73.99])
+        distance, along = distance_to_route(lat, lng, ROUTE[[0, -1]])
+        assert distance[0] == pytest.approx(0, abs=1)
+        assert distance[1] == pytest.approx(843, rel=0.02)
+        assert along == pytest.approx([11_120, 11_120], rel=0.01)
+
+
+class FakeMapsClient:
+    """Directions along ROUTE and a few places scattered around it"""
+
+    def __init__(self):
+        self.nearby_calls = []
+
+    def directions(self, **kwargs):
+        return [{
+            'overview_polyline': {'points': encode_polyline(ROUTE)},
+            'legs': [{'distance': {'text': '22 km'}, 'duration': {'text': '25 mins'}, 'steps': []}]
+        }]
+
+    def places_nearby(self, location=None, radius=None, **kwargs):
+        self.nearby_calls.append((location['lat'], location['lng'], radius))
+        places = [
+            ('on_route', 40.70, -74.0, 4.0),
+            ('off_route', 40.70, -73.98, 4.8),
+            ('far_away', 40.70, -73.80, 5.0),
+        ]
+        return {'results': [
+            {'name': name, 'place_id': name, 'rating': rating,
+             'geometry': {'location': {'lat': lat, 'lng': lng}}}
+            for name, lat, lng, rating in places
+        ]}
+
+
+class TestSearchAlongRoute:
+    """Test LocationService.search_along_route"""
+
+    def test_merges_and_ranks_by_detour(self):
+        gmaps = FakeMapsClient()
+        service = LocationService(gmaps)
+        results = service.search_along_route('A', 'B', 'coffee')
+        assert results['success']
+        assert len(gmaps.nearby_calls) == len(results['samples']) <= service.route_max_samples
+        # Every circle returns the same places; they are merged by place_id
+        assert results['candidates_count'] == 3
+        assert [p['place_id'] for p in results['places']] == ['on_route', 'off_route']
+        on_route, off_route = results['places']
+        assert on_route['detour_m'] < 10
+        assert off_route['detour_m'] == pytest.approx(2 * off_route['distance_m'], abs=1)
+        assert on_route['route_offset_m'] == pytest.approx(11_120, rel=0.01)
+
+    def test_overlapping_searches_reuse_cache(self):
+        gmaps = FakeMapsClient()
+        service = LocationService(gmaps, cache=TieredCache())
+        first = service.search_along_route('A', 'B', 'coffee')
+        calls = len(gmaps.nearby_calls)
+        second = service.search_along_route('A', 'B', 'coffee')
+        assert len(gmaps.nearby_calls) == calls
+        assert second['places'] == first['places']
+
+    def test_endpoint(self):
+        flask_app = create_app(maps_client=FakeMapsClient())
+        flask_app.config['TESTING'] = True
+        with flask_app.test_client() as client:
+            response = client.post('/api/search/along-route', json={'query': 'coffee', 'origin': 'A'})
+            assert response.status_code == 400
+            response = client.post('/api/search/along-route',
+                                   json={'query': 'coffee', 'origin': 'A', 'destination': 'B', 'max_detour': 5000})
+            assert response.status_code == 200
+            data = response.get_json()
+            assert data['places_data']['max_detour'] == 5000
+            assert data['places_data']['places'][0]['place_id'] == 'on_route'
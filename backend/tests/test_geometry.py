@@ -0,0 +1,118 @@
+"""
+Tests for route geometry decoding and simplification
+"""
+
+import numpy as np
+import pytest
+
+from app import LocationService
+from geometry import (decode_polyline, encode_polyline, fit_zoom, route_geometry, simplify,
+                      tolerance_for_zoom)
+
+# Example from Google's polyline algorithm documentation
+GOOGLE_EXAMPLE = '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+GOOGLE_POINTS = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+
+
+def wiggly_line(n=2000):
+    lat = np.linspace(40.70, 40.80, n)
+    lng = -74.0 + 0.00001 * np.sin(np.arange(n))
+    return np.column_stack((lat, lng))
+
+
+class TestPolylineCodec:
+    """Test encoded polyline decoding and encoding"""
+
+    def test_decode_reference_example(self):
+        assert decode_polyline(GOOGLE_EXAMPLE) == pytest.approx(np.array(GOOGLE_POINTS))
+
+    def test_encode_reference_example(self):
+        assert encode_polyline(GOOGLE_POINTS) == GOOGLE_EXAMPLE
+
+    def test_round_trip(self):
+        points = np.round(wiggly_line(500), 5)
+        assert decode_polyline(encode_polyline(points)) == pytest.approx(points)
+
+    def test_empty(self):
+        assert decode_polyline('').shape == (0, 2)
+        assert encode_polyline([]) == ''
+
+    @pytest.mark.parametrize('bad', ['_p~iF~ps|U_', '_p~iF', 'abc\x01'])
+    def test_invalid_input(self, bad):
+        with pytest.raises(ValueError):
+            decode_polyline(bad)
+
+
+class TestSimplify:
+    """Test Douglas-Peucker simplification"""
+
+    def test_straight_line_collapses_to_endpoints(self):
+        points = np.column_stack((np.linspace(40, 41, 100), np.full(100, -74.0)))
+        simplified = simplify(points, 1.0)
+        assert len(simplified) == 2
+        assert simplified[0] == pytest.approx(points[0])
+        assert simplified[-1] == pytest.approx(points[-1])
+
+    def test_keeps_corners(self):
+        points = np.array([(40.0, -74.0), (40.0, -73.99), (40.0, -73.98), (40.01, -73.98)])
+        simplified = simplify(points, 5.0)
+        assert len(simplified) == 3
+
+    def test_noise_below_tolerance_is_dropped(self):
+        points = wiggly_line()
+        assert len(simplify(points, 5.0)) < 10
+        assert len(simplify(points, 0.1)) > 100
+
+
+class TestZoom:
+    """Test zoom-dependent tolerance"""
+
+    def test_tolerance_halves_per_zoom_level(self):
+        assert tolerance_for_zoom(0, 0) == pytest.approx(156543.03392)
+        assert tolerance_for_zoom(13, 40) == pytest.approx(tolerance_for_zoom(12, 40) / 2)
+
+    def test_fit_zoom(self):
+        city = {'northeast': {'lat': 40.80, 'lng': -73.93}, 'southwest': {'lat': 40.70, 'lng': -74.02}}
+        state = {'northeast': {'lat': 42.4, 'lng': -71.0}, 'southwest': {'lat': 40.7, 'lng': -74.0}}
+        assert fit_zoom(state) < fit_zoom(city)
+        assert fit_zoom(None) == 12.0
+
+
+class TestRouteGeometry:
+    """Test geometry returned from get_directions"""
+
+    def _route(self):
+        line = np.round(wiggly_line(), 5)
+        return {
+            'bounds': {'northeast': {'lat': 40.80, 'lng': -73.99}, 'southwest': {'lat': 40.70, 'lng': -74.01}},
+            'overview_polyline': {'points': encode_polyline(line)},
+            'legs': [{
+                'distance': {'text': '11 km'},
+                'duration': {'text': '20 mins'},
+                'start_address': 'A',
+                'end_address': 'B',
+                'steps': [
+                    {'html_instructions': 'Head north', 'polyline': {'points': encode_polyline(line[:1000])}},
+                    {'html_instructions': 'Continue', 'polyline': {'points': encode_polyline(line[999:])}},
+                ],
+            }],
+        }
+
+    def test_simplifies_overview_and_steps(self):
+        geometry = route_geometry(self._route(), zoom=12)
+        assert geometry['original_points'] == 2000
+        assert geometry['overview_points'] < 20
+        assert len(geometry['steps']) == 2
+        assert len(geometry['overview']) < len(self._route()['overview_polyline']['points']) / 50
+
+    def test_get_directions_returns_geometry(self):
+        route = self._route()
+
+        class FakeMapsClient:
+            def directions(self, **kwargs):
+                return [route]
+
+        directions = LocationService(FakeMapsClient()).get_directions('A', 'B', zoom=14)
+        assert directions['success']
+        assert directions['geometry']['zoom'] == 14
+        assert decode_polyline(directions['geometry']['overview'])[0] == pytest.approx([40.70, -74.0])
@@ -0,0 +1,127 @@
+"""
+Tests for reachability polygons from travel-time grids
+"""
+
+import numpy as np
+import pytest
+
+from app import LocationService, create_app
+from cache import TieredCache
+from isochrone import reach_distances, reach_polygon, ring_distances, travel_times
+from ranking import haversine_m
+
+CENTER = {'lat': 40.7128, 'lng': -74.0060}
+SPEED_MPS = 10.0
+
+
+def uniform_grid(rings=4, bearings=8, radius_m=8000, speed=SPEED_MPS):
+    distances = ring_distances(radius_m, rings)[1:]
+    return {
+        'center': CENTER,
+        'mode': 'driving',
+        'radius_m': radius_m,
+        'durations': [[d / speed] * bearings for d in distances]
+    }
+
+
+class TestReach:
+    """Test polygon and travel time interpolation"""
+
+    def test_reach_matches_speed(self):
+        reach, truncated = reach_distances(uniform_grid(), 300)
+        assert reach == pytest.approx(np.full(8, 3000))
+        assert not truncated
+
+    def test_truncated_at_grid_edge(self):
+        reach, truncated = reach_distances(uniform_grid(), 10_000)
+        assert reach == pytest.approx(np.full(8, 8000))
+        assert truncated
+
+    def test_unreachable_bearing(self):
+        grid = uniform_grid()
+        for row in grid['durations']:
+            row[2] = None
+        reach, _ = reach_distances(grid, 300)
+        assert reach[2] == 0
+        assert reach[0] == pytest.approx(3000)
+
+    def test_polygon_is_closed(self):
+        polygon, _ = reach_polygon(uniform_grid(), 300)
+        assert len(polygon) == 9
+        assert polygon[0] == polygon[-1]
+        distances = haversine_m(np.array([p['lat'] for p in polygon]), np.array([p['lng'] for p in polygon]),
+                                CENTER['lat'], CENTER['lng'])
+        assert distances == pytest.approx(np.full(9, 3000), rel=0.01)
+
+    def test_travel_times(self):
+        grid = uniform_grid()
+        lat = np.array([CENTER['lat'] + 0.01, CENTER['lat'] + 1.0])
+        lng = np.array([CENTER['lng'] + 0.003, CENTER['lng']])
+        times = travel_times(grid, lat, lng)
+        expected = haversine_m(lat[:1], lng[:1], CENTER['lat'], CENTER['lng'])[0] / SPEED_MPS
+        assert times[0] == pytest.approx(expected, rel=0.02)
+        assert np.isinf(times[1])
+
+
+class FakeMapsClient:
+    """Travel time proportional to straight-line distance"""
+
+    def __init__(self):
+        self.matrix_calls = 0
+        self.elements = 0
+
+    def geocode(self, address=None):
+        return [{'geometry': {'location': CENTER}}]
+
+    def distance_matrix(self, origins=None, destinations=None, **kwargs):
+        self.matrix_calls += 1
+        self.elements += len(origins) * len(destinations)
+        rows = []
+        for origin in origins:
+            lat = np.array([d['lat'] for d in destinations])
+            lng = np.array([d['lng'] for d in destinations])
+            meters = haversine_m(lat, lng, origin['lat'], origin['lng'])
+            rows.append({'elements': [
+                {'status': 'OK', 'distance': {'value': int(m)}, 'duration': {'value': int(m / SPEED_MPS)}}
+                for m in meters
+            ]})
+        return {'rows': rows}
+
+    def places_nearby(self, location=None, radius=None, **kwargs):
+        return {'results': [
+            {'name': name, 'place_id': name, 'rating': 4.5,
+             'geometry': {'location': {'lat': CENTER['lat'] + offset, 'lng': CENTER['lng']}}}
+            for name, offset in (('near', 0.01), ('far', 0.2))
+        ]}
+
+
+class TestGetReachable:
+    """Test LocationService.get_reachable and the endpoint"""
+
+    def test_grid_is_reused_across_time_limits(self):
+        gmaps = FakeMapsClient()
+        service = LocationService(gmaps, cache=TieredCache())
+        ten = service.get_reachable('New York', 10)
+        calls = gmaps.matrix_calls
+        assert calls == -(-service.reachable_rings * service.reachable_bearings // 25)
+        assert gmaps.elements == service.reachable_rings * service.reachable_bearings
+        twenty = service.get_reachable('New York', 20, query='coffee')
+        assert gmaps.matrix_calls == calls
+        assert twenty['area_km2'] > ten['area_km2']
+
+    def test_places_filtered_by_travel_time(self):
+        service = LocationService(FakeMapsClient(), cache=TieredCache())
+        result = service.get_reachable('New York', 5, query='coffee')
+        assert result['candidates_count'] == 2
+        assert [p['place_id'] for p in result['places']] == ['near']
+        assert 0 < result['places'][0]['travel_time_s'] <= 300
+
+    def test_endpoint(self):
+        flask_app = create_app(maps_client=FakeMapsClient())
+        flask_app.config['TESTING'] = True
+        with flask_app.test_client() as client:
+            assert client.post('/api/reachable', json={'origin': 'A'}).status_code == 400
+            assert client.post('/api/reachable', json={'origin': 'A', 'minutes': 600}).status_code == 400
+            response = client.post('/api/reachable', json={'origin': 'A', 'minutes': 15, 'mode': 'walking'})
+            assert response.status_code == 200
+            assert response.get_json()['success']
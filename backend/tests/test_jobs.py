@@ -0,0 +1,356 @@
+"""
+Tests for the asynchronous job API
+"""
+
+import json
+import threading
+import time
+
+import pytest
+
+from app import create_app
+from jobs import InMemoryJobStore, JobError, JobWorker, RedisJobStore, validate_job
+
+
+class FakeService:
+    """LocationService stand-in recording calls"""
+
+    def __init__(self):
+        self.searches = []
+
+    def search_places(self, query, location=None, radius=5000, place_type=None):
+        self.searches.append(query)
+        return {'success': True, 'query': query, 'places': []}
+
+
+class FakeMatrixClient:
+    """Maps client answering distance matrix requests"""
+
+    def __init__(self):
+        self.calls = []
+
+    def distance_matrix(self, origins, destinations, mode, language):
+        self.calls.append((len(origins), len(destinations)))
+        element = {'status': 'OK', 'distance': {'value': 1000}, 'duration': {'value': 120}}
+        return {'rows': [{'elements': [element] * len(destinations)} for _ in origins]}
+
+
+class FakePipeline:
+    """Queues commands on a FakeRedis until executed"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((getattr(self.redis, name), args, kwargs))
+
+    def execute(self):
+        return [command(*args, **kwargs) for command, args, kwargs in self.commands]
+
+
+class FakeRedis:
+    """Minimal Redis stand-in for the job store"""
+
+    def __init__(self):
+        self.data = {}
+        self.lists = {}
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def lpush(self, key, value):
+        self.lists.setdefault(key, []).insert(0, value)
+
+    def lrange(self, key, start, end):
+        return list(self.lists.get(key, []))
+
+    def lrem(self, key, count, value):
+        items = self.lists.get(key, [])
+        if value in items:
+            items.remove(value)
+            return 1
+        return 0
+
+    def blmove(self, source, destination, timeout, src='LEFT', dest='RIGHT'):
+        time.sleep(0.01)
+        items = self.lists.get(source)
+        if not items:
+            return None
+        value = items.pop()
+        self.lpush(destination, value)
+        return value
+
+
+def wait_for(store, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = store.get(job_id)
+        if job['status'] in ('succeeded', 'failed'):
+            return job
+        time.sleep(0.01)
+    raise AssertionError('job did not finish')
+
+
+class TestValidation:
+    """Test job request validation"""
+
+    def test_unknown_type(self):
+        with pytest.raises(JobError):
+            validate_job('teleport', {})
+
+    def test_batch_entries_need_required_fields(self):
+        with pytest.raises(JobError):
+            validate_job('batch_search', {'searches': [{'location': 'Boston'}]})
+        validate_job('batch_search', {'searches': [{'query': 'coffee'}]})
+
+
+class TestJobWorker:
+    """Test running jobs from the in-memory store"""
+
+    def test_runs_job_and_reports_progress(self):
+        store = InMemoryJobStore()
+        service = FakeService()
+        worker = JobWorker(store, lambda: service)
+        worker.start()
+        try:
+            job = store.enqueue('batch_search', {'searches': [{'query': 'a'}, {'query': 'b'}]})
+            done = wait_for(store, job['id'])
+        finally:
+            worker.stop(timeout=2)
+        assert done['status'] == 'succeeded'
+        assert done['progress'] == {'done': 2, 'total': 2}
+        assert service.searches == ['a', 'b']
+        assert len(done['result']['results']) == 2
+
+    def test_job_fails_without_service(self):
+        store = InMemoryJobStore()
+        job = store.enqueue('batch_search', {'searches': [{'query': 'a'}]})
+        JobWorker(store, lambda: None).run_job(store.dequeue(timeout=0.1))
+        assert store.get(job['id'])['status'] == 'failed'
+
+    def test_survives_store_errors(self):
+        class FlakyStore(InMemoryJobStore):
+            failures = 1
+
+            def update(self, job_id, **fields):
+                if self.failures:
+                    self.failures -= 1
+                    raise ConnectionError('store down')
+                super().update(job_id, **fields)
+
+        store = FlakyStore()
+        worker = JobWorker(store, FakeService)
+        worker.start()
+        try:
+            first = store.enqueue('batch_search', {'searches': [{'query': 'a'}]})
+            # The 'running' update failed, so the job is marked failed on retry
+            assert wait_for(store, first['id'])['status'] == 'failed'
+            second = store.enqueue('batch_search', {'searches': [{'query': 'b'}]})
+            assert wait_for(store, second['id'])['status'] == 'succeeded'
+            assert all(thread.is_alive() for thread in worker._threads)
+        finally:
+            worker.stop(timeout=2)
+
+    def test_loop_survives_run_job_errors(self):
+        store = InMemoryJobStore()
+        worker = JobWorker(store, FakeService)
+        calls = []
+
+        def broken(job):
+            calls.append(job['id'])
+            raise RuntimeError('boom')
+
+        worker.run_job = broken
+        worker.start()
+        try:
+            store.enqueue('batch_search', {'searches': [{'query': 'a'}]})
+            store.enqueue('batch_search', {'searches': [{'query': 'b'}]})
+            deadline = time.time() + 5
+            while len(calls) < 2 and time.time() < deadline:
+                time.sleep(0.01)
+            assert len(calls) == 2
+            assert worker._threads[0].is_alive()
+        finally:
+            worker.stop(timeout=2)
+
+
+class TestLeases:
+    """Test that jobs of a worker that died are taken back"""
+
+    def make_store(self):
+        redis = FakeRedis()
+        return redis, RedisJobStore(lambda: redis, max_attempts=2)
+
+    def test_finished_jobs_are_acknowledged(self):
+        redis, store = self.make_store()
+        job = store.enqueue('batch_search', {'searches': [{'query': 'a'}]})
+        JobWorker(store, FakeService).run_job(store.dequeue(timeout=0.1))
+        assert store.get(job['id'])['status'] == 'succeeded'
+        assert redis.lists[store.PROCESSING_KEY] == []
+        assert store.LEASE_KEY.format(job['id']) not in redis.data
+
+    def test_interrupted_jobs_are_requeued_then_failed(self):
+        redis, store = self.make_store()
+        job = store.enqueue('batch_search', {'searches': [{'query': 'a'}]})
+        lease = store.LEASE_KEY.format(job['id'])
+
+        # The worker dies after taking the job, and its lease runs out
+        assert store.dequeue(timeout=0.1)['id'] == job['id']
+        assert store.requeue_stale() == 0
+        redis.delete(lease)
+        # Only taken back when also found without a lease the time before
+        assert store.requeue_stale() == 0
+        assert store.requeue_stale() == 1
+        assert store.get(job['id'])['status'] == 'queued'
+
+        # Its second run is interrupted too, which fails it
+        assert store.dequeue(timeout=0.1)['id'] == job['id']
+        redis.delete(lease)
+        store.requeue_stale()
+        store.requeue_stale()
+        failed = store.get(job['id'])
+        assert failed['status'] == 'failed'
+        assert failed['attempts'] == 2
+        assert redis.lists[store.QUEUE_KEY] == [] and redis.lists[store.PROCESSING_KEY] == []
+
+    def test_worker_renews_leases_of_running_jobs(self):
+        redis, store = self.make_store()
+        release = threading.Event()
+
+        class SlowService(FakeService):
+            def search_places(self, *args, **kwargs):
+                release.wait(5)
+                return super().search_places(*args, **kwargs)
+
+        worker = JobWorker(store, SlowService, lease_interval=0.01)
+        worker.start()
+        try:
+            job = store.enqueue('batch_search', {'searches': [{'query': 'a'}]})
+            lease = store.LEASE_KEY.format(job['id'])
+            deadline = time.time() + 5
+            while store.get(job['id'])['status'] != 'running' and time.time() < deadline:
+                time.sleep(0.01)
+            redis.delete(lease)
+            while lease not in redis.data and time.time() < deadline:
+                time.sleep(0.01)
+            assert lease in redis.data
+            # A renewed lease keeps the running job from being taken back
+            store.requeue_stale()
+            store.requeue_stale()
+            assert store.get(job['id'])['status'] == 'running'
+            release.set()
+            assert wait_for(store, job['id'])['status'] == 'succeeded'
+        finally:
+            release.set()
+            worker.stop(timeout=2)
+
+
+class TestJobsEndpoint:
+    """Test the /api/jobs endpoints with the in-memory backend"""
+
+    @pytest.fixture
+    def client(self):
+        matrix_client = FakeMatrixClient()
+        flask_app = create_app({'JOBS_BACKEND': 'memory'}, maps_client=matrix_client)
+        flask_app.matrix_client = matrix_client
+        with flask_app.test_client() as client:
+            yield client
+
+    def test_distance_matrix_job(self, client):
+        origins = [f"origin {i}" for i in range(30)]
+        response = client.post('/api/jobs', json={
+            'type': 'distance_matrix',
+            'params': {'origins': origins, 'destinations': ['A', 'B', 'C', 'D', 'E']}
+        })
+        assert response.status_code == 202
+        job = response.get_json()
+        assert response.headers['Location'] == job['status_url']
+
+        deadline = time.time() + 5
+        while job['status'] not in ('succeeded', 'failed') and time.time() < deadline:
+            time.sleep(0.01)
+            job = client.get(job['status_url']).get_json()
+        assert job['status'] == 'succeeded'
+        assert len(job['result']['rows']) == 30
+        assert job['result']['rows'][29][4]['duration_s'] == 120
+        # 30 origins x 5 destinations split into blocks of at most 100 elements
+        assert client.application.matrix_client.calls == [(20, 5), (10, 5)]
+
+    def test_stream_ends_when_job_finishes(self, client):
+        job = client.post('/api/jobs', json={
+            'type': 'distance_matrix',
+            'params': {'origins': ['A'], 'destinations': ['B']}
+        }).get_json()
+        body = client.get(job['stream_url']).get_data(as_text=True)
+        events = [json.loads(line[len('data: '):]) for line in body.splitlines()
+                  if line.startswith('data: {"')]
+        assert events[-1]['status'] == 'succeeded'
+
+    def test_streams_are_capped(self, client):
+        job = client.post('/api/jobs', json={
+            'type': 'distance_matrix',
+            'params': {'origins': ['A'], 'destinations': ['B']}
+        }).get_json()
+        streams = threading.BoundedSemaphore(1)
+        client.application.extensions['location_assistant']['job_streams'] = streams
+        finished = client.get(job['stream_url'])
+        finished.get_data()
+        finished.close()
+        # The server closing a finished stream gave its slot back
+        assert streams.acquire(blocking=False)
+        response = client.get(job['stream_url'])
+        assert response.status_code == 503
+        assert response.get_json()['status_url'] == job['status_url']
+        streams.release()
+        assert client.get(job['stream_url']).status_code == 200
+
+    def test_stream_timeout_must_be_positive_and_finite(self, client):
+        job = client.post('/api/jobs', json={
+            'type': 'distance_matrix',
+            'params': {'origins': ['A'], 'destinations': ['B']}
+        }).get_json()
+        streams = threading.BoundedSemaphore(1)
+        client.application.extensions['location_assistant']['job_streams'] = streams
+        for timeout in ('nan', 'inf', '-1', '0'):
+            assert client.get(f"{job['stream_url']}?timeout={timeout}").status_code == 400
+        # Rejected streams did not take the slot
+        assert streams.acquire(blocking=False)
+
+    def test_invalid_job(self, client):
+        response = client.post('/api/jobs', json={'type': 'batch_search', 'params': {}})
+        assert response.status_code == 400
+
+    def test_unknown_job(self, client):
+        assert client.get('/api/jobs/does-not-exist').status_code == 404
+
+
+class TestAutoBackend:
+    """Test that JOBS_BACKEND=auto follows Redis availability per request"""
+
+    def test_switches_to_redis_when_it_comes_back(self):
+        flask_app = create_app({'JOBS_BACKEND': 'auto'}, maps_client=FakeMatrixClient())
+        redis = [None]
+        flask_app.extensions['location_assistant']['clients']._redis.get = lambda: redis[0]
+        params = {'type': 'distance_matrix', 'params': {'origins': ['A'], 'destinations': ['B']}}
+        with flask_app.test_client() as client:
+            local = client.post('/api/jobs', json=params).get_json()
+            redis[0] = FakeRedis()
+            shared = client.post('/api/jobs', json=params).get_json()
+            assert any(key.endswith(shared['job_id']) for key in redis[0].data)
+            assert not any(key.endswith(local['job_id']) for key in redis[0].data)
+            # Jobs created while Redis was down can still be polled here
+            assert client.get(local['status_url']).status_code == 200
+            assert client.get(shared['status_url']).get_json()['status'] == 'queued'
@@ -0,0 +1,202 @@
+"""
+Tests for the location_client package
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app import create_app
+from location_client import (AsyncLocationClient, HTTPCache, LocationAPIError, LocationClient,
+                             parse_retry_after)
+
+
+class FakeClock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class Server:
+    """MockTransport handler answering from a list of (status, headers, body)"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def __call__(self, request):
+        self.requests.append(request)
+        if not self.responses:
+            raise AssertionError('unexpected request')
+        status, headers, body = self.responses.pop(0)
+        if isinstance(status, Exception):
+            raise status
+        return httpx.Response(status, headers=headers, json=body)
+
+
+def make_client(server, **kwargs):
+    delays = []
+    client = LocationClient('http://api', transport=httpx.MockTransport(server),
+                            sleep=delays.append, **kwargs)
+    return client, delays
+
+
+class TestRetries:
+    """Test retry and backoff behavior"""
+
+    def test_honors_retry_after(self):
+        server = Server((429, {'Retry-After': '2'}, {'error': 'Rate limit exceeded'}),
+                        (200, {}, {'ok': True}))
+        client, delays = make_client(server)
+        assert client.search_places('coffee') == {'ok': True}
+        assert delays == [2.0]
+        assert json.loads(server.requests[0].content) == {'query': 'coffee'}
+
+    def test_backoff_on_gateway_errors(self):
+        server = Server((502, {}, {}), (504, {}, {}), (200, {}, {'ok': True}))
+        client, delays = make_client(server, backoff=1.0)
+        assert client.get_directions('A', 'B') == {'ok': True}
+        assert 0.5 <= delays[0] <= 1.0 and 1.0 <= delays[1] <= 2.0
+
+    def test_gives_up(self):
+        server = Server(*[(503, {'Retry-After': '1'}, {'error': 'Service overloaded'})] * 3)
+        client, delays = make_client(server, max_retries=2)
+        with pytest.raises(LocationAPIError) as exc:
+            client.health()
+        assert exc.value.status_code == 503
+        assert str(exc.value) == 'Service overloaded'
+        assert len(delays) == 2
+
+    def test_no_retry_for_client_errors(self):
+        server = Server((400, {}, {'error': "'mode' must be one of: driving"}))
+        client, delays = make_client(server)
+        with pytest.raises(LocationAPIError, match='mode'):
+            client.get_directions('A', 'B', mode='boat')
+        assert delays == []
+
+    def test_job_creation_only_retried_when_not_processed(self):
+        server = Server((503, {}, {}), (202, {}, {'id': 'job'}))
+        client, _ = make_client(server)
+        assert client.create_job('batch_search', {'searches': []}) == {'id': 'job'}
+        server = Server((httpx.ConnectError('reset'), None, None))
+        client, delays = make_client(server)
+        with pytest.raises(LocationAPIError, match='Failed to connect'):
+            client.create_job('batch_search', {'searches': []})
+        assert delays == []
+
+    def test_chat_only_retried_when_not_processed(self):
+        server = Server((429, {'Retry-After': '1'}, {}), (200, {}, {'response': 'ok'}))
+        client, _ = make_client(server)
+        assert client.chat('coffee nearby') == {'response': 'ok'}
+        server = Server((502, {}, {}))
+        client, delays = make_client(server)
+        with pytest.raises(LocationAPIError) as exc:
+            client.chat('only the open ones', session_id='s1')
+        assert exc.value.status_code == 502
+        assert delays == [] and len(server.requests) == 1
+
+    def test_parse_retry_after(self):
+        assert parse_retry_after('3') == 3.0
+        assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT', now=1445412470.0) == 10.0
+        assert parse_retry_after('soon') is None
+
+
+class TestLocalCache:
+    """Test the Cache-Control and ETag driven cache"""
+
+    def test_fresh_then_revalidated(self):
+        clock = FakeClock()
+        server = Server((200, {'Cache-Control': 'private, max-age=60', 'ETag': '"v1"'}, {'n': 1}),
+                        (304, {'Cache-Control': 'private, max-age=60', 'ETag': '"v1"'}, None))
+        client, _ = make_client(server, cache=HTTPCache(clock=clock))
+        assert client.search_places('coffee') == {'n': 1}
+        assert client.search_places('coffee') == {'n': 1}
+        assert len(server.requests) == 1
+        clock.now += 61
+        assert client.search_places('coffee') == {'n': 1}
+        assert server.requests[1].headers['If-None-Match'] == '"v1"'
+        assert client.cache.stats() == {'entries': 1, 'hits': 1, 'revalidated': 1}
+
+    def test_no_store_and_other_payloads(self):
+        server = Server((200, {'Cache-Control': 'no-store'}, {'n': 1}),
+                        (200, {'Cache-Control': 'max-age=60'}, {'n': 2}),
+                        (200, {'Cache-Control': 'max-age=60'}, {'n': 3}))
+        client, _ = make_client(server)
+        assert client.search_places('coffee') == {'n': 1}
+        assert client.search_places('coffee') == {'n': 2}
+        assert client.search_places('tea') == {'n': 3}
+        assert client.search_places('coffee') == {'n': 2}
+
+    def test_against_the_api(self):
+        class Maps:
+            calls = 0
+
+            def geocode(self, address=None):
+                return [{'geometry': {'location': {'lat': 40.0, 'lng': -74.0}}}]
+
+            def places_nearby(self, **kwargs):
+                Maps.calls += 1
+                return {'results': [{'name': 'Cafe', 'place_id': 'cafe',
+                                     'geometry': {'location': {'lat': 40.0, 'lng': -74.0}}}]}
+
+        flask_app = create_app({'WARMING_ENABLED': False}, maps_client=Maps())
+        client = LocationClient('http://api', transport=httpx.WSGITransport(app=flask_app))
+        first = client.search_places('coffee', location='Here')
+        second = client.search_places('coffee', location='Here')
+        assert first == second
+        assert first['places_data']['places'][0]['name'] == 'Cafe'
+        assert client.cache.stats()['hits'] == 1
+        with pytest.raises(LocationAPIError) as exc:
+            client.search_places('coffee', radius=10 ** 6)
+        assert exc.value.status_code == 400
+
+
+class TestBatches:
+    """Test concurrent batch helpers"""
+
+    @staticmethod
+    def handler(request):
+        query = json.loads(request.content)['query']
+        if query == 'bad':
+            return httpx.Response(400, json={'error': 'bad query'})
+        return httpx.Response(200, json={'query': query})
+
+    def test_search_many(self):
+        client = LocationClient('http://api', transport=httpx.MockTransport(self.handler))
+        queries = [f"q{i}" for i in range(20)]
+        results = client.search_many([{'query': q} for q in queries], concurrency=4)
+        assert [r['query'] for r in results] == queries
+        with pytest.raises(LocationAPIError):
+            client.search_many([{'query': 'a'}, {'query': 'bad'}])
+        results = client.search_many([{'query': 'a'}, {'query': 'bad'}], return_exceptions=True)
+        assert results[0] == {'query': 'a'} and isinstance(results[1], LocationAPIError)
+
+    def test_async_client(self):
+        delays = []
+
+        async def sleep(delay):
+            delays.append(delay)
+
+        responses = iter([httpx.Response(429, headers={'Retry-After': '1'}, json={})])
+
+        def handler(request):
+            response = next(responses, None)
+            return response if response is not None else self.handler(request)
+
+        async def main():
+            async with AsyncLocationClient('http://api', transport=httpx.MockTransport(handler),
+                                           sleep=sleep) as client:
+                single = await client.search_places('coffee')
+                batch = await client.search_many([{'query': 'a'}, {'query': 'bad'}, {'query': 'b'}],
+                                                 return_exceptions=True)
+                return single, batch
+
+        single, batch = asyncio.run(main())
+        assert single == {'query': 'coffee'}
+        assert delays == [1.0]
+        assert batch[0] == {'query': 'a'} and batch[2] == {'query': 'b'}
+        assert batch[1].status_code == 400
@@ -0,0 +1,106 @@
+"""
+Tests for distance-aware ranking of place results
+"""
+
+import numpy as np
+import pytest
+
+from app import LocationService
+from ranking import haversine_m, rank_places
+
+CENTER = {'lat': 40.7128, 'lng': -74.0060}
+
+
+def place(place_id, lat_offset, rating=None, price=None, open_now=None):
+    return {
+        'name': place_id,
+        'place_id': place_id,
+        'rating': rating,
+        'price_level': price,
+        'opening_hours': open_now,
+        'location': {'lat': CENTER['lat'] + lat_offset, 'lng': CENTER['lng']},
+    }
+
+
+class TestHaversine:
+    """Test vectorized distance computation"""
+
+    def test_known_distance(self):
+        # New York to Boston is about 306 km
+        distance = haversine_m(np.array([42.3601]), np.array([-71.0589]), CENTER['lat'], CENTER['lng'])
+        assert distance[0] == pytest.approx(306_000, rel=0.01)
+
+    def test_one_degree_latitude(self):
+        distance = haversine_m(np.array([1.0, 0.0]), np.array([0.0, 0.0]), 0.0, 0.0)
+        assert distance[0] == pytest.approx(111_195, rel=0.001)
+        assert distance[1] == 0
+
+
+class TestRankPlaces:
+    """Test scoring, filtering and truncation"""
+
+    def test_closer_place_wins_at_equal_rating(self):
+        places = [place('far', 0.04, rating=4.5), place('near', 0.001, rating=4.5)]
+        ranked = rank_places(places, center=CENTER, distance_scale=5000)
+        assert [p['place_id'] for p in ranked] == ['near', 'far']
+        assert ranked[0]['distance_m'] == pytest.approx(111, abs=2)
+
+    def test_ranks_full_set_before_truncating(self):
+        places = [place(f"p{i}", 0.001 * i, rating=3.0) for i in range(1, 20)]
+        places.append(place('best', 0.0005, rating=5.0, open_now=True))
+        ranked = rank_places(places, center=CENTER, limit=10)
+        assert len(ranked) == 10
+        assert ranked[0]['place_id'] == 'best'
+
+    def test_filters(self):
+        places = [
+            place('low', 0.001, rating=3.0, open_now=True),
+            place('closed', 0.001, rating=4.8, open_now=False),
+            place('far', 0.05, rating=4.8, open_now=True),
+            place('ok', 0.002, rating=4.6, open_now=True),
+        ]
+        ranked = rank_places(places, center=CENTER, min_rating=4.0, open_now=True, max_distance=1000)
+        assert [p['place_id'] for p in ranked] == ['ok']
+
+    def test_without_center_ignores_distance(self):
+        places = [place('a', 0.0, rating=3.0), place('b', 0.05, rating=4.9)]
+        ranked = rank_places(places)
+        assert [p['place_id'] for p in ranked] == ['b', 'a']
+        assert ranked[0]['distance_m'] is None
+
+    def test_scales_to_hundreds_of_candidates(self):
+        rng = np.random.default_rng(0)
+        places = [place(f"p{i}", float(offset), rating=float(r))
+                  for i, (offset, r) in enumerate(zip(rng.uniform(0, 0.05, 500), rng.uniform(1, 5, 500)))]
+        ranked = rank_places(places, center=CENTER, limit=10)
+        scores = [p['score'] for p in ranked]
+        assert scores == sorted(scores, reverse=True)
+
+
+class TestSearchRanking:
+    """Test ranking inside LocationService.search_places"""
+
+    class FakeMapsClient:
+        def geocode(self, address=None):
+            return [{'geometry': {'location': CENTER}}]
+
+        def places_nearby(self, **kwargs):
+            results = [{'name': f"p{i}", 'place_id': f"p{i}", 'rating': 3.5,
+                        'geometry': {'location': {'lat': CENTER['lat'] + 0.002 * i, 'lng': CENTER['lng']}}}
+                       for i in range(1, 20)]
+            results.append({'name': 'closest', 'place_id': 'closest', 'rating': 4.9,
+                            'opening_hours': {'open_now': True},
+                            'geometry': {'location': CENTER}})
+            return {'results': results}
+
+    def test_best_candidate_beyond_upstream_top_10_is_returned(self):
+        service = LocationService(self.FakeMapsClient())
+        results = service.search_places('coffee', location='New York', radius=5000)
+        assert results['candidates_count'] == 20
+        assert results['results_count'] == 10
+        assert results['places'][0]['place_id'] == 'closest'
+
+    def test_server_side_filters(self):
+        service = LocationService(self.FakeMapsClient())
+        results = service.search_places('coffee', location='New York', open_now=True)
+        assert [p['place_id'] for p in results['places']] == ['closest']
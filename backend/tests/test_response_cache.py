@@ -0,0 +1,114 @@
+"""
+Tests for the encoded response cache
+"""
+
+import gzip
+import json
+
+import pytest
+
+import app as app_module
+from app import create_app
+
+CENTER = {'lat': 40.7128, 'lng': -74.0060}
+
+
+class FakeMapsClient:
+    def __init__(self):
+        self.calls = 0
+
+    def geocode(self, address=None):
+        self.calls += 1
+        if address == 'nowhere':
+            return []
+        return [{'geometry': {'location': CENTER}}]
+
+    def places_nearby(self, **kwargs):
+        self.calls += 1
+        return {'results': [
+            {'name': f"Cafe {i}", 'place_id': f"p{i}", 'rating': 4.0,
+             'vicinity': 'Somewhere long enough to make the body worth compressing ' * 2,
+             'geometry': {'location': {'lat': CENTER['lat'] + 0.001 * i, 'lng': CENTER['lng']}}}
+            for i in range(10)
+        ]}
+
+
+@pytest.fixture
+def setup():
+    gmaps = FakeMapsClient()
+    # Upstream cache off, so every miss reaches the fake client
+    flask_app = create_app({'CACHE_ENABLED': False}, maps_client=gmaps)
+    flask_app.config['TESTING'] = True
+    with flask_app.test_client() as client:
+        yield client, gmaps, flask_app
+
+
+def search(client, payload=None, **headers):
+    return client.post('/api/search', json=payload or {'query': 'coffee', 'location': 'New York'},
+                       headers=headers)
+
+
+class TestResponseCache:
+    """Test hits, validation and compression"""
+
+    def test_hit_skips_handler(self, setup, monkeypatch):
+        client, gmaps, _ = setup
+        first = search(client)
+        assert first.headers['X-Cache'] == 'MISS'
+        calls = gmaps.calls
+
+        def fail(*args):
+            raise AssertionError('handler ran on a cache hit')
+        monkeypatch.setattr(app_module.llm_generator, 'generate_response', fail)
+        second = search(client, {'location': 'New  York ', 'query': 'coffee'})
+        assert second.headers['X-Cache'] == 'HIT'
+        assert second.data == first.data
+        assert gmaps.calls == calls
+
+    def test_etag_revalidation(self, setup):
+        client, _, _ = setup
+        etag = search(client).headers['ETag']
+        response = search(client, **{'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+        assert search(client, **{'If-None-Match': '"other"'}).status_code == 200
+
+    def test_gzip_when_accepted(self, setup):
+        client, _, _ = setup
+        plain = search(client)
+        assert 'Content-Encoding' not in plain.headers
+        compressed = search(client, **{'Accept-Encoding': 'gzip'})
+        assert compressed.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(compressed.data) == plain.data
+
+    def test_failures_are_not_cached(self, setup):
+        client, gmaps, _ = setup
+        payload = {'query': 'coffee', 'location': 'nowhere'}
+        search(client, payload)
+        response = search(client, payload)
+        assert 'X-Cache' not in response.headers or response.headers['X-Cache'] == 'MISS'
+        assert gmaps.calls == 2
+
+    def test_stale_copy_served_when_shedding(self, setup, monkeypatch):
+        client, gmaps, flask_app = setup
+        state = flask_app.extensions['location_assistant']
+        fresh = search(client)
+        cache = state['response_cache']
+        monkeypatch.setattr(cache, 'clock', lambda: 1e12)
+        monkeypatch.setattr(cache.entries, 'clock', lambda: 0)
+        monkeypatch.setattr(state['admission'], 'should_shed', lambda delay: True)
+        response = search(client)
+        assert response.status_code == 200
+        assert response.headers['X-Cache'] == 'STALE'
+        assert response.data == fresh.data
+        other = search(client, {'query': 'tea', 'location': 'New York'})
+        assert other.status_code == 503
+        assert state['admission'].served_stale == 1
+
+    def test_stats_in_health(self, setup):
+        client, _, _ = setup
+        search(client)
+        search(client)
+        stats = json.loads(client.get('/api/health').data)['response_cache']
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
@@ -0,0 +1,112 @@
+"""
+Tests for the shared-memory cache tier
+"""
+
+import json
+import multiprocessing
+import os
+
+import pytest
+
+from cache import TieredCache
+from shm_cache import HEADER_SIZE, SEQUENCE, SLOT, SharedMemoryCache
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'cache')
+
+
+def _child_write(path):
+    SharedMemoryCache(path, slots=64, slot_size=1024).set_bytes('from-child', b'"hello"', 60)
+
+
+class TestSharedMemoryCache:
+    """Test the slot table, eviction and read validation"""
+
+    def test_round_trip(self, path):
+        cache = SharedMemoryCache(path, slots=64, slot_size=1024)
+        assert cache.get_bytes('k') is None
+        assert cache.set_bytes('k', b'{"a":1}', 60)
+        value, _ = cache.get_bytes('k')
+        assert value == b'{"a":1}'
+        cache.set_bytes('k', b'{"a":2}', 60)
+        assert cache.get_bytes('k')[0] == b'{"a":2}'
+        cache.delete('k')
+        assert cache.get_bytes('k') is None
+
+    def test_expired_entries_miss(self, path):
+        cache = SharedMemoryCache(path, slots=64, slot_size=1024)
+        cache.set_bytes('k', b'1', -1)
+        assert cache.get_bytes('k') is None
+
+    def test_oversize_values_are_skipped(self, path):
+        cache = SharedMemoryCache(path, slots=64, slot_size=256)
+        assert not cache.set_bytes('k', b'x' * 300, 60)
+        assert cache.oversize == 1
+
+    def test_oversize_value_drops_the_old_one(self, path):
+        cache = SharedMemoryCache(path, slots=64, slot_size=256)
+        assert cache.set_bytes('k', b'"old"', 60)
+        assert not cache.set_bytes('k', b'x' * 300, 60)
+        assert cache.get_bytes('k') is None
+
+    def test_full_set_evicts_entry_expiring_first(self, path):
+        cache = SharedMemoryCache(path, slots=4, slot_size=256, ways=4)
+        for i in range(4):
+            cache.set_bytes(f"k{i}", b'1', 100 + i)
+        cache.set_bytes('new', b'1', 100)
+        assert cache.get_bytes('k0') is None
+        assert all(cache.get_bytes(f"k{i}") for i in range(1, 4))
+        assert cache.get_bytes('new')
+        assert cache.stats()['slots_used'] == 4
+
+    def test_shared_between_processes(self, path):
+        cache = SharedMemoryCache(path, slots=64, slot_size=1024)
+        cache.set_bytes('warm', b'1', 60)
+        child = multiprocessing.get_context('fork').Process(target=_child_write, args=(path,))
+        child.start()
+        child.join()
+        assert cache.get_bytes('from-child')[0] == b'"hello"'
+
+    def test_torn_or_in_progress_writes_miss(self, path):
+        cache = SharedMemoryCache(path, slots=4, slot_size=256, ways=4)
+        cache.set_bytes('k', b'value', 60)
+        mm = cache._map
+        offset = next(HEADER_SIZE + i * 256 for i in range(4)
+                      if SLOT.unpack_from(mm, HEADER_SIZE + i * 256)[1])
+        seq = SEQUENCE.unpack_from(mm, offset)[0]
+        SEQUENCE.pack_into(mm, offset, seq + 1)
+        assert cache.get_bytes('k') is None
+        SEQUENCE.pack_into(mm, offset, seq)
+        mm[offset + SLOT.size + 1] ^= 0xFF
+        assert cache.get_bytes('k') is None
+
+    def test_layout_change_resets_file(self, path):
+        SharedMemoryCache(path, slots=64, slot_size=1024).set_bytes('k', b'1', 60)
+        resized = SharedMemoryCache(path, slots=128, slot_size=1024)
+        assert resized.get_bytes('k') is None
+        assert os.path.getsize(path) == resized.size
+
+
+class TestTieredWithSharedMemory:
+    """Test the shared tier inside TieredCache"""
+
+    def test_workers_share_entries(self, path):
+        first = TieredCache(shared=SharedMemoryCache(path))
+        second = TieredCache(shared=SharedMemoryCache(path))
+        first.set('maps:k', {'results': [1]}, ttl=60)
+        assert second.get('maps:k') == {'results': [1]}
+        assert len(second.memory) == 1
+
+    def test_redis_hits_fill_shared_tier(self, path):
+        class FakeRedis:
+            def get(self, key):
+                return json.dumps({'from': 'redis'}).encode()
+
+            def ttl(self, key):
+                return 60
+
+        shared = SharedMemoryCache(path)
+        TieredCache(shared=shared, redis_provider=FakeRedis).get('k')
+        assert json.loads(shared.get_bytes('k')[0]) == {'from': 'redis'}
@@ -0,0 +1,128 @@
+"""
+Tests for the structured logging pipeline
+"""
+
+import json
+import logging
+import queue
+
+from flask import Flask
+
+from structured_logging import (JsonFormatter, NonBlockingQueueHandler, RepeatFilter,
+                                RequestLogging, SamplingFilter, parse_rates, stage)
+
+
+def make_record(msg='Error searching places: %s', args=('boom',), level=logging.ERROR, **extra):
+    record = logging.LogRecord('app', level, __file__, 1, msg, args, None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestJsonFormatter:
+    """Test JSON output"""
+
+    def test_includes_extra_fields_and_exception(self):
+        try:
+            raise TimeoutError('upstream timed out')
+        except TimeoutError as e:
+            record = logging.LogRecord('app', logging.ERROR, __file__, 1, 'failed: %s', (e,),
+                                       (type(e), e, e.__traceback__))
+        record.request_id = 'abc'
+        entry = json.loads(JsonFormatter().format(record))
+        assert entry['message'] == 'failed: upstream timed out'
+        assert entry['request_id'] == 'abc'
+        assert 'TimeoutError' in entry['exception']
+
+
+class TestSamplingFilter:
+    """Test per-route and per-error-class sampling"""
+
+    def test_parse_rates(self):
+        assert parse_rates('api.search_places:0.1, Timeout:0,bad') == {
+            'api.search_places': 0.1, 'Timeout': 0.0
+        }
+
+    def test_error_class_rate(self):
+        sampler = SamplingFilter(error_rates={'Timeout': 0.0})
+        assert not sampler.filter(make_record(error_class='Timeout'))
+        assert sampler.filter(make_record(error_class='ApiError'))
+
+    def test_route_rate(self):
+        sampler = SamplingFilter(route_rates={'api.health_check': 0.0})
+        assert not sampler.filter(make_record(level=logging.INFO, route='api.health_check'))
+        assert sampler.filter(make_record(level=logging.INFO, route='api.search_places'))
+
+    def test_critical_always_kept(self):
+        sampler = SamplingFilter(default_rate=0.0)
+        assert sampler.filter(make_record(level=logging.CRITICAL))
+
+
+class TestRepeatFilter:
+    """Test rate limiting of repeated errors"""
+
+    def test_suppresses_repeats_and_reports_count(self):
+        clock = FakeClock()
+        repeat = RepeatFilter(burst=2, window=10, clock=clock)
+        passed = [repeat.filter(make_record(args=(i,))) for i in range(5)]
+        assert passed == [True, True, False, False, False]
+
+        clock.now = 11
+        record = make_record()
+        assert repeat.filter(record)
+        assert record.suppressed_repeats == 3
+
+    def test_info_records_not_limited(self):
+        repeat = RepeatFilter(burst=1)
+        assert all(repeat.filter(make_record(level=logging.INFO)) for _ in range(5))
+
+
+class TestNonBlockingQueueHandler:
+    """Test the request-path side of the pipeline"""
+
+    def test_drops_when_full_and_reports_drops(self):
+        handler = NonBlockingQueueHandler(queue.Queue(1))
+        for _ in range(3):
+            handler.handle(make_record())
+        assert handler.dropped == 2
+        handler.queue.get_nowait()
+        handler.handle(make_record())
+        assert handler.queue.get_nowait().dropped_records == 2
+
+    def test_renders_message_only(self):
+        handler = NonBlockingQueueHandler(queue.Queue())
+        handler.handle(make_record())
+        record = handler.queue.get_nowait()
+        assert record.msg == 'Error searching places: boom'
+        assert record.args is None
+
+
+class TestRequestLogging:
+    """Test request IDs and stage timings"""
+
+    def test_request_id_and_stages(self, caplog):
+        flask_app = Flask(__name__)
+        request_logging = RequestLogging()
+        request_logging.init_app(flask_app)
+
+        @flask_app.route('/api/test')
+        def view():
+            with stage('work'):
+                request_logging.on_upstream_call('geocode', {}, None, None, 0.05)
+            return 'ok'
+
+        with caplog.at_level(logging.INFO, logger='access'):
+            response = flask_app.test_client().get('/api/test', headers={'X-Request-ID': 'req-1'})
+        assert response.headers['X-Request-ID'] == 'req-1'
+        record = [r for r in caplog.records if r.name == 'access'][-1]
+        assert record.status == 200
+        assert set(record.stages) == {'work', 'upstream.geocode'}
+        assert record.stages['upstream.geocode'] == 50.0
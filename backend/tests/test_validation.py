@@ -0,0 +1,153 @@
+"""
+Tests for request validation and negative caching
+"""
+
+import pytest
+
+from app import LocationService, create_app
+from cache import MemoryCache, TieredCache, cache_key
+from jobs import JobError, validate_job
+from validation import (MAX_MESSAGE_LENGTH, ValidationError, validate_chat, validate_directions,
+                        validate_search)
+from warming import WarmingRun, current_run
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class EmptyMapsClient:
+    """Finds nothing, and counts how often it was asked"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def geocode(self, address=None):
+        self.calls += 1
+        return []
+
+    def places_nearby(self, **kwargs):
+        self.calls += 1
+        return {'results': [], 'status': 'ZERO_RESULTS'}
+
+    def directions(self, **kwargs):
+        self.calls += 1
+        return []
+
+
+class TestValidators:
+    """Test the individual checks"""
+
+    @pytest.mark.parametrize('data', [
+        {'query': ''},
+        {'query': 42},
+        {'query': 'x' * 201},
+        {'query': 'coffee', 'location': ['Boston']},
+        {'query': 'coffee', 'radius': 0},
+        {'query': 'coffee', 'radius': 60000},
+        {'query': 'coffee', 'radius': '500'},
+        {'query': 'coffee', 'type': 'coffee_shop'},
+        {'query': 'coffee', 'type': ['cafe']},
+        {'query': 'coffee', 'type': {'type': ['a']}},
+    ])
+    def test_invalid_search(self, data):
+        with pytest.raises(ValidationError):
+            validate_search(data)
+
+    def test_valid_search(self):
+        validate_search({'query': 'coffee', 'location': 'Boston', 'radius': 1500.5, 'type': 'cafe'})
+
+    def test_mode(self):
+        validate_directions({'origin': 'A', 'destination': 'B', 'mode': 'walking'})
+        with pytest.raises(ValidationError, match='mode'):
+            validate_directions({'origin': 'A', 'destination': 'B', 'mode': 'teleport'})
+        for mode in (['walking'], {'mode': 'walking'}):
+            with pytest.raises(ValidationError, match='mode'):
+                validate_directions({'origin': 'A', 'destination': 'B', 'mode': mode})
+
+    def test_chat(self):
+        with pytest.raises(ValidationError):
+            validate_chat({'message': 'x' * (MAX_MESSAGE_LENGTH + 1)})
+        with pytest.raises(ValidationError):
+            validate_chat({'message': 'find bars', 'context': {'radius': -5}})
+
+    def test_job_entries(self):
+        with pytest.raises(JobError, match='Entry 1'):
+            validate_job('batch_search', {'searches': [{'query': 'coffee'}, {'query': 'tea', 'type': 'teahouse'}]})
+        with pytest.raises(JobError, match='mode'):
+            validate_job('distance_matrix', {'origins': ['A'], 'destinations': ['B'], 'mode': 'boat'})
+        with pytest.raises(JobError, match='Entry 0'):
+            validate_job('batch_search', {'searches': [{'query': 'tea', 'type': {'type': ['a']}}]})
+        with pytest.raises(JobError, match='Unknown job type'):
+            validate_job(['batch_search'], {})
+
+
+class TestEndpointValidation:
+    """Test that invalid requests are rejected before any upstream call"""
+
+    @pytest.mark.parametrize('path, payload', [
+        ('/api/search', {'query': 'coffee', 'radius': 100000}),
+        ('/api/directions', {'origin': 'A', 'destination': 'B', 'mode': 'flying'}),
+        ('/api/search/along-route', {'query': 'coffee', 'origin': 'A', 'destination': 'B', 'type': 'x'}),
+        ('/api/reachable', {'origin': 'x' * 500, 'minutes': 10}),
+        ('/api/llm-chat', {'message': 42}),
+        ('/api/search', {'query': 'coffee', 'type': {'type': ['a']}}),
+        ('/api/search', {'query': 'coffee', 'type': ['cafe']}),
+        ('/api/directions', {'origin': 'A', 'destination': 'B', 'mode': ['walking']}),
+        ('/api/llm-chat', {'message': 'find bars', 'context': {'type': {'type': ['a']}}}),
+        ('/api/llm-chat', {'message': 'find bars', 'context': {'type': ['bar']}}),
+        ('/api/jobs', {'type': 'batch_search', 'params': {'searches': [{'query': 'a', 'type': ['bar']}]}}),
+        ('/api/jobs', {'type': {'batch': 1}, 'params': {}}),
+    ])
+    def test_rejected(self, path, payload):
+        gmaps = EmptyMapsClient()
+        flask_app = create_app(maps_client=gmaps)
+        flask_app.config['TESTING'] = True
+        with flask_app.test_client() as client:
+            response = client.post(path, json=payload)
+        assert response.status_code == 400
+        assert response.get_json()['error']
+        assert gmaps.calls == 0
+
+
+class TestNegativeCaching:
+    """Test that empty upstream results are cached briefly"""
+
+    def test_unknown_location(self):
+        clock = FakeClock()
+        gmaps = EmptyMapsClient()
+        service = LocationService(gmaps, cache=TieredCache(memory=MemoryCache(clock=clock)))
+        service.cache_ttls['negative'] = 60
+        for _ in range(3):
+            result = service.search_places('coffee', 'Nowhere at all')
+            assert not result['success']
+            assert 'Could not find location' in result['error']
+        assert gmaps.calls == 1
+        clock.now += 61
+        service.search_places('coffee', 'Nowhere at all')
+        assert gmaps.calls == 2
+
+    def test_no_places_and_no_route(self):
+        gmaps = EmptyMapsClient()
+        service = LocationService(gmaps, cache=TieredCache())
+        for _ in range(2):
+            assert service.search_places('coffee', center={'lat': 1.0, 'lng': 2.0})['results_count'] == 0
+            assert service.get_directions('A', 'B')['error'] == 'No directions found'
+        assert gmaps.calls == 2
+
+    def test_warming_keeps_negative_ttl(self):
+        clock = FakeClock()
+        gmaps = EmptyMapsClient()
+        cache = TieredCache(memory=MemoryCache(clock=clock))
+        service = LocationService(gmaps, cache=cache)
+        service.cache_ttls['negative'] = 60
+        token = current_run.set(WarmingRun(budget=10))
+        try:
+            service.search_places('coffee', 'Nowhere at all')
+        finally:
+            current_run.reset(token)
+        assert cache.expires_in(cache_key('geocode', {'address': 'Nowhere at all'})) <= 60
@@ -0,0 +1,237 @@
+"""
+Tests for popular-query cache warming
+"""
+
+import os
+import threading
+import time
+
+from app import LocationService, create_app, start_warming
+from cache import MemoryCache, TieredCache
+from warming import CacheWarmer, QueryHistory, WarmingRun, current_run, load_snapshot
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeMapsClient:
+    """Counts upstream calls"""
+
+    def __init__(self):
+        self.calls = []
+
+    def geocode(self, address=None):
+        self.calls.append(('geocode', address))
+        return [{'geometry': {'location': {'lat': 40.0, 'lng': -74.0}}}]
+
+    def places_nearby(self, **kwargs):
+        self.calls.append(('places_nearby', kwargs['keyword']))
+        return {'results': [{'name': 'Cafe', 'place_id': 'cafe', 'rating': 4.5,
+                             'geometry': {'location': {'lat': 40.001, 'lng': -74.0}}}]}
+
+    def directions(self, **kwargs):
+        self.calls.append(('directions', kwargs['origin']))
+        return []
+
+
+class TestQueryHistory:
+    """Test popularity by frequency and recency"""
+
+    def test_frequency(self):
+        history = QueryHistory(clock=FakeClock())
+        for _ in range(3):
+            history.record('search', {'query': 'coffee'})
+        history.record('search', {'query': 'bars'})
+        assert [params['query'] for _, params, _ in history.top(10)] == ['coffee', 'bars']
+        assert history.top(1)[0][2] == 3
+
+    def test_recency(self):
+        clock = FakeClock()
+        history = QueryHistory(clock=clock, half_life=3600)
+        for _ in range(3):
+            history.record('search', {'query': 'old'})
+        clock.now += 3 * 3600
+        history.record('search', {'query': 'new'})
+        assert [params['query'] for _, params, _ in history.top(10)] == ['new', 'old']
+
+    def test_forgets_old_buckets(self):
+        clock = FakeClock()
+        history = QueryHistory(clock=clock, buckets=2)
+        history.record('search', {'query': 'old'})
+        clock.now += 3 * 3600
+        assert history.top(10) == []
+
+
+class TestWarmingRun:
+    """Test refreshing entries through LocationService"""
+
+    def test_refreshes_only_expiring_entries(self):
+        clock = FakeClock()
+        gmaps = FakeMapsClient()
+        cache = TieredCache(memory=MemoryCache(clock=clock))
+        service = LocationService(gmaps, cache=cache)
+        service.cache_ttls['geocode'] = 1000
+        service.cache_ttls['places_nearby'] = 100
+        service.search_places('coffee', 'Here')
+        assert len(gmaps.calls) == 2
+
+        clock.now += 80
+        warming = WarmingRun(budget=10)
+        token = current_run.set(warming)
+        try:
+            service.search_places('coffee', 'Here')
+        finally:
+            current_run.reset(token)
+        # Only the places entry was in the last quarter of its TTL
+        assert gmaps.calls[2:] == [('places_nearby', 'coffee')]
+        assert warming.calls == 1
+        assert len(warming.entries) == 2
+        clock.now += 80
+        service.search_places('coffee', 'Here')
+        assert len(gmaps.calls) == 3
+
+
+class TestCacheWarmer:
+    """Test warming passes and snapshots"""
+
+    def make_warmer(self, gmaps, cache, **kwargs):
+        service = LocationService(gmaps, cache=cache)
+        history = QueryHistory()
+        return CacheWarmer(history, lambda: service, cache, **kwargs)
+
+    def test_pass_within_budget(self):
+        gmaps = FakeMapsClient()
+        warmer = self.make_warmer(gmaps, TieredCache(), budget=3)
+        for query in ('coffee', 'bars', 'tea'):
+            warmer.history.record('search', {'query': query, 'location': 'Here'})
+        warmer.history.record('directions', {'origin': 'A', 'destination': 'B'})
+        summary = warmer.run_once()
+        # The first search costs two calls, the second would not fit
+        assert summary['queries'] == 1
+        assert summary['upstream_calls'] == 2
+        assert len(gmaps.calls) == 2
+
+        warmer.budget = 10
+        summary = warmer.run_once()
+        assert summary['queries'] == 4
+        # The geocode is shared and everything warmed before is still fresh
+        assert summary['upstream_calls'] == 3
+
+    def test_waits_for_user_requests(self):
+        class Busy:
+            in_flight = 1
+
+        gmaps = FakeMapsClient()
+        warmer = self.make_warmer(gmaps, TieredCache(), admission=Busy(), idle_timeout=0.1)
+        warmer.history.record('search', {'query': 'coffee', 'location': 'Here'})
+        assert warmer.run_once()['queries'] == 0
+        assert gmaps.calls == []
+
+    def test_snapshot_warms_new_cache(self, tmp_path):
+        path = str(tmp_path / 'snapshot.json')
+        gmaps = FakeMapsClient()
+        warmer = self.make_warmer(gmaps, TieredCache(), snapshot_path=path)
+        warmer.history.record('search', {'query': 'coffee', 'location': 'Here'})
+        warmer.run_once()
+        assert os.path.exists(path)
+
+        fresh_gmaps = FakeMapsClient()
+        cache = TieredCache()
+        history = QueryHistory()
+        assert load_snapshot(path, cache, history) == 2
+        assert history.top(1)[0][1]['query'] == 'coffee'
+        results = LocationService(fresh_gmaps, cache=cache).search_places('coffee', 'Here')
+        assert results['success']
+        assert fresh_gmaps.calls == []
+
+    def test_snapshot_loads_in_background(self, tmp_path):
+        path = str(tmp_path / 'snapshot.json')
+        warmer = self.make_warmer(FakeMapsClient(), TieredCache(), snapshot_path=path)
+        warmer.history.record('search', {'query': 'coffee', 'location': 'Here'})
+        warmer.run_once()
+
+        cache = TieredCache()
+        warmer = self.make_warmer(FakeMapsClient(), cache, snapshot_path=path, interval=60)
+        release = threading.Event()
+        load = warmer.load_snapshot
+
+        def slow_load():
+            release.wait(5)
+            load()
+
+        warmer.load_snapshot = slow_load
+        warmer.start()
+        # The request that started the warmer does not wait for the snapshot
+        assert warmer.snapshot_entries_loaded == 0
+        release.set()
+        deadline = time.time() + 5
+        while warmer.snapshot_entries_loaded == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        warmer.stop(timeout=1)
+        assert warmer.snapshot_entries_loaded == 2
+
+    def test_one_worker_per_lock_file(self, tmp_path):
+        lock_path = str(tmp_path / 'warming.lock')
+        first = self.make_warmer(FakeMapsClient(), TieredCache(), lock_path=lock_path)
+        second = self.make_warmer(FakeMapsClient(), TieredCache(), lock_path=lock_path)
+        assert first.run_once() is not None
+        assert second.run_once() is None
+        # The lock is released when the elected worker exits
+        first._lock_file.close()
+        assert second.run_once() is not None
+
+    def test_endpoints_record_history(self):
+        flask_app = create_app({'RESPONSE_CACHE_ENABLED': False}, maps_client=FakeMapsClient())
+        flask_app.config['TESTING'] = True
+        with flask_app.test_client() as client:
+            client.post('/api/search', json={'query': 'coffee', 'location': 'Here'})
+            client.post('/api/directions', json={'origin': 'A', 'destination': 'B'})
+            health = client.get('/api/health').get_json()
+        history = flask_app.extensions['location_assistant']['query_history']
+        # Directions without a route are not worth warming
+        assert [kind for kind, _, _ in history.top(10)] == ['search']
+        assert health['warming']['started']
+        flask_app.extensions['location_assistant']['warmer'].stop(timeout=1)
+
+    def test_response_cache_hits_count(self):
+        flask_app = create_app(maps_client=FakeMapsClient())
+        flask_app.config['TESTING'] = True
+        with flask_app.test_client() as client:
+            responses = [client.post('/api/search', json={'query': 'coffee', 'location': 'Here'})
+                         for _ in range(10)]
+        assert [r.headers['X-Cache'] for r in responses] == ['MISS'] + ['HIT'] * 9
+        history = flask_app.extensions['location_assistant']['query_history']
+        [(kind, params, score)] = history.top(10)
+        assert (kind, params['query'], score) == ('search', 'coffee', 10.0)
+        flask_app.extensions['location_assistant']['warmer'].stop(timeout=1)
+
+    def test_first_pass_runs_on_start(self, tmp_path):
+        path = str(tmp_path / 'snapshot.json')
+        warmer = self.make_warmer(FakeMapsClient(), TieredCache(), snapshot_path=path)
+        warmer.history.record('search', {'query': 'coffee', 'location': 'Here'})
+        warmer.run_once()
+
+        gmaps = FakeMapsClient()
+        warmer = self.make_warmer(gmaps, TieredCache(), snapshot_path=path, interval=60)
+        warmer.start()
+        deadline = time.time() + 5
+        while warmer.passes == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        warmer.stop(timeout=1)
+        assert warmer.snapshot_entries_loaded == 2
+        # Not a whole interval later; the snapshot left nothing to reload
+        assert warmer.passes == 1
+        assert warmer.last_pass['queries'] == 1
+        assert gmaps.calls == []
+
+    def test_starts_without_a_request(self):
+        flask_app = create_app(maps_client=FakeMapsClient())
+        start_warming(flask_app)
+        warmer = flask_app.extensions['location_assistant']['warmer']
+        assert warmer.started
+        warmer.stop(timeout=1)
@@ -0,0 +1,78 @@
+"""
+Instrumented wrapper around the Google Maps client
+
+Every call LocationService makes to Google goes through MapsClientProxy, which
+times the call and hands the exchange to any registered observers (traffic
+capture, latency tracking, ...).
+"""
+
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Client methods that hit the network and are worth observing
+UPSTREAM_METHODS = frozenset({
+    'geocode',
+    'places',
+    'places_nearby',
+    'directions',
+    'distance_matrix',
+})
+
+
+class MapsClientProxy:
+    """Forward calls to a Google Maps client and notify observers of each call
+
+    Observers are objects with an ``on_upstream_call(method, params, response,
+    error, elapsed)`` method. They are called after the upstream call returns
+    (or raises) and must not raise themselves; failures are logged and ignored
+    so that instrumentation never breaks a request.
+    """
+
+    def __init__(self, client, observers: Optional[List[Any]] = None):
+        self._client = client
+        self.observers: List[Any] = list(observers or [])
+
+    @property
+    def client(self):
+        """The wrapped Google Maps client"""
+        return self._client
+
+    def add_observer(self, observer) -> None:
+        if observer not in self.observers:
+            self.observers.append(observer)
+
+    def remove_observer(self, observer) -> None:
+        if observer in self.observers:
+            self.observers.remove(observer)
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._client, name)
+        if name not in UPSTREAM_METHODS:
+            return attr
+        return self._wrap(name, attr)
+
+    def _wrap(self, name: str, method: Callable) -> Callable:
+        def call(*args, **kwargs):
+            params: Dict[str, Any] = dict(kwargs)
+            if args:
+                params['_args'] = list(args)
+            start = time.perf_counter()
+            try:
+                response = method(*args, **kwargs)
+            except Exception as e:
+                self._notify(name, params, None, e, time.perf_counter() - start)
+                raise
+            self._notify(name, params, response, None, time.perf_counter() - start)
+            return response
+        return call
+
+    def _notify(self, method: str, params: Dict[str, Any], response: Any,
+                error: Optional[BaseException], elapsed: float) -> None:
+        for observer in self.observers:
+            try:
+                observer.on_upstream_call(method, params, response, error, elapsed)
+            except Exception:
+                logger.exception("Upstream observer %r failed", observer)
@@ -0,0 +1,115 @@
+"""
+Cheap validation of request parameters before any upstream call
+
+Requests that Google would reject, or that cannot find anything, cost quota
+and a round trip each time they are repeated. The checks here run first in
+the route handlers (and on job params) and turn such requests away with a
+``400`` and a message naming the offending field: lengths of free text,
+search radius bounds, travel modes and place types.
+"""
+
+from typing import Any, Dict
+
+from corridor import MAX_RADIUS_M
+
+MAX_TEXT_LENGTH = 200
+MAX_MESSAGE_LENGTH = 1000
+
+TRAVEL_MODES = ('driving', 'walking', 'bicycling', 'transit')
+
+# Place types accepted by the Places API nearby search
+PLACE_TYPES = frozenset((
+    'accounting', 'airport', 'amusement_park', 'aquarium', 'art_gallery', 'atm', 'bakery',
+    'bank', 'bar', 'beauty_salon', 'bicycle_store', 'book_store', 'bowling_alley',
+    'bus_station', 'cafe', 'campground', 'car_dealer', 'car_rental', 'car_repair',
+    'car_wash', 'casino', 'cemetery', 'church', 'city_hall', 'clothing_store',
+    'convenience_store', 'courthouse', 'dentist', 'department_store', 'doctor',
+    'drugstore', 'electrician', 'electronics_store', 'embassy', 'fire_station', 'florist',
+    'funeral_home', 'furniture_store', 'gas_station', 'gym', 'hair_care',
+    'hardware_store', 'hindu_temple', 'home_goods_store', 'hospital', 'insurance_agency',
+    'jewelry_store', 'laundry', 'lawyer', 'library', 'light_rail_station',
+    'liquor_store', 'local_government_office', 'locksmith', 'lodging', 'meal_delivery',
+    'meal_takeaway', 'mosque', 'movie_rental', 'movie_theater', 'moving_company',
+    'museum', 'night_club', 'painter', 'park', 'parking', 'pet_store', 'pharmacy',
+    'physiotherapist', 'plumber', 'police', 'post_office', 'primary_school',
+    'real_estate_agency', 'restaurant', 'roofing_contractor', 'rv_park', 'school',
+    'secondary_school', 'shoe_store', 'shopping_mall', 'spa', 'stadium', 'storage',
+    'store', 'subway_station', 'supermarket', 'synagogue', 'taxi_stand',
+    'tourist_attraction', 'train_station', 'transit_station', 'travel_agency',
+    'university', 'veterinary_care', 'zoo',
+))
+
+
+class ValidationError(ValueError):
+    """Raised for request parameters that cannot lead to a useful upstream call"""
+
+
+def check_text(data: Dict[str, Any], field: str, required: bool = True,
+               max_length: int = MAX_TEXT_LENGTH) -> None:
+    value = data.get(field)
+    if value is None and not required:
+        return
+    if not isinstance(value, str) or not value.strip():
+        raise ValidationError(f"'{field}' must be a non-empty string")
+    if len(value) > max_length:
+        raise ValidationError(f"'{field}' is limited to {max_length} characters")
+
+
+def check_radius(data: Dict[str, Any], field: str = 'radius') -> None:
+    value = data.get(field)
+    if value is None:
+        return
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not 1 <= value <= MAX_RADIUS_M:
+        raise ValidationError(f"'{field}' must be a number of meters from 1 to {MAX_RADIUS_M}")
+
+
+def check_mode(data: Dict[str, Any]) -> None:
+    mode = data.get('mode')
+    if mode is not None and (not isinstance(mode, str) or mode not in TRAVEL_MODES):
+        raise ValidationError(f"'mode' must be one of: {', '.join(TRAVEL_MODES)}")
+
+
+def check_place_type(data: Dict[str, Any]) -> None:
+    place_type = data.get('type')
+    if place_type is not None and (not isinstance(place_type, str) or place_type not in PLACE_TYPES):
+        raise ValidationError(f"Unknown place 'type': {str(place_type)[:MAX_TEXT_LENGTH]}")
+
+
+def validate_search(data: Dict[str, Any]) -> None:
+    """Raise ValidationError unless ``data`` is a valid place search"""
+    check_text(data, 'query')
+    check_text(data, 'location', required=False)
+    check_radius(data)
+    check_place_type(data)
+
+
+def validate_directions(data: Dict[str, Any]) -> None:
+    """Raise ValidationError unless ``data`` is a valid directions request"""
+    check_text(data, 'origin')
+    check_text(data, 'destination')
+    check_mode(data)
+
+
+def validate_along_route(data: Dict[str, Any]) -> None:
+    """Raise ValidationError unless ``data`` is a valid search along a route"""
+    validate_directions(data)
+    check_text(data, 'query')
+    check_place_type(data)
+
+
+def validate_reachable(data: Dict[str, Any]) -> None:
+    """Raise ValidationError unless ``data`` is a valid reachability request"""
+    check_text(data, 'origin')
+    check_text(data, 'query', required=False)
+    check_mode(data)
+    check_place_type(data)
+
+
+def validate_chat(data: Dict[str, Any]) -> None:
+    """Raise ValidationError unless ``data`` is a valid chat turn"""
+    check_text(data, 'message', max_length=MAX_MESSAGE_LENGTH)
+    context = data.get('context')
+    if isinstance(context, dict):
+        check_text(context, 'location', required=False)
+        check_radius(context)
+        check_place_type(context)
@@ -0,0 +1,438 @@
+"""
+Cache pre-warming for popular queries
+
+After a deploy or a Redis flush every popular query misses the cache at once
+and goes to Google. To avoid that, successful searches and directions
+requests are recorded in a query history, and a background CacheWarmer
+periodically replays the most popular ones so that their geocode, places and
+directions entries are refreshed before they expire.
+
+The history counts requests in hourly buckets (in Redis when reachable, so
+all workers contribute, else in process memory); older buckets weigh less,
+so popularity combines frequency and recency. A warming pass
+
+* runs in one worker at a time: one worker per host holds a lock file
+  (WARMING_LOCK_PATH), and a Redis lock, when Redis is available, picks one
+  host per interval,
+* only reloads entries that are missing or in the last part of their TTL,
+* stops when it has spent its budget of upstream calls, and
+* waits while the worker is serving user requests, giving way to them.
+
+Each pass also writes a snapshot of the warmed entries to a file. Every
+worker of a new container loads it in the background as soon as it starts,
+before its first request, so it answers popular queries from cache right
+away, even when Redis is empty. The first pass follows immediately.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from cache import MISSING
+
+try:
+    import fcntl
+except ImportError:  # Not on POSIX: every worker warms
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Most upstream calls one replayed request can make (geocode + places)
+QUERY_COST = {
+    'search': 2,
+    'directions': 1,
+}
+
+
+class WarmingRun:
+    """Upstream budget and warmed entries of one warming pass
+
+    While a run is set in ``current_run``, LocationService loads cache
+    entries through ``load`` instead of the cache's ``get_or_load``.
+
+    Args:
+        budget: Upstream calls the pass may make
+        refresh_fraction: Entries are reloaded once less than this fraction of
+            their TTL is left
+    """
+
+    def __init__(self, budget: int, refresh_fraction: float = 0.25):
+        self.budget = budget
+        self.refresh_fraction = refresh_fraction
+        self.calls = 0
+        self.queries = 0
+        # key -> (value, expires at on the wall clock)
+        self.entries: Dict[str, Tuple[Any, float]] = {}
+
+    def affordable(self, kind: str) -> bool:
+        return self.calls + QUERY_COST.get(kind, 1) <= self.budget
+
+    def load(self, cache, key: str, ttl: Union[float, Callable[[Any], float]],
+             loader: Callable[[], Any]) -> Any:
+        """Return the entry for ``key``, reloading it if missing or about to expire
+
+        ``ttl`` may be a function of the value, as for ``get_or_load``.
+        """
+        def ttl_for(value: Any) -> float:
+            return ttl(value) if callable(ttl) else ttl
+
+        remaining = cache.expires_in(key)
+        value = MISSING
+        if remaining is not None:
+            value = cache.get(key)
+            if value is not MISSING and remaining < ttl_for(value) * self.refresh_fraction:
+                value = MISSING
+        if value is MISSING:
+            self.calls += 1
+            value = loader()
+            remaining = ttl_for(value)
+            cache.set(key, value, remaining)
+        self.entries[key] = (value, time.time() + remaining)
+        return value
+
+
+current_run: contextvars.ContextVar[Optional[WarmingRun]] = contextvars.ContextVar('warming_run', default=None)
+
+
+class QueryHistory:
+    """Request counts per query in time buckets, in Redis or process memory
+
+    Args:
+        redis_provider: Callable returning a Redis client or None
+        on_redis_error: Called when a Redis command fails (e.g. to reconnect)
+        bucket_seconds: Width of a bucket
+        buckets: Buckets kept; older requests are forgotten
+        half_life: Age in seconds at which a request counts half
+        max_queries: Queries kept per bucket in process memory, and read per
+            bucket from Redis
+    """
+
+    KEY = 'warm:history:{}'
+
+    def __init__(self, redis_provider: Optional[Callable[[], Any]] = None,
+                 on_redis_error: Optional[Callable[[], None]] = None,
+                 bucket_seconds: int = 3600, buckets: int = 24, half_life: float = 21600,
+                 max_queries: int = 1000, clock: Callable[[], float] = time.time):
+        self._redis_provider = redis_provider
+        self._on_redis_error = on_redis_error
+        self.bucket_seconds = bucket_seconds
+        self.buckets = buckets
+        self.half_life = half_life
+        self.max_queries = max_queries
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._memory: Dict[int, Dict[str, float]] = {}
+
+    def _redis(self):
+        return self._redis_provider() if self._redis_provider else None
+
+    def _redis_failed(self, e: Exception) -> None:
+        logger.warning("Redis query history unavailable: %s", e,
+                       extra={'error_class': type(e).__name__})
+        if self._on_redis_error:
+            self._on_redis_error()
+
+    def record(self, kind: str, params: Dict[str, Any], weight: float = 1.0) -> None:
+        member = json.dumps({'kind': kind, 'params': params}, sort_keys=True, separators=(',', ':'))
+        bucket = int(self.clock() // self.bucket_seconds)
+        client = self._redis()
+        if client is not None:
+            try:
+                key = self.KEY.format(bucket)
+                pipe = client.pipeline()
+                pipe.zincrby(key, weight, member)
+                pipe.expire(key, self.bucket_seconds * self.buckets)
+                pipe.execute()
+                return
+            except Exception as e:
+                self._redis_failed(e)
+        with self._lock:
+            counts = self._memory.setdefault(bucket, {})
+            counts[member] = counts.get(member, 0.0) + weight
+            if len(counts) > 2 * self.max_queries:
+                kept = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:self.max_queries]
+                self._memory[bucket] = dict(kept)
+            for old in [b for b in self._memory if b <= bucket - self.buckets]:
+                del self._memory[old]
+
+    def _bucket_counts(self, current: int) -> List[Tuple[int, List[Tuple[str, float]]]]:
+        """(age in buckets, [(member, count)]) for each bucket still kept"""
+        client = self._redis()
+        if client is not None:
+            try:
+                pipe = client.pipeline()
+                for age in range(self.buckets):
+                    pipe.zrevrange(self.KEY.format(current - age), 0, self.max_queries - 1, withscores=True)
+                return [(age, [(m.decode() if isinstance(m, bytes) else m, score) for m, score in items])
+                        for age, items in enumerate(pipe.execute())]
+            except Exception as e:
+                self._redis_failed(e)
+        with self._lock:
+            return [(current - bucket, list(counts.items()))
+                    for bucket, counts in self._memory.items() if current - bucket < self.buckets]
+
+    def top(self, limit: int) -> List[Tuple[str, Dict[str, Any], float]]:
+        """Most popular queries as (kind, params, score), most popular first"""
+        scores: Dict[str, float] = {}
+        for age, items in self._bucket_counts(int(self.clock() // self.bucket_seconds)):
+            decay = 0.5 ** (age * self.bucket_seconds / self.half_life)
+            for member, count in items:
+                scores[member] = scores.get(member, 0.0) + count * decay
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        queries = []
+        for member, score in ranked:
+            query = json.loads(member)
+            queries.append((query['kind'], query['params'], score))
+        return queries
+
+
+def _warm_search(service, params: Dict[str, Any]) -> None:
+    service.search_places(
+        query=params['query'],
+        location=params.get('location'),
+        radius=params.get('radius', 5000),
+        place_type=params.get('type')
+    )
+
+
+def _warm_directions(service, params: Dict[str, Any]) -> None:
+    service.get_directions(params['origin'], params['destination'], params.get('mode', 'driving'))
+
+
+WARMERS = {
+    'search': _warm_search,
+    'directions': _warm_directions,
+}
+
+
+class CacheWarmer:
+    """Replay popular queries in the background to keep their cache entries warm
+
+    Args:
+        history: QueryHistory to take popular queries from
+        service_provider: Callable returning a LocationService (or None)
+        cache: The TieredCache the LocationService uses
+        admission: AdmissionController of this worker; warming waits while
+            it has requests in flight
+        redis_provider: Callable returning a Redis client or None, used so
+            that only one worker warms per interval
+        interval: Seconds between warming passes
+        budget: Upstream calls per pass
+        top_queries: Popular queries considered per pass
+        refresh_fraction: See WarmingRun
+        idle_timeout: Seconds a pass waits for the worker to become idle
+            before it gives up until the next interval
+        snapshot_path: File the warmed entries are written to after each
+            pass and loaded from when the warming thread starts
+        lock_path: File locked by the one worker per host that warms; None
+            to let every worker warm (single process, tests)
+        context_factory: Optional callable returning a context manager entered
+            around each pass (e.g. ``app.app_context``)
+    """
+
+    LOCK_KEY = 'warm:lock'
+
+    def __init__(self, history: QueryHistory, service_provider: Callable[[], Any], cache,
+                 admission=None, redis_provider: Optional[Callable[[], Any]] = None,
+                 interval: float = 300, budget: int = 100, top_queries: int = 50,
+                 refresh_fraction: float = 0.25, idle_timeout: float = 30,
+                 snapshot_path: Optional[str] = None, lock_path: Optional[str] = None,
+                 context_factory: Optional[Callable[[], Any]] = None):
+        self.history = history
+        self.service_provider = service_provider
+        self.cache = cache
+        self.admission = admission
+        self._redis_provider = redis_provider
+        self.interval = interval
+        self.budget = budget
+        self.top_queries = top_queries
+        self.refresh_fraction = refresh_fraction
+        self.idle_timeout = idle_timeout
+        self.snapshot_path = snapshot_path
+        self.lock_path = lock_path
+        self.context_factory = context_factory
+        self._lock_file = None
+        self.started = False
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.passes = 0
+        self.upstream_calls = 0
+        self.last_pass: Optional[Dict[str, Any]] = None
+        self.snapshot_entries_loaded = 0
+
+    def start(self) -> None:
+        """Start the warming thread (once); it loads the snapshot, then runs a pass"""
+        with self._start_lock:
+            if self.started:
+                return
+            self.started = True
+            self._thread = threading.Thread(target=self._loop, name='cache-warmer', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def load_snapshot(self) -> None:
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+        try:
+            self.snapshot_entries_loaded = load_snapshot(self.snapshot_path, self.cache, self.history)
+            logger.info("Loaded %d cache entries from %s", self.snapshot_entries_loaded,
+                        self.snapshot_path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Could not load cache snapshot %s: %s", self.snapshot_path, e,
+                           extra={'error_class': type(e).__name__})
+
+    def _loop(self) -> None:
+        # The first pass runs right away, refreshing what the snapshot left to expire
+        self.load_snapshot()
+        while not self._stop.is_set():
+            try:
+                if self.context_factory:
+                    with self.context_factory():
+                        self.run_once()
+                else:
+                    self.run_once()
+            except Exception as e:
+                logger.error("Cache warming pass failed: %s", e, extra={'error_class': type(e).__name__})
+            self._stop.wait(self.interval)
+
+    def _elected(self) -> bool:
+        """Whether this worker holds the host's warming lock file (kept once taken)"""
+        if self._lock_file is not None or not self.lock_path or fcntl is None:
+            return True
+        try:
+            lock_file = open(self.lock_path, 'a')
+        except OSError as e:
+            logger.warning("Could not open cache warming lock %s: %s", self.lock_path, e,
+                           extra={'error_class': type(e).__name__})
+            return True
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            # Another worker warms; retried each interval in case it exits
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _acquire(self) -> bool:
+        """Whether this worker should run the pass for the current interval"""
+        if not self._elected():
+            return False
+        client = self._redis_provider() if self._redis_provider else None
+        if client is None:
+            return True
+        try:
+            return bool(client.set(self.LOCK_KEY, '1', nx=True, ex=max(1, int(self.interval * 0.9))))
+        except Exception as e:
+            logger.warning("Could not take cache warming lock: %s", e,
+                           extra={'error_class': type(e).__name__})
+            return True
+
+    def _wait_idle(self) -> bool:
+        """Wait until this worker serves no user request; False on timeout or stop"""
+        deadline = time.monotonic() + self.idle_timeout
+        while self.admission is not None and self.admission.in_flight > 0:
+            if time.monotonic() >= deadline or self._stop.wait(0.05):
+                return False
+        return not self._stop.is_set()
+
+    def run_once(self) -> Optional[Dict[str, Any]]:
+        """Run one warming pass; returns its summary, or None if another worker has it"""
+        service = self.service_provider()
+        if service is None or not self._acquire():
+            return None
+        queries = self.history.top(self.top_queries)
+        run = WarmingRun(self.budget, self.refresh_fraction)
+        token = current_run.set(run)
+        errors = 0
+        try:
+            for kind, params, _ in queries:
+                warm = WARMERS.get(kind)
+                if warm is None:
+                    continue
+                if not run.affordable(kind) or not self._wait_idle():
+                    break
+                try:
+                    warm(service, params)
+                    run.queries += 1
+                except Exception as e:
+                    errors += 1
+                    logger.warning("Could not warm %s query: %s", kind, e,
+                                   extra={'error_class': type(e).__name__})
+        finally:
+            current_run.reset(token)
+
+        if self.snapshot_path and run.entries:
+            try:
+                save_snapshot(self.snapshot_path, run.entries, queries)
+            except OSError as e:
+                logger.warning("Could not write cache snapshot %s: %s", self.snapshot_path, e,
+                               extra={'error_class': type(e).__name__})
+        self.passes += 1
+        self.upstream_calls += run.calls
+        self.last_pass = {
+            'finished_at': time.time(),
+            'queries': run.queries,
+            'candidates': len(queries),
+            'upstream_calls': run.calls,
+            'entries': len(run.entries),
+            'errors': errors
+        }
+        return self.last_pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'started': self.started,
+            'passes': self.passes,
+            'upstream_calls': self.upstream_calls,
+            'snapshot_entries_loaded': self.snapshot_entries_loaded,
+            'last_pass': self.last_pass
+        }
+
+
+def save_snapshot(path: str, entries: Dict[str, Tuple[Any, float]],
+                  queries: List[Tuple[str, Dict[str, Any], float]]) -> None:
+    """Write warmed cache entries and the popular queries to ``path`` atomically"""
+    snapshot = {
+        'version': 1,
+        'created_at': time.time(),
+        'queries': [list(query) for query in queries],
+        'entries': [[key, value, expires_at] for key, (value, expires_at) in entries.items()]
+    }
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(snapshot, f, separators=(',', ':'))
+    os.replace(tmp, path)
+
+
+def load_snapshot(path: str, cache, history: Optional[QueryHistory] = None) -> int:
+    """
+    Put the unexpired entries of a snapshot into ``cache``
+
+    The snapshot's popular queries seed ``history`` when it has none yet, so
+    the first warming pass knows what to refresh. Returns the number of
+    entries loaded.
+    """
+    with open(path) as f:
+        snapshot = json.load(f)
+    now = time.time()
+    loaded = 0
+    for key, value, expires_at in snapshot['entries']:
+        if expires_at > now + 1:
+            cache.set(key, value, expires_at - now)
+            loaded += 1
+    if history is not None and not history.top(1):
+        for kind, params, score in snapshot.get('queries', []):
+            history.record(kind, params, weight=score)
+    return loaded
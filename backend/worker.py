@@ -0,0 +1,48 @@
+"""
+Job worker process for the LLM Location Assistant
+
+Runs queued jobs (see jobs.py) outside the gunicorn web workers, so slow
+batch and matrix workloads never occupy a worker that serves interactive
+requests. Requires Redis, which the web app uses to hand jobs over.
+
+Usage:
+    python worker.py
+"""
+
+import logging
+import os
+import sys
+
+from redis import RedisError
+
+from app import create_app, get_clients, get_job_store, get_location_service
+from jobs import JobWorker
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    app = create_app({'JOBS_BACKEND': 'redis'})
+    concurrency = int(os.getenv('JOBS_WORKER_CONCURRENCY', '4'))
+
+    with app.app_context():
+        redis = get_clients().redis
+        try:
+            if redis is None or not redis.ping():
+                raise RedisError("no connection")
+        except RedisError as e:
+            logger.error("The job worker needs Redis; check REDIS_URL (%s)", e)
+            sys.exit(1)
+        store = get_job_store()
+
+    logger.info("Starting job worker with %s threads", concurrency)
+    JobWorker(
+        store,
+        get_location_service,
+        concurrency=concurrency,
+        context_factory=app.app_context
+    ).run_forever()
+
+
+if __name__ == '__main__':
+    main()